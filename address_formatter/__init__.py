@@ -1 +1,4 @@
 from .formatter import *  # noqa
+from .cache import *  # noqa
+# Ставит загрузку реестра из ADDRESS_FORMATTER_REGISTRY перед компиляцией
+from . import registry  # noqa
@@ -0,0 +1,259 @@
+""" Streaming address formatter
+
+    python -m address_formatter premises.jsonl -o formats.jsonl
+    cat premises.csv | python -m address_formatter --input-format csv \
+        --output-format csv --formats all,street_only --workers 4
+
+JSONL input records are objects with plain_address, address_components,
+premise_number and building_type keys. CSV input has plain_address,
+premise_number and building_type columns, address components are taken
+from address_components column as JSON, or from all other columns.
+Malformed records are skipped and reported to stderr with their line
+numbers.
+"""
+import argparse
+import csv
+import json
+import sys
+import time
+from typing import Iterable, Iterator, Optional
+
+from .formatter import FORMAT_KEYS, RENDER_TABLES, format_many
+from .parallel import chunked, format_parallel
+
+RECORD_KEYS = ('plain_address', 'premise_number', 'building_type')
+
+
+def _building_type(value) -> Optional[int]:
+    if value is None or value == '':
+        return None
+    return int(value)
+
+
+def _premise_number(value) -> Optional[str]:
+    if value is None or value == '':
+        return None
+    return str(value)
+
+
+def _address_components(value) -> Optional[dict]:
+    if value is None:
+        return None
+    if not isinstance(value, dict):
+        raise ValueError('address_components is not an object')
+
+    address_components = {}
+    for key, component in value.items():
+        # Номера домов и корпусов в JSON бывают числами
+        if isinstance(component, (int, float)) and \
+                not isinstance(component, bool):
+            component = str(component)
+        elif component is not None and not isinstance(component, str):
+            raise ValueError(f'{key} is not a string')
+        address_components[key] = component
+    return address_components
+
+
+def _skipped(errors, line_number: int, error: Exception):
+    if errors is not None:
+        errors.write(f'line {line_number}: skipped, {error}\n')
+
+
+def read_jsonl(lines: Iterable[str], errors=None) -> Iterator[tuple]:
+    """ Records of JSONL lines, malformed ones are reported to errors
+    stream and skipped
+    """
+    for line_number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+
+        try:
+            record = json.loads(line)
+            if not isinstance(record, dict):
+                raise ValueError('record is not an object')
+            record = (
+                record.get('plain_address'),
+                _address_components(record.get('address_components')),
+                _premise_number(record.get('premise_number')),
+                _building_type(record.get('building_type')),
+            )
+        except (ValueError, TypeError) as error:
+            _skipped(errors, line_number, error)
+            continue
+
+        yield record
+
+
+def read_csv(lines: Iterable[str], errors=None) -> Iterator[tuple]:
+    """ Records of CSV rows, malformed ones are reported to errors stream
+    and skipped
+    """
+    reader = csv.DictReader(lines)
+    for row in reader:
+        try:
+            if 'address_components' in row:
+                address_components = _address_components(json.loads(
+                    row['address_components'] or 'null'))
+            else:
+                address_components = {
+                    key: value for key, value in row.items()
+                    if key not in RECORD_KEYS and value != ''
+                }
+            building_type = _building_type(row.get('building_type'))
+        except (ValueError, TypeError) as error:
+            _skipped(errors, reader.line_num, error)
+            continue
+
+        yield (
+            row.get('plain_address'),
+            address_components,
+            _premise_number(row.get('premise_number')),
+            building_type,
+        )
+
+
+class JSONLWriter:
+    def __init__(self, output, formats: tuple):
+        self.output = output
+        self.formats = formats
+
+    def write(self, results: list):
+        self.output.writelines(
+            json.dumps({key: result[key] for key in self.formats},
+                       ensure_ascii=False) + '\n'
+            for result in results)
+
+
+class CSVWriter:
+    def __init__(self, output, formats: tuple):
+        self.formats = formats
+        self.writer = csv.writer(output, lineterminator='\n')
+        self.writer.writerow(formats)
+
+    def write(self, results: list):
+        self.writer.writerows(
+            [result[key] for key in self.formats] for result in results)
+
+
+READERS = {'jsonl': read_jsonl, 'csv': read_csv}
+WRITERS = {'jsonl': JSONLWriter, 'csv': CSVWriter}
+
+
+class Progress:
+    """ Reports processed records and throughput to stderr """
+
+    def __init__(self, stream, interval: float = 1.0):
+        self.stream = stream
+        self.interval = interval
+        self.records = 0
+        self.started = self.reported = time.monotonic()
+
+    def update(self, records: int):
+        self.records += records
+        now = time.monotonic()
+        if now - self.reported >= self.interval:
+            self.reported = now
+            self.report(now)
+
+    def report(self, now: Optional[float] = None):
+        elapsed = (now or time.monotonic()) - self.started
+        rate = self.records / elapsed if elapsed else 0.0
+        self.stream.write(f'{self.records} records, {elapsed:.1f}s, '
+                          f'{rate:.0f} records/s\n')
+        self.stream.flush()
+
+
+def _input_format(args) -> str:
+    if args.input_format:
+        return args.input_format
+    if args.input and args.input.endswith('.csv'):
+        return 'csv'
+    return 'jsonl'
+
+
+def _output_format(args) -> str:
+    if args.output_format:
+        return args.output_format
+    if args.output and args.output.endswith('.csv'):
+        return 'csv'
+    return 'jsonl'
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='address_formatter',
+        description='Formats JSONL or CSV records of address components')
+    parser.add_argument('input', nargs='?',
+                        help='input file, stdin by default')
+    parser.add_argument('-o', '--output',
+                        help='output file, stdout by default')
+    parser.add_argument('--input-format', choices=sorted(READERS),
+                        help='jsonl by default, csv for *.csv files')
+    parser.add_argument('--output-format', choices=sorted(WRITERS),
+                        help='jsonl by default, csv for *.csv files')
+    parser.add_argument('--formats', default=','.join(FORMAT_KEYS),
+                        help='comma separated format keys')
+    parser.add_argument('--render', choices=sorted(RENDER_TABLES),
+                        default='unicode',
+                        help='unicode keeps no-break spaces and hyphens, '
+                             'plain replaces them with ordinary ones, '
+                             'html escapes results')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='number of processes, 1 formats in-process')
+    parser.add_argument('--chunksize', type=int, default=1000,
+                        help='records per write and per worker task')
+    parser.add_argument('--progress', action='store_true',
+                        help='report throughput to stderr')
+
+    args = parser.parse_args(argv)
+
+    formats = tuple(args.formats.split(','))
+    unknown = set(formats) - set(FORMAT_KEYS)
+    if unknown:
+        parser.error(f'unknown formats: {", ".join(sorted(unknown))}')
+    args.formats = formats
+
+    return args
+
+
+def run(args, stdin, stdout, stderr):
+    records = READERS[_input_format(args)](stdin, stderr)
+
+    if args.workers > 1:
+        results = format_parallel(records, workers=args.workers,
+                                  chunksize=args.chunksize,
+                                  formats=args.formats, render=args.render)
+    else:
+        results = format_many(records, formats=args.formats,
+                              render=args.render)
+
+    writer = WRITERS[_output_format(args)](stdout, args.formats)
+    progress = Progress(stderr) if args.progress else None
+
+    for chunk in chunked(results, args.chunksize):
+        writer.write(chunk)
+        if progress is not None:
+            progress.update(len(chunk))
+
+    if progress is not None:
+        progress.report()
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    stdin = open(args.input, encoding='utf-8', newline='') \
+        if args.input else \
+        open(sys.stdin.fileno(), encoding='utf-8', newline='',
+             closefd=False)
+    stdout = open(args.output, 'w', encoding='utf-8', newline='') \
+        if args.output else \
+        open(sys.stdout.fileno(), 'w', encoding='utf-8', newline='',
+             closefd=False)
+
+    with stdin, stdout:
+        run(args, stdin, stdout, sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,245 @@
+import asyncio
+import weakref
+from collections import deque
+from concurrent.futures import Executor
+from typing import AsyncIterator, Iterable, Optional, Union
+
+from .formatter import format_many, render_table
+
+__all__ = [
+    'AsyncFormatter',
+    'aformat',
+    'aformat_many',
+]
+
+
+def _format_batch(records: list, formats: Optional[tuple],
+                  render: str = 'unicode') -> list:
+    return list(format_many(records, formats=formats, render=render))
+
+
+def _format_each(records: list, formats: Optional[tuple],
+                 render: str = 'unicode') -> list:
+    """ Пачка с ошибкой форматируется по одной записи, исключение записи
+    становится ее результатом и достается только ее future
+    """
+    results = []
+    for record in records:
+        try:
+            results.extend(_format_batch([record], formats, render))
+        except Exception as exc:  # pylint: disable=broad-except
+            results.append(exc)
+    return results
+
+
+class AsyncFormatter:
+    """ Groups aformat calls arriving within window seconds into
+    micro-batches formatted by format_many
+
+    Small batches are formatted right on the event loop, larger ones in
+    executor, so the loop stays responsive.
+
+    :param window: seconds to wait for more requests before formatting
+    :param max_batch_size: batch is formatted as soon as it has that many
+        requests
+    :param inline_batch_size: batches up to that size are formatted on
+        the event loop
+    :param max_concurrency: max number of batches formatted in executor
+        at the same time
+    :param executor: concurrent.futures executor, loop default executor
+        if None
+
+        >>> formatter = AsyncFormatter(window=0.005)
+        >>> await asyncio.gather(*(
+            formatter.format(premise.address, components, premise.number)
+            for premise in premises))
+    """
+
+    def __init__(self, window: float = 0.001, max_batch_size: int = 1000,
+                 inline_batch_size: int = 16, max_concurrency: int = 4,
+                 executor: Optional[Executor] = None):
+        self.window = window
+        self.max_batch_size = max_batch_size
+        self.inline_batch_size = inline_batch_size
+        self.max_concurrency = max_concurrency
+        self.executor = executor
+        self.batches = 0
+
+        # Создается в цикле событий, в котором форматтер используется
+        self._semaphore = None
+        self._tasks = set()
+        # (formats, render) -> [(record, future)]
+        self._pending = {}
+        # (formats, render) -> asyncio.TimerHandle
+        self._timers = {}
+
+    async def format(self, plain_address: str,
+                     address_components: Optional[dict],
+                     premise_number: str = None, building_type: int = None,
+                     formats: Optional[Iterable[str]] = None,
+                     render: str = 'unicode') -> dict:
+        """ Same as all_formats """
+        if formats is not None:
+            formats = tuple(formats)
+        render_table(render)
+        key = (formats, render)
+
+        loop = asyncio.get_event_loop()
+        future = loop.create_future()
+
+        batch = self._pending.setdefault(key, [])
+        batch.append(((plain_address, address_components, premise_number,
+                       building_type), future))
+
+        if len(batch) >= self.max_batch_size:
+            self._flush(key)
+        elif len(batch) == 1:
+            self._timers[key] = loop.call_later(self.window, self._flush, key)
+
+        return await future
+
+    def _flush(self, key: tuple):
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+
+        batch = self._pending.pop(key, None)
+        if not batch:
+            return
+
+        self.batches += 1
+
+        if len(batch) > self.inline_batch_size:
+            task = asyncio.get_event_loop().create_task(
+                self._run_in_executor(batch, key))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+            return
+
+        records = [record for record, _ in batch]
+        try:
+            results = _format_batch(records, *key)
+        except Exception:  # pylint: disable=broad-except
+            results = _format_each(records, *key)
+        _resolve(batch, results)
+
+    async def _run_in_executor(self, batch: list, key: tuple):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        loop = asyncio.get_event_loop()
+        records = [record for record, _ in batch]
+
+        async with self._semaphore:
+            try:
+                try:
+                    results = await loop.run_in_executor(
+                        self.executor, _format_batch, records, *key)
+                except Exception:  # pylint: disable=broad-except
+                    results = await loop.run_in_executor(
+                        self.executor, _format_each, records, *key)
+            except Exception as exc:  # pylint: disable=broad-except
+                # Отказал сам executor, а не записи
+                _reject(batch, exc)
+            else:
+                _resolve(batch, results)
+
+
+def _resolve(batch: list, results: list):
+    for (_, future), result in zip(batch, results):
+        if future.done():
+            continue
+        if isinstance(result, Exception):
+            future.set_exception(result)
+        else:
+            future.set_result(result)
+
+
+def _reject(batch: list, exc: Exception):
+    for _, future in batch:
+        if not future.done():
+            future.set_exception(exc)
+
+
+_DEFAULT_FORMATTERS = weakref.WeakKeyDictionary()
+
+
+def _default_formatter() -> AsyncFormatter:
+    loop = asyncio.get_event_loop()
+    formatter = _DEFAULT_FORMATTERS.get(loop)
+    if formatter is None:
+        formatter = _DEFAULT_FORMATTERS[loop] = AsyncFormatter()
+    return formatter
+
+
+async def aformat(plain_address: str, address_components: Optional[dict],
+                  premise_number: str = None, building_type: int = None,
+                  formats: Optional[Iterable[str]] = None,
+                  render: str = 'unicode') -> dict:
+    """ all_formats for event loop, concurrent calls are batched by
+    AsyncFormatter with default settings
+    """
+    return await _default_formatter().format(
+        plain_address, address_components, premise_number, building_type,
+        formats, render)
+
+
+async def _achunked(records: Union[Iterable, AsyncIterator],
+                    size: int) -> AsyncIterator[list]:
+    chunk = []
+    if hasattr(records, '__aiter__'):
+        async for record in records:
+            chunk.append(record)
+            if len(chunk) >= size:
+                yield chunk
+                chunk = []
+    else:
+        for record in records:
+            chunk.append(record)
+            if len(chunk) >= size:
+                yield chunk
+                chunk = []
+
+    if chunk:
+        yield chunk
+
+
+async def aformat_many(records: Union[Iterable[tuple], AsyncIterator[tuple]],
+                       batch_size: int = 1000, max_concurrency: int = 4,
+                       executor: Optional[Executor] = None,
+                       formats: Optional[Iterable[str]] = None,
+                       render: str = 'unicode') -> AsyncIterator[dict]:
+    """ format_many for event loop, batches of records are formatted in
+    executor, results are yielded in input order
+
+    :param records: iterable or async iterable of
+        (plain_address, address_components, premise_number, building_type)
+    :param batch_size: records per executor call
+    :param max_concurrency: max number of batches formatted at the same time
+    :param executor: concurrent.futures executor, loop default executor
+        if None
+    :param formats: optional iterable of format keys to build
+    :param render: unicode, plain or html, see render_formats
+    """
+    if formats is not None:
+        formats = tuple(formats)
+    render_table(render)
+
+    loop = asyncio.get_event_loop()
+    inflight = deque()
+
+    try:
+        async for chunk in _achunked(records, batch_size):
+            if len(inflight) >= max_concurrency:
+                for result in await inflight.popleft():
+                    yield result
+
+            inflight.append(loop.run_in_executor(
+                executor, _format_batch, chunk, formats, render))
+
+        while inflight:
+            for result in await inflight.popleft():
+                yield result
+    finally:
+        for future in inflight:
+            future.cancel()
@@ -0,0 +1,405 @@
+""" Benchmarks of address formatter
+
+    python -m address_formatter.benchmark suite --records 20000 \
+        --save current.json --compare baseline.json
+    python -m address_formatter.benchmark parallel --records 200000 \
+        --workers 0,1,2,4,8 --modes processes,threads
+    python -m address_formatter.benchmark matchers
+"""
+import argparse
+import json
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Iterable, List, Optional
+
+from . import formatter
+from .formatter import (
+    AddressComponent,
+    AdjectiveSuffixSet,
+    all_formats,
+    check_start_with_type,
+    compile_matcher,
+    format_many,
+    posessive_dot,
+    space_after_dot,
+)
+from .compact import compact_many
+from .parallel import format_parallel, format_threaded
+
+# Значения по набору окончаний типа: прилагательные, числительные с
+# окончаниями, "им", дефисы и слеши
+VALUES = {
+    'MASCULINE': ["Кировский", "Ленинский", "1-ый", "2-й", "3-ий",
+                  "Новый", "им Ленина", "22-ой"],
+    'FEMININE': ["Садовая", "Майская", "1-я", "5-ая", "Первая Лесная",
+                 "Верхняя", "им В.В.Петрова", "2-я Лесная"],
+    'NEUTER': ["Киевское", "2-е", "Верхнее", "Каширское"],
+    'EMPTY': ["Серов", "Брянск", "им Ленина", "им.В.В.Петрова",
+              "Калач-на-Дону", "Наро-Фоминск", "Лен/ский", "8 Марта",
+              "Мякишево", "Дрянное"],
+}
+UNKNOWN_TYPE = "неизвестный"
+HOUSES = ["1", "5", "9", "12/2", "7а", "15-17", "543"]
+SECTIONS = ["1", "2", "6", "А"]
+CONSTRUCTIONS = ["1", "2", "7"]
+BUILDING_TYPES = [None, 1, 2, 3, 4]
+
+# Вероятность наличия компонента в записи
+PRESENCE = {
+    AddressComponent.REGION: 0.9,
+    AddressComponent.DISTRICT: 0.4,
+    AddressComponent.CITY: 0.8,
+    AddressComponent.TOWNSHIP: 0.3,
+    AddressComponent.VILLAGE: 0.3,
+    AddressComponent.STREET: 0.85,
+    AddressComponent.BUILDING: 0.95,
+    AddressComponent.SECTION: 0.3,
+    AddressComponent.CONSTRUCTION: 0.2,
+}
+ERROR_RATE = 0.01
+
+
+def _suffix_set_name(suffix_set: list) -> str:
+    return next(name for name, value in vars(AdjectiveSuffixSet).items()
+                if isinstance(value, list) and value == suffix_set)
+
+
+def generate_corpus(count: int, seed: int = 0) -> List[tuple]:
+    """ Deterministic synthetic records
+    (plain_address, address_components, premise_number, building_type)
+
+    Component of record i, if present, has i-th type of the component in
+    TYPES, types cycle. Leading records have every component, so a corpus
+    of as many records as the largest number of types of a component
+    (20 for the default TYPES) has every component and every type. Later
+    components are present with PRESENCE probability, about ERROR_RATE
+    of records have unknown type of some component.
+    KEYS and TYPES are taken at call time, e.g. from loaded registry.
+    """
+    # Реестр по умолчанию загружается до чтения таблиц
+    formatter.get_plans()
+    keys_table, types_table = formatter.KEYS, formatter.TYPES
+
+    rand = random.Random(seed)
+    typed_components = [
+        address_component for address_component, keys in keys_table.items()
+        if keys['type_key'] is not None
+    ]
+
+    # Тип помещения зависит от building_type, он тоже идет по кругу
+    leading = max([len(BUILDING_TYPES)] + [
+        len(types_table[address_component])
+        for address_component in typed_components])
+
+    records = []
+    for index in range(count):
+        # Ведущие записи полные и без ошибок, по ним покрыты все типы
+        full = index < leading
+        data = {}
+        for address_component in typed_components:
+            if not full and rand.random() > PRESENCE[address_component]:
+                continue
+
+            keys = keys_table[address_component]
+            types = list(types_table[address_component])
+            component_type = types[index % len(types)]
+            suffix_set = types_table[address_component][component_type][
+                'suffix_set']
+
+            if address_component == AddressComponent.BUILDING:
+                value = rand.choice(HOUSES)
+            else:
+                value = rand.choice(VALUES[_suffix_set_name(suffix_set)])
+
+            data[keys['value_key']] = value
+            data[keys['type_key']] = component_type
+
+        if full or rand.random() < PRESENCE[AddressComponent.SECTION]:
+            data['section'] = rand.choice(SECTIONS)
+        if full or rand.random() < PRESENCE[AddressComponent.CONSTRUCTION]:
+            data['building'] = rand.choice(CONSTRUCTIONS)
+
+        if not full and rand.random() < ERROR_RATE and data:
+            type_keys = [key for key in data if key.endswith('_type_full')]
+            if type_keys:
+                data[rand.choice(type_keys)] = UNKNOWN_TYPE
+
+        premise_number = str(rand.randint(1, 800)) \
+            if full or rand.random() < 0.9 else None
+
+        records.append((f"plain address {index}", data, premise_number,
+                        BUILDING_TYPES[index % len(BUILDING_TYPES)]))
+
+    return records
+
+
+def _percentile(sorted_values: list, percent: float) -> float:
+    index = min(len(sorted_values) - 1,
+                int(round(percent / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def bench_latency(records: list) -> dict:
+    timings = []
+    timer = time.perf_counter
+    for record in records:
+        started = timer()
+        all_formats(*record)
+        timings.append(timer() - started)
+
+    timings.sort()
+    return {
+        'latency_p50_us': _percentile(timings, 50) * 1e6,
+        'latency_p99_us': _percentile(timings, 99) * 1e6,
+    }
+
+
+def bench_throughput(records: list) -> dict:
+    started = time.perf_counter()
+    for _ in format_many(records):
+        pass
+    elapsed = time.perf_counter() - started
+
+    return {'batch_records_per_second': len(records) / elapsed}
+
+
+def _bytes_per_result(build_results, records: list) -> float:
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        results = build_results(records)
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+    del results
+    return (after - before) / len(records)
+
+
+def bench_memory(records: list) -> dict:
+    """ Bytes allocated for results kept in memory, all_formats dicts and
+    CompactFormats
+    """
+    return {
+        'bytes_per_result': _bytes_per_result(
+            lambda records: [all_formats(*record) for record in records],
+            records),
+        'bytes_per_compact_result': _bytes_per_result(
+            lambda records: list(compact_many(records)), records),
+    }
+
+
+def bench_import(repeat: int = 5) -> dict:
+    code = ('import time; started = time.perf_counter(); '
+            'import address_formatter; '
+            'print(time.perf_counter() - started)')
+    timings = [
+        float(subprocess.run([sys.executable, '-c', code], check=True,
+                             stdout=subprocess.PIPE).stdout)
+        for _ in range(repeat)
+    ]
+    return {'import_seconds': statistics.median(timings)}
+
+
+def run_suite(records: int = 20000, seed: int = 0) -> dict:
+    corpus = generate_corpus(records, seed)
+    results = {
+        'python': platform.python_version(),
+        'records': records,
+        'seed': seed,
+    }
+    results.update(bench_latency(corpus))
+    results.update(bench_throughput(corpus))
+    results.update(bench_memory(corpus))
+    results.update(bench_import())
+    return results
+
+
+# Метрики, для которых большее значение лучше
+HIGHER_IS_BETTER = {'batch_records_per_second'}
+
+
+def compare(baseline: dict, current: dict) -> List[dict]:
+    """ Relative change of every numeric metric, regression is positive
+    when the metric got worse
+    """
+    comparison = []
+    for metric, value in current.items():
+        base = baseline.get(metric)
+        if isinstance(value, bool) or not isinstance(value, (int, float)) \
+                or not isinstance(base, (int, float)) or not base \
+                or metric in ('records', 'seed'):
+            continue
+
+        change = (value - base) / base
+        comparison.append({
+            'metric': metric,
+            'baseline': base,
+            'current': value,
+            'regression': -change if metric in HIGHER_IS_BETTER else change,
+        })
+    return comparison
+
+
+PARALLEL_MODES = {
+    'processes': format_parallel,
+    'threads': format_threaded,
+}
+
+
+def bench_parallel(records: list, workers: Iterable[int],
+                   chunksize: int = 1000,
+                   mode: str = 'processes') -> List[dict]:
+    """ Throughput of format_parallel, or of format_threaded for threads
+    mode, for every number of workers, workers=0 is serial format_many
+    """
+    format_pool = PARALLEL_MODES[mode]
+
+    results = []
+    for worker_count in workers:
+        started = time.perf_counter()
+        if worker_count:
+            for _ in format_pool(records, workers=worker_count,
+                                 chunksize=chunksize):
+                pass
+        else:
+            for _ in format_many(records):
+                pass
+        elapsed = time.perf_counter() - started
+
+        results.append({
+            'mode': mode,
+            'workers': worker_count,
+            'seconds': elapsed,
+            'records_per_second': len(records) / elapsed,
+        })
+
+    return results
+
+
+def bench_matchers(values: list, repeat: int = 5) -> List[dict]:
+    """ ns per value of legacy check_start_with_type (with posessive_dot and
+    space_after_dot it needs) and of compiled matcher, per suffix set
+    """
+    results = []
+    for name, suffix_set in vars(AdjectiveSuffixSet).items():
+        if name.startswith('__'):
+            continue
+
+        matcher = compile_matcher(suffix_set)
+
+        def legacy(suffix_set=suffix_set):
+            for value in values:
+                check_start_with_type(space_after_dot(posessive_dot(value)),
+                                      suffix_set)
+
+        def compiled(matcher=matcher):
+            for value in values:
+                matcher(value)
+
+        timings = {}
+        for label, function in (('legacy', legacy), ('compiled', compiled)):
+            started = time.perf_counter()
+            for _ in range(repeat):
+                function()
+            timings[label] = (time.perf_counter() - started) \
+                / (repeat * len(values)) * 1e9
+
+        results.append({
+            'suffix_set': name,
+            'legacy_ns': timings['legacy'],
+            'compiled_ns': timings['compiled'],
+        })
+
+    return results
+
+
+def _suite(args) -> int:
+    results = run_suite(args.records, args.seed)
+    print(json.dumps(results, indent=2))
+
+    if args.save:
+        with open(args.save, 'w') as results_fd:
+            json.dump(results, results_fd, indent=2)
+
+    if not args.compare:
+        return 0
+
+    with open(args.compare) as baseline_fd:
+        baseline = json.load(baseline_fd)
+
+    failed = False
+    for row in compare(baseline, results):
+        regressed = row['regression'] > args.max_regression
+        failed = failed or regressed
+        print('{metric:<26} {baseline:14.3f} {current:14.3f} '
+              '{regression:+8.1%}{mark}'.format(
+                  mark=' REGRESSION' if regressed else '', **row))
+    return 1 if failed else 0
+
+
+def _parallel(args) -> int:
+    records = generate_corpus(args.records, args.seed)
+    workers = [int(worker_count) for worker_count in args.workers.split(',')]
+
+    for mode in args.modes.split(','):
+        for result in bench_parallel(records, workers, args.chunksize, mode):
+            print('{mode:<9} workers={workers:<3} {seconds:8.3f}s '
+                  '{records_per_second:12.0f} records/s'.format(**result))
+    return 0
+
+
+def _matchers(args) -> int:
+    values = [value for _, data, _, _ in generate_corpus(args.records,
+                                                         args.seed)
+              for value in data.values()]
+    for result in bench_matchers(values):
+        print('{suffix_set:<10} legacy {legacy_ns:8.0f} ns  '
+              'compiled {compiled_ns:8.0f} ns'.format(**result))
+    return 0
+
+
+def main(argv: Optional[list] = None) -> int:
+    parser = argparse.ArgumentParser(prog='address_formatter.benchmark')
+    subparsers = parser.add_subparsers(dest='benchmark')
+    subparsers.required = True
+
+    suite = subparsers.add_parser(
+        'suite', help='latency, throughput, memory and import time')
+    suite.add_argument('--records', type=int, default=20000)
+    suite.add_argument('--seed', type=int, default=0)
+    suite.add_argument('--save', help='write results to JSON file')
+    suite.add_argument('--compare', help='baseline JSON file')
+    suite.add_argument('--max-regression', type=float, default=0.2,
+                       help='fail if a metric is worse by that fraction')
+    suite.set_defaults(run=_suite)
+
+    parallel = subparsers.add_parser(
+        'parallel', help='format_parallel and format_threaded throughput '
+                         'by number of workers')
+    parallel.add_argument('--records', type=int, default=100000)
+    parallel.add_argument('--seed', type=int, default=0)
+    parallel.add_argument('--workers', default='0,1,2,4',
+                          help='comma separated, 0 is serial format_many')
+    parallel.add_argument('--chunksize', type=int, default=1000)
+    parallel.add_argument('--modes', default='processes,threads',
+                          help='comma separated, processes and threads')
+    parallel.set_defaults(run=_parallel)
+
+    matchers = subparsers.add_parser(
+        'matchers', help='check_start_with_type vs compiled matchers')
+    matchers.add_argument('--records', type=int, default=5000)
+    matchers.add_argument('--seed', type=int, default=0)
+    matchers.set_defaults(run=_matchers)
+
+    args = parser.parse_args(argv)
+    return args.run(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,90 @@
+from typing import Iterable, Iterator, Optional
+
+from . import formatter
+from .formatter import (
+    FORMAT_COMPONENTS,
+    FORMAT_KEYS,
+    AddressComponent,
+    LazyPortions,
+    plain_formats,
+    portion_triples,
+    render_formats,
+    render_table,
+)
+from .prefix import PrefixNode
+
+__all__ = [
+    'BuildingFormatter',
+]
+
+# Форматы, которые заканчиваются порцией помещения
+PREMISE_FORMATS = ('all', 'starting_with_street')
+
+
+class BuildingFormatter:
+    """ Formats building level portions once and adds only premise portion
+    for every premise, results are the same as all_formats
+
+        >>> building = BuildingFormatter(
+            building.address, building.user_address_components,
+            building.type)
+        >>> building.premise("1")['all']
+        >>> for formats in building.premises(range(1, 801)):
+            ...
+    """
+
+    def __init__(self, plain_address: str,
+                 address_components: Optional[dict],
+                 building_type: int = None,
+                 formats: Optional[Iterable[str]] = None,
+                 render: str = 'unicode'):
+        self.plain_address = plain_address
+        self.formats = tuple(formats) if formats is not None else FORMAT_KEYS
+        render_table(render)
+        self.render = render
+        data = address_components
+
+        if not data:
+            self._formats = plain_formats(plain_address, self.formats)
+            self._prefixes = {}
+            return
+
+        self._compiled = formatter.get_plans()
+        triples = portion_triples(data, None, building_type, self._compiled)
+        _, _, self.ownership_type = triples[-1]
+        portions = LazyPortions(triples, compiled=self._compiled)
+        format_components = FORMAT_COMPONENTS[data.get('street') is not None]
+
+        self._formats = {}
+        # Префиксы форматов, к которым добавляется порция помещения
+        self._prefixes = {}
+
+        for key in self.formats:
+            node = PrefixNode().extend_many(
+                portions[address_component]
+                for address_component in format_components[key]
+                if address_component != AddressComponent.OWNERSHIP)
+
+            if key in PREMISE_FORMATS:
+                self._prefixes[key] = node
+            self._formats[key] = node.join() or plain_address
+
+    def premise(self, premise_number: Optional[str]) -> dict:
+        """ Same as all_formats with premise_number """
+        result = dict(self._formats)
+        if self._prefixes and premise_number is not None:
+            ownership = formatter.format_portion(
+                AddressComponent.OWNERSHIP, premise_number,
+                self.ownership_type, self._compiled)
+            for key, node in self._prefixes.items():
+                result[key] = node.join([ownership]) or self.plain_address
+
+        return render_formats(result, self.render)
+
+    def premises(self, premise_numbers: Iterable) -> Iterator[dict]:
+        """ Formats of every premise, numbers may be any iterable,
+        e.g. range, values are converted to str
+        """
+        for premise_number in premise_numbers:
+            yield self.premise(
+                str(premise_number) if premise_number is not None else None)
@@ -0,0 +1,140 @@
+import weakref
+from collections import OrderedDict, namedtuple
+from threading import Lock
+from typing import Optional
+
+__all__ = [
+    'enable_cache',
+    'disable_cache',
+    'clear_cache',
+    'cache_info',
+]
+
+MISSING = object()
+
+CacheInfo = namedtuple('CacheInfo', [
+    'hits', 'misses', 'evictions', 'maxsize', 'currsize'])
+
+
+class LRUCache:
+    """ Bounded thread safe LRU mapping with hit/miss/eviction statistics
+
+        >>> cache = LRUCache(maxsize=1)
+        >>> cache.set('a', 1)
+        >>> cache.set('b', 2)
+        >>> cache.get('a') is MISSING, cache.get('b')
+        (True, 2)
+        >>> cache.info()
+        CacheInfo(hits=1, misses=1, evictions=1, maxsize=1, currsize=1)
+    """
+
+    def __init__(self, maxsize: int):
+        if maxsize < 1:
+            raise ValueError('maxsize must be positive')
+
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=MISSING):
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def info(self) -> CacheInfo:
+        with self._lock:
+            return CacheInfo(self.hits, self.misses, self.evictions,
+                             self.maxsize, len(self._data))
+
+    def __len__(self):
+        return len(self._data)
+
+
+# Прочие кеши форматированных значений с методом clear, например PrefixTree,
+# сбрасываются вместе с кешами модуля
+DEPENDENTS = weakref.WeakSet()
+
+# Кеш порций по (address_component, value, component_type)
+PORTIONS = None  # type: Optional[LRUCache]
+# Кеш результатов all_formats по нормализованному ключу
+FORMATS = None  # type: Optional[LRUCache]
+
+
+def enable_cache(portions_maxsize: Optional[int] = 4096,
+                 formats_maxsize: Optional[int] = 1024):
+    """ Enables memoization of check_portion and all_formats
+
+    :param portions_maxsize: LRU size of portions cache, None to disable it
+    :param formats_maxsize: LRU size of all_formats cache, None to disable it
+    """
+    global PORTIONS, FORMATS  # pylint: disable=global-statement
+
+    PORTIONS = LRUCache(portions_maxsize) \
+        if portions_maxsize is not None else None
+    FORMATS = LRUCache(formats_maxsize) \
+        if formats_maxsize is not None else None
+
+
+def disable_cache():
+    global PORTIONS, FORMATS  # pylint: disable=global-statement
+
+    PORTIONS = None
+    FORMATS = None
+
+
+def register_dependent(dependent):
+    """ dependent.clear() is called with clear_cache, e.g. when formatter
+    plans are rebuilt
+    """
+    DEPENDENTS.add(dependent)
+
+
+def clear_cache():
+    """ Drops cached values and statistics, caches stay enabled """
+    for cache in (PORTIONS, FORMATS):
+        if cache is not None:
+            cache.clear()
+
+    for dependent in list(DEPENDENTS):
+        dependent.clear()
+
+
+def cache_info() -> dict:
+    """ Statistics of enabled caches
+
+        >>> enable_cache()
+        >>> cache_info()
+        {'portions': CacheInfo(hits=0, misses=0, evictions=0, maxsize=4096,
+        currsize=0), 'formats': CacheInfo(hits=0, misses=0, evictions=0,
+        maxsize=1024, currsize=0)}
+    """
+    return {
+        'portions': PORTIONS.info() if PORTIONS is not None else None,
+        'formats': FORMATS.info() if FORMATS is not None else None,
+    }
@@ -0,0 +1,139 @@
+import sys
+from collections.abc import Mapping
+from typing import Iterable, Iterator, Optional, Union
+
+from . import formatter
+from .formatter import (
+    IS_ERROR,
+    FORMAT_COMPONENTS,
+    FORMAT_KEYS,
+    iter_records,
+    portion_triples,
+)
+
+__all__ = [
+    'CompactFormats',
+    'compact_formats',
+    'compact_many',
+]
+
+# Порции в portion_triples идут в порядке формата all
+PORTION_INDEXES = {
+    address_component: index
+    for index, address_component in enumerate(FORMAT_COMPONENTS[True]['all'])
+}
+# has_street -> format key -> индексы порций в CompactFormats.portions
+FORMAT_INDEXES = {
+    has_street: {
+        key: tuple(PORTION_INDEXES[address_component]
+                   for address_component in components)
+        for key, components in format_components.items()
+    }
+    for has_street, format_components in FORMAT_COMPONENTS.items()
+}
+
+
+def _intern(portion):
+    return sys.intern(portion) if isinstance(portion, str) else portion
+
+
+class CompactFormats(Mapping):
+    """ all_formats result, which keeps formatted portions only and builds
+    formats on access
+
+    Portion strings are interned, so results of one building, city or
+    region share them instead of keeping five joined strings each.
+    """
+    __slots__ = ('plain_address', 'portions', 'has_street')
+
+    def __init__(self, plain_address: str, portions: tuple,
+                 has_street: bool):
+        self.plain_address = plain_address
+        self.portions = portions
+        self.has_street = has_street
+
+    def __getitem__(self, key: str) -> str:
+        indexes = FORMAT_INDEXES[self.has_street][key]
+        portions = self.portions
+        if not portions:
+            return self.plain_address
+
+        return formatter.format_result(
+            [portions[index] for index in indexes]) or self.plain_address
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(FORMAT_KEYS)
+
+    def __len__(self) -> int:
+        return len(FORMAT_KEYS)
+
+    def __repr__(self):
+        return f'CompactFormats({dict(self)!r})'
+
+    def __reduce__(self):
+        # IS_ERROR не переживает pickle, передаем его как False
+        return _unpickle, (self.plain_address, tuple(
+            False if portion is IS_ERROR else portion
+            for portion in self.portions
+        ), self.has_street)
+
+
+def _unpickle(plain_address: str, portions: tuple,
+              has_street: bool) -> CompactFormats:
+    return CompactFormats(plain_address, tuple(
+        IS_ERROR if portion is False else _intern(portion)
+        for portion in portions
+    ), has_street)
+
+
+def compact_formats(plain_address: str, address_components: Optional[dict],
+                    premise_number: str = None,
+                    building_type: int = None) -> CompactFormats:
+    """ Same as all_formats, but returns CompactFormats """
+    data = address_components
+
+    if not data:
+        return CompactFormats(plain_address, (), False)
+
+    compiled = formatter.get_plans()
+    return CompactFormats(plain_address, tuple(
+        _intern(formatter.format_portion(*triple, compiled))
+        for triple in portion_triples(data, premise_number, building_type,
+                                      compiled)
+    ), data.get('street') is not None)
+
+
+def compact_many(records: Union[Iterable[tuple], dict]) \
+        -> Iterator[CompactFormats]:
+    """ Same as format_many, but yields CompactFormats, every distinct
+    portion is formatted once per batch
+    """
+    memo = {}
+    compiled = formatter.get_plans()
+
+    for record in iter_records(records):
+        yield _compact_record(memo, compiled, *record)
+
+
+def _compact_record(memo: dict, compiled: formatter.CompiledPlans,
+                    plain_address: str,
+                    address_components: Optional[dict],
+                    premise_number: str = None,
+                    building_type: int = None) -> CompactFormats:
+    data = address_components
+
+    if not data:
+        return CompactFormats(plain_address, (), False)
+
+    portions = []
+    for triple in portion_triples(data, premise_number, building_type,
+                                  compiled):
+        try:
+            portion = memo[triple]
+        except KeyError:
+            portion = memo[triple] = _intern(
+                formatter.format_portion(*triple, compiled))
+        portions.append(portion)
+
+    return CompactFormats(plain_address, tuple(portions),
+                          data.get('street') is not None)
@@ -0,0 +1,139 @@
+""" Bulk formatting of DB-API cursors
+
+    >>> cursor.execute('SELECT id, address, components, premise_number, '
+                       'building_type FROM premises')
+    >>> results = format_rows(cursor, columns={
+            'address': 'plain_address', 'components': 'address_components'})
+    >>> write_formats(connection.cursor(),
+                      'UPDATE premises SET full_address = ? WHERE id = ?',
+                      results, lambda row, formats: (formats['all'], row[0]))
+    >>> connection.commit()
+"""
+import json
+from collections.abc import Mapping
+from itertools import islice
+from typing import Callable, Iterable, Iterator, Optional, Sequence, Union
+
+from .formatter import component_keys, format_many, render_table
+
+__all__ = [
+    'format_rows',
+    'write_formats',
+]
+
+Columns = Union[Sequence[str], dict, None]
+
+
+def _names(rows, columns: Columns) -> Optional[list]:
+    """ Names of row positions: columns sequence, or cursor description
+    with columns dict renames
+    """
+    if columns is not None and not isinstance(columns, dict):
+        return list(columns)
+
+    description = getattr(rows, 'description', None)
+    if description is None:
+        return None
+
+    renames = columns or {}
+    return [renames.get(column[0], column[0]) for column in description]
+
+
+def _fetch(rows, chunksize: int) -> Iterator[list]:
+    fetchmany = getattr(rows, 'fetchmany', None)
+    if fetchmany is not None:
+        while True:
+            chunk = fetchmany(chunksize)
+            if not chunk:
+                return
+            yield chunk
+
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, chunksize))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _row_dict(row, names: Optional[list], renames: dict) -> dict:
+    if not isinstance(row, Mapping) and not hasattr(row, 'keys'):
+        if names is None:
+            raise ValueError('columns are required for rows without names')
+        return dict(zip(names, row))
+
+    # dict, либо sqlite3.Row и подобные строки с keys()
+    return {renames.get(key, key): row[key] for key in row.keys()}
+
+
+def row_record(row: dict, keys: set) -> tuple:
+    """ format_many record from row dict, address components are taken from
+    address_components column as JSON or dict, or from columns named as
+    KEYS value_key and type_key
+    """
+    address_components = row.get('address_components')
+    if isinstance(address_components, (str, bytes)):
+        address_components = json.loads(address_components)
+    elif address_components is None:
+        address_components = {key: value for key, value in row.items()
+                              if key in keys and value is not None}
+
+    premise_number = row.get('premise_number')
+    building_type = row.get('building_type')
+    return (
+        row.get('plain_address'),
+        address_components,
+        str(premise_number) if premise_number is not None else None,
+        int(building_type) if building_type is not None else None,
+    )
+
+
+def format_rows(rows, columns: Columns = None,
+                formats: Optional[Iterable[str]] = None,
+                chunksize: int = 1000,
+                render: str = 'unicode') -> Iterator[tuple]:
+    """ Formats DB-API cursor rows, or any iterable of rows, chunk by chunk
+    through format_many
+
+    :param rows: cursor, rows are fetched with fetchmany(chunksize),
+        or iterable of tuples or dicts
+    :param columns: names of tuple row positions, or dict of
+        column name -> key renames applied to cursor description and dict
+        rows, keys are plain_address, address_components, premise_number,
+        building_type and KEYS value_key and type_key
+    :param formats: optional iterable of format keys to build
+    :param render: unicode, plain or html, see render_formats
+    :return: iterator of (row, formats) pairs, rows are the original ones
+    """
+    if formats is not None:
+        formats = tuple(formats)
+    render_table(render)
+
+    names = _names(rows, columns)
+    renames = columns if isinstance(columns, dict) else {}
+    keys = component_keys()
+
+    for chunk in _fetch(rows, chunksize):
+        records = [row_record(_row_dict(row, names, renames), keys)
+                   for row in chunk]
+        yield from zip(chunk, format_many(records, formats=formats,
+                                          render=render))
+
+
+def write_formats(cursor, sql: str, results: Iterable[tuple],
+                  params: Callable[..., Sequence],
+                  chunksize: int = 1000) -> int:
+    """ Writes formats back with cursor.executemany by chunks, transaction
+    is committed by the caller
+
+    :param sql: statement with parameters, e.g. UPDATE ... WHERE id = ?
+    :param results: (row, formats) pairs from format_rows
+    :param params: params(row, formats) -> statement parameters
+    :return: number of written rows
+    """
+    written = 0
+    for chunk in _fetch(results, chunksize):
+        cursor.executemany(sql, [params(row, result)
+                                 for row, result in chunk])
+        written += len(chunk)
+    return written
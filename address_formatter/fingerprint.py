@@ -0,0 +1,118 @@
+""" Fingerprints of address components for deduplication
+
+Fingerprint is a hash of (address_component, component_type, value) of
+every portion check_portion would format, values are folded as search
+keys, so "Майская" and " майская" streets of the same type give the same
+fingerprint. Types are resolved through formatter plans as is, a type
+unknown to TYPES is marked, as check_portion fails on it. Address strings
+are not built.
+"""
+import hashlib
+from collections import namedtuple
+from functools import lru_cache
+from itertools import count
+from typing import Iterable, Iterator, Optional, Union
+
+from . import formatter
+from .cache import MISSING
+from .formatter import portion_triples
+from .search import normalize_key
+
+__all__ = [
+    'Bucket',
+    'fingerprint',
+    'group_fingerprints',
+    'iter_duplicates',
+]
+
+Bucket = namedtuple('Bucket', ['first', 'count'])
+
+# Разделители полей и порций в хешируемой строке
+FIELD_SEPARATOR = '\x1f'
+PORTION_SEPARATOR = '\x1e'
+# Метка порции с неизвестным типом, check_portion вернул бы IS_ERROR
+UNKNOWN_TYPE = '\x15'
+
+
+@lru_cache(maxsize=65536)
+def _fold(value) -> str:
+    """ Регионы и улицы повторяются, свертка кешируется """
+    return normalize_key(str(value))
+
+
+def fingerprint(address_components: Optional[dict],
+                premise_number: str = None,
+                building_type: int = None) -> str:
+    """ Hex digest of resolved address portions, the same for address
+    components whose values differ only in case, spaces, dots and no-break
+    characters or which differ in unused keys
+
+        >>> street = {"street": "Майская", "street_type_full": "улица"}
+        >>> fingerprint(street) == fingerprint(
+            {"street": "майская ", "street_type_full": "улица", "id": 1})
+        True
+        >>> fingerprint(street) == fingerprint(
+            {"street": "Майская", "street_type_full": "Улица"})
+        False
+    """
+    portions = []
+    if address_components:
+        compiled = formatter.COMPILED or formatter.get_plans()
+        plans = compiled.plans
+        for address_component, value, component_type in portion_triples(
+                address_components, premise_number, building_type,
+                compiled):
+            if value is None or component_type is None:
+                continue
+            if (address_component, component_type) in plans:
+                portion = (address_component, component_type, _fold(value))
+            else:
+                portion = (address_component, UNKNOWN_TYPE,
+                           str(component_type), _fold(value))
+            portions.append(FIELD_SEPARATOR.join(portion))
+
+    return hashlib.blake2b(PORTION_SEPARATOR.join(portions).encode('utf-8'),
+                           digest_size=16).hexdigest()
+
+
+def _fingerprint_item(item: Union[dict, tuple]) -> str:
+    """ Fingerprint of address components dict, or of format_many record
+    """
+    if isinstance(item, dict):
+        return fingerprint(item)
+    return fingerprint(*item[1:4])
+
+
+def group_fingerprints(items: Iterable[Union[dict, tuple]],
+                       ids: Optional[Iterable] = None) -> dict:
+    """ fingerprint -> Bucket(first, count) in one streaming pass, a bucket
+    keeps only the id of its first item and the number of items
+
+    :param items: address components dicts, or format_many records
+    :param ids: ids of items, positions by default
+    """
+    buckets = {}
+    for item_id, item in zip(ids if ids is not None else count(), items):
+        key = _fingerprint_item(item)
+        bucket = buckets.get(key)
+        buckets[key] = Bucket(item_id, 1) if bucket is None \
+            else Bucket(bucket.first, bucket.count + 1)
+    return buckets
+
+
+def iter_duplicates(items: Iterable[Union[dict, tuple]],
+                    ids: Optional[Iterable] = None) -> Iterator[tuple]:
+    """ Yields (id, first id) for every item whose fingerprint was seen
+    before, while reading items
+
+    :param items: address components dicts, or format_many records
+    :param ids: ids of items, positions by default
+    """
+    first_ids = {}
+    for item_id, item in zip(ids if ids is not None else count(), items):
+        key = _fingerprint_item(item)
+        first_id = first_ids.get(key, MISSING)
+        if first_id is MISSING:
+            first_ids[key] = item_id
+        else:
+            yield item_id, first_id
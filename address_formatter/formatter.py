@@ -1,10 +1,18 @@
+import hashlib
+import json
 import operator
 import re
-from itertools import groupby
-from typing import Optional, Union
+from itertools import groupby, repeat
+from typing import Callable, Iterable, Iterator, Optional, Union
+
+from . import cache
+from .cache import MISSING
 
 __all__ = [
     'all_formats',
+    'format_many',
+    'rebuild_plans',
+    'render_formats',
 ]
 
 RE_POSESSIVE = re.compile(r"""
@@ -15,13 +23,47 @@ RE_POSESSIVE = re.compile(r"""
 RE_SPACE_AFTER_DOT = re.compile(r"\.(?!\s)")
 RE_NONDIGITS = re.compile(r"\D")
 RE_NONLETTERS = re.compile(r"\W")
+# Все замены posessive_dot, space_after_dot и неразрывных символов за один
+# проход по строке, замена выбирается по имени сработавшей группы
+RE_NORMALIZE = re.compile(r"""
+(?<!\S)им(?P<posessive_space>\ |\Z)  # "им" перед пробелом или в конце строки
+|(?<!\S)им(?P<posessive>(?=\s))      # "им" перед прочими пробельными
+|(?P<dot>\.(?:\ |(?!\s)))             # точка без пробела, либо с пробелом
+|(?P<hyphen>-)
+|(?P<slash>/)
+""", re.VERBOSE)
+# Слова значения после space_after_dot, без промежуточной строки:
+# разделитель пробел, либо точка без пробела после нее
+RE_WORDS = re.compile(r"(?:[^ .]|\.(?=\s))+\.?|\.")
 
 NBSPACE = '\u00A0'
 NBHYPHEN = '\u2060-\u2060'
 NBSLASH = '\u2060/\u2060'
+WORD_JOINER = '\u2060'
+
+NORMALIZE_REPLACEMENTS = {
+    'posessive_space': f'им.{NBSPACE}',
+    'posessive': 'им.',
+    'dot': f'.{NBSPACE}',
+    'hyphen': NBHYPHEN,
+    'slash': NBSLASH,
+}
+
+# Цель вывода -> таблица str.translate готовых форматов, unicode как есть
+RENDER_TABLES = {
+    'unicode': None,
+    'plain': str.maketrans({NBSPACE: ' ', WORD_JOINER: None}),
+    'html': str.maketrans({
+        '&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;',
+        "'": '&#x27;', NBSPACE: '&nbsp;', WORD_JOINER: '&NoBreak;',
+    }),
+}
 
 IS_ERROR = object()
 
+SECTION_TYPE = "корпус"
+CONSTRUCTION_TYPE = "строение"
+
 
 def unique_justseen(iterable, key=None):
     """Yields elements in order, ignoring serial duplicates
@@ -239,7 +281,12 @@ def check_start_with_type(value: str, suffix_set: list) -> bool:
     if not suffix_set:
         return True
 
-    for word in value.split(' '):
+    return check_words_start_with_type(value.split(' '), suffix_set)
+
+
+def check_words_start_with_type(words: Iterable[str],
+                                suffix_set: list) -> bool:
+    for word in words:
         if not RE_NONDIGITS.search(word):
             continue
 
@@ -257,51 +304,277 @@ def check_start_with_type(value: str, suffix_set: list) -> bool:
     return False
 
 
-def check_portion(data: dict, address_component: str,
-                  value: Optional[str] = None,
-                  component_type: Optional[str] = None) \
-        -> Union[str, None, 'IS_ERROR']:
-    """Возвращает составные части адреса:
-        str при нормальной обработке
-        None если не пришел value, либо component_type
-        IS_ERROR если пришел неожиданный component_type
+def _normalize_match(match) -> str:
+    return NORMALIZE_REPLACEMENTS[match.lastgroup]
+
+
+def normalize_value(value: str) -> str:
+    """ За один проход делает то же, что цепочка
+    posessive_dot, space_after_dot и замены на неразрывные символы
+
+        >>> normalize_value('им.В.В.Петрова')
+        'им.\xa0В.\xa0В.\xa0Петрова'
+    """
+    return RE_NORMALIZE.sub(_normalize_match, value)
+
+
+def compile_matcher(suffix_set: list) -> Callable[[str], bool]:
+    """ Скомпилированный check_start_with_type для набора окончаний:
+    принимает исходное значение, до posessive_dot и space_after_dot,
+    решение принимается за один проход по словам RE_WORDS
+    """
+    if not suffix_set:
+        # Пустое значение - False, любое другое - True
+        return bool
+
+    suffixes = tuple(suffix_set)
+    numeral_endings = tuple(
+        ending for suffix in suffix_set
+        for ending in (f'-{suffix}', f'-{suffix[-1]}'))
+    strip_lengths = {len(suffix) + 1 for suffix in suffix_set}
+
+    if len(strip_lengths) != 1:
+        # check_numeral_suffix отрезает окончание первого подошедшего
+        # суффикса, для суффиксов разной длины порядок важен
+        def ordered_matcher(value: str) -> bool:
+            if not value:
+                return False
+            return check_words_start_with_type(RE_WORDS.findall(value),
+                                               suffix_set)
+
+        return ordered_matcher
+
+    strip_length = strip_lengths.pop()
+    findall = RE_WORDS.findall
+
+    def matcher(value: str) -> bool:
+        if not value:
+            return False
+
+        for word in findall(value):
+            # str.isdecimal совпадает с отсутствием \D в слове
+            if word.isdecimal():
+                continue
+
+            if word.endswith(numeral_endings):
+                number = word[:-strip_length]
+                if not number or number.isdecimal():
+                    continue
+
+            if word.endswith(suffixes):
+                continue
+
+            return True
+
+        return False
+
+    return matcher
+
+
+# tuple(suffix_set) -> matcher
+MATCHERS = {}
+
+
+def get_matcher(suffix_set: list) -> Callable[[str], bool]:
+    key = tuple(suffix_set)
+    matcher = MATCHERS.get(key)
+    if matcher is None:
+        matcher = MATCHERS[key] = compile_matcher(suffix_set)
+    return matcher
+
+
+def value_start_with_type(value: str, suffix_set: list) -> bool:
+    """ check_start_with_type по исходному значению, до posessive_dot и
+    space_after_dot: слова значения берутся через RE_WORDS
+    """
+    return get_matcher(suffix_set)(value)
+
+
+def escape_abbreviation(abbreviation: str) -> str:
+    return abbreviation.replace(" ", NBSPACE) \
+        .replace("-", NBHYPHEN).replace("/", NBSLASH)
+
+
+class PortionPlan:
+    """ Скомпилированный форматтер порции адреса для пары
+    (address_component, component_type) из TYPES:
+    сокращение хранится уже с точкой и неразрывными символами
+    """
+    __slots__ = ('abbreviation', 'suffix_set', 'matcher')
+
+    def __init__(self, abbreviation: str, suffix_set: list):
+        self.abbreviation = escape_abbreviation(dot_after_word(abbreviation))
+        self.suffix_set = suffix_set
+        self.matcher = get_matcher(suffix_set)
+
+    def start_with_type(self, value: str) -> bool:
+        return self.matcher(value)
+
+    def __call__(self, value: str) -> str:
+        start_with_type = self.start_with_type(value)
+        value = normalize_value(value)
+
+        return f"{self.abbreviation}{NBSPACE}{value}" if start_with_type \
+            else f"{value}{NBSPACE}{self.abbreviation}"
+
+    def __repr__(self):
+        return f'PortionPlan({self.abbreviation!r}, {self.suffix_set!r})'
+
+
+def compile_plans(types: dict) -> dict:
+    """ (address_component, component_type) -> PortionPlan """
+    return {
+        (address_component, component_type): PortionPlan(
+            component_tuple['abbreviation'], component_tuple['suffix_set'])
+        for address_component, component_types in types.items()
+        for component_type, component_tuple in component_types.items()
+    }
+
+
+def compile_key_plans(keys: dict) -> dict:
+    """ address_component -> (value_key, type_key) """
+    return {
+        address_component: (component_keys['value_key'],
+                            component_keys['type_key'])
+        for address_component, component_keys in keys.items()
+    }
+
+
+def rules_hash(keys: dict, types: dict) -> str:
+    """ Stable hash of KEYS and TYPES """
+    raw = json.dumps([keys, types], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()[:16]
+
+
+class CompiledPlans:
+    """ Скомпилированные KEYS и TYPES с версией правил, заменяются
+    целиком одним присваиванием, поэтому читателям не нужны блокировки.
+    Запись форматируется планами, прочитанными один раз, так что ключи
+    и типы одной записи всегда из одних и тех же таблиц.
+    """
+    __slots__ = ('key_plans', 'plans', 'version')
+
+    def __init__(self, keys: dict, types: dict):
+        self.key_plans = compile_key_plans(keys)
+        self.plans = compile_plans(types)
+        self.version = rules_hash(keys, types)
+
+
+# Компилируются при первом использовании, см. get_plans
+COMPILED = None  # type: Optional[CompiledPlans]
+# Вызывается перед первой компиляцией, registry загружает им файл из
+# переменной окружения
+PLANS_LOADER = None  # type: Optional[Callable[[], None]]
+
+
+def set_plans_loader(loader: Optional[Callable[[], None]]):
+    """ loader() is called once before plans are compiled on first use,
+    e.g. to load KEYS and TYPES from a file
+    """
+    global PLANS_LOADER  # pylint: disable=global-statement
+
+    PLANS_LOADER = loader
+
+
+def get_plans() -> CompiledPlans:
+    compiled = COMPILED
+    if compiled is None:
+        compiled = _load_plans()
+    return compiled
+
+
+def _load_plans() -> CompiledPlans:
+    loader = PLANS_LOADER
+    if loader is not None:
+        loader()
+
+    return COMPILED or rebuild_plans()
+
+
+def rebuild_plans() -> CompiledPlans:
+    """ Recompiles formatter plans after KEYS or TYPES were changed at
+    runtime, cached portions and formats are dropped
+    """
+    global COMPILED  # pylint: disable=global-statement
+
+    compiled = CompiledPlans(KEYS, TYPES)
+    COMPILED = compiled
+    cache.clear_cache()
+    return compiled
+
+
+def resolve_portion(data: dict, address_component: str,
+                    value: Optional[str] = None,
+                    component_type: Optional[str] = None,
+                    compiled: Optional[CompiledPlans] = None) -> tuple:
+    """Возвращает (value, component_type) порции адреса:
+    берет их из data, либо из параметров функции
     """
     # Целенаправленно поднимаем исключение если компонент на нашелся
-    keys = KEYS[address_component]
-    value_key = keys['value_key']
-    type_key = keys['type_key']
+    value_key, type_key = (compiled or COMPILED or get_plans()).key_plans[
+        address_component]
 
-    # берем value и component_type из data, либо из параметров функции
     if value_key is not None:
         value = data.get(value_key, value)
 
     if type_key is not None:
         component_type = data.get(type_key, component_type)
 
+    return value, component_type
+
+
+def format_portion(address_component: str, value: Optional[str],
+                   component_type: Optional[str],
+                   compiled: Optional[CompiledPlans] = None) \
+        -> Union[str, None, 'IS_ERROR']:
+    """Форматирует порцию адреса по уже определенным value и component_type
+    """
+    portions_cache = cache.PORTIONS
+    if portions_cache is None:
+        return _format_portion(address_component, value, component_type,
+                               compiled)
+
+    # Планы входят в ключ: порция старых планов, записанная в кеш после
+    # их замены, по новым планам уже не найдется
+    compiled = compiled or COMPILED or get_plans()
+    key = (compiled, address_component, value, component_type)
+    portion = portions_cache.get(key)
+    if portion is MISSING:
+        portion = _format_portion(address_component, value, component_type,
+                                  compiled)
+        portions_cache.set(key, portion)
+
+    return portion
+
+
+def _format_portion(address_component: str, value: Optional[str],
+                    component_type: Optional[str],
+                    compiled: Optional[CompiledPlans] = None) \
+        -> Union[str, None, 'IS_ERROR']:
     if value is None or component_type is None:
         return None
 
-    try:
-        component_tuple = TYPES[address_component][component_type]
-        abbreviation = component_tuple['abbreviation']
-        suffix_set = component_tuple['suffix_set']
-    except KeyError:
+    plan = (compiled or COMPILED or get_plans()).plans.get(
+        (address_component, component_type))
+    if plan is None:
         return IS_ERROR
 
-    value = posessive_dot(value)
-    value = space_after_dot(value)
-    abbreviation = dot_after_word(abbreviation)
+    return plan(value)
 
-    start_with_type = check_start_with_type(value, suffix_set)
 
-    value = value.replace(". ", f'.{NBSPACE}').replace("-", NBHYPHEN) \
-        .replace("/", NBSLASH)
-
-    abbreviation = abbreviation.replace(" ", NBSPACE) \
-        .replace("-", NBHYPHEN).replace("/", NBSLASH)
-
-    return f"{abbreviation}{NBSPACE}{value}" if start_with_type \
-        else f"{value}{NBSPACE}{abbreviation}"
+def check_portion(data: dict, address_component: str,
+                  value: Optional[str] = None,
+                  component_type: Optional[str] = None) \
+        -> Union[str, None, 'IS_ERROR']:
+    """Возвращает составные части адреса:
+        str при нормальной обработке
+        None если не пришел value, либо component_type
+        IS_ERROR если пришел неожиданный component_type
+    """
+    compiled = COMPILED or get_plans()
+    return format_portion(address_component, *resolve_portion(
+        data, address_component, value, component_type, compiled),
+        compiled)
 
 
 def format_result(portions: list) -> str:
@@ -317,8 +590,191 @@ def format_result(portions: list) -> str:
     return ", ".join(unique_justseen(clean_porions))
 
 
+def portion_triples(data: dict, premise_number: str = None,
+                    building_type: int = None,
+                    compiled: Optional[CompiledPlans] = None) -> list:
+    """ (address_component, value, component_type) for every address
+    component, in the order they appear in the full address
+    """
+    # 2, 4 -> garage or parking
+    ownership_type = "место" if building_type in [2, 4] else "квартира"
+    compiled = compiled or COMPILED or get_plans()
+
+    return [
+        (address_component,) + resolve_portion(
+            data, address_component, value, component_type, compiled)
+        for address_component, value, component_type in (
+            (AddressComponent.REGION, None, None),
+            (AddressComponent.DISTRICT, None, None),
+            (AddressComponent.CITY, None, None),
+            (AddressComponent.TOWNSHIP, None, None),
+            (AddressComponent.VILLAGE, None, None),
+            (AddressComponent.STREET, None, None),
+            (AddressComponent.BUILDING, None, None),
+            (AddressComponent.SECTION, None, SECTION_TYPE),
+            (AddressComponent.CONSTRUCTION, None, CONSTRUCTION_TYPE),
+            (AddressComponent.OWNERSHIP, premise_number, ownership_type),
+        )
+    ]
+
+
+def component_keys() -> set:
+    """ Keys of address_components dict formatter reads """
+    return {key for value_key, type_key in (COMPILED or get_plans())
+            .key_plans.values() for key in (value_key, type_key)
+            if key is not None}
+
+
+def plain_formats(plain_address: str,
+                  formats: Optional[Iterable[str]] = None) -> dict:
+    if formats is None:
+        formats = FORMAT_KEYS
+    return {key: plain_address for key in formats}
+
+
+def _format_components(has_street: bool) -> dict:
+    region = AddressComponent.REGION
+    district = AddressComponent.DISTRICT
+    city = AddressComponent.CITY
+    township = AddressComponent.TOWNSHIP
+    village = AddressComponent.VILLAGE
+    street = AddressComponent.STREET
+    building = AddressComponent.BUILDING
+    section = AddressComponent.SECTION
+    construction = AddressComponent.CONSTRUCTION
+    ownership = AddressComponent.OWNERSHIP
+
+    return {
+        'all': (
+            region,
+            district,
+            city,
+            township,
+            village,
+            street,
+            building,
+            section,
+            construction,
+            ownership,
+        ),
+        'street_only': (
+            street if has_street else village,
+        ),
+        'finishing_with_village': (
+            region,
+            district,
+            city,
+            township,
+        ) + ((village,) if has_street else ()),
+        'starting_with_street': ((village,) if not has_street else ()) + (
+            street,
+            building,
+            section,
+            construction,
+            ownership,
+        ),
+        'finishing_with_street': (
+            region,
+            district,
+            city,
+            township,
+            village,
+            street,
+        ),
+    }
+
+
+# Порции адреса каждого формата, в зависимости от того, есть ли улица
+FORMAT_COMPONENTS = {
+    has_street: _format_components(has_street)
+    for has_street in (True, False)
+}
+FORMAT_KEYS = tuple(FORMAT_COMPONENTS[True])
+
+
+class LazyPortions(dict):
+    """ address_component -> formatted portion, portions are formatted on
+    first access only
+    """
+    __slots__ = ('triples', 'format_portion', 'compiled')
+
+    def __init__(self, triples: list, portion_formatter=None,
+                 compiled: Optional[CompiledPlans] = None):
+        super().__init__()
+        self.triples = {address_component: (value, component_type)
+                        for address_component, value, component_type
+                        in triples}
+        self.format_portion = portion_formatter
+        self.compiled = compiled
+
+    def __missing__(self, address_component: str):
+        value, component_type = self.triples[address_component]
+        if self.format_portion is not None:
+            portion = self.format_portion(address_component, value,
+                                          component_type)
+        else:
+            portion = format_portion(address_component, value,
+                                     component_type, self.compiled)
+        self[address_component] = portion
+        return portion
+
+
+def compose_formats(plain_address: str, data: dict, portions: dict,
+                    formats: Optional[Iterable[str]] = None) -> dict:
+    """ Builds address formats from formatted portions
+
+    :param portions: dict of address_component -> formatted portion
+    :param formats: format keys to build, all formats if None
+    """
+    format_components = FORMAT_COMPONENTS[data.get('street') is not None]
+    if formats is None:
+        formats = FORMAT_KEYS
+
+    return {
+        key: format_result([
+            portions[address_component]
+            for address_component in format_components[key]
+        ]) or plain_address
+        for key in formats
+    }
+
+
+def render_table(render: str) -> Optional[dict]:
+    try:
+        return RENDER_TABLES[render]
+    except KeyError:
+        raise ValueError(f'unknown render target {render!r}') from None
+
+
+def _render(result: dict, table: Optional[dict]) -> dict:
+    if table is None:
+        return result
+    return {key: value.translate(table) if value is not None else None
+            for key, value in result.items()}
+
+
+def render_formats(result: dict, render: str) -> dict:
+    """ Formats of all_formats result for another render target:
+        unicode - as is, with no-break spaces and word joiners around
+            hyphens and slashes
+        plain - with ordinary spaces, hyphens and slashes, e.g. for CSV,
+            SMS and search
+        html - escaped, with &nbsp; and &NoBreak;
+
+    Every target is a str.translate of the same formats, so several
+    renderings cost one formatting.
+
+        >>> formats = all_formats(plain_address, address_components)
+        >>> render_formats(formats, 'html')['all']
+        'г.&nbsp;Серов, ул.&nbsp;Майская'
+    """
+    return _render(result, render_table(render))
+
+
 def all_formats(plain_address: str, address_components: Optional[dict],  # noqa
-                premise_number: str = None, building_type: int = None):
+                premise_number: str = None, building_type: int = None,
+                formats: Optional[Iterable[str]] = None,
+                render: str = 'unicode'):
     """ Address formatter on address components from housing building
 
     :param plain_address: default address if failed to build address
@@ -332,6 +788,9 @@ def all_formats(plain_address: str, address_components: Optional[dict],  # noqa
         starting_with_street - street, building, section, construction, premise
         finishing_with_street - region, district, city,
             township, village, street
+    :param formats: optional iterable of format keys to build,
+        portions used only by other formats are not computed
+    :param render: unicode, plain or html, see render_formats
 
         >>> address_components = {
             "region": "Курганская", "region_type_full": "область",
@@ -348,75 +807,133 @@ def all_formats(plain_address: str, address_components: Optional[dict],  # noqa
         с. Дрянное, ул. Майская, д. 5, корп. 6, стр. 7, м. 45
     """
     data = address_components
+    table = render_table(render)
+
+    if formats is not None:
+        formats = tuple(formats)
 
     if not data:
-        return {
-            'all': plain_address,
-            'street_only': plain_address,
-            'finishing_with_village': plain_address,
-            'starting_with_street': plain_address,
-            'finishing_with_street': plain_address,
-        }
+        return _render(plain_formats(plain_address, formats), table)
 
-    section_type = "корпус"
-    construction_type = "строение"
-    # 2, 4 -> garage or parking
-    ownership_type = "место" if building_type in [2, 4] else "квартира"
+    compiled = COMPILED or get_plans()
+    triples = portion_triples(data, premise_number, building_type, compiled)
 
-    region = check_portion(data, AddressComponent.REGION)
-    district = check_portion(data, AddressComponent.DISTRICT)
-    city = check_portion(data, AddressComponent.CITY)
-    township = check_portion(data, AddressComponent.TOWNSHIP)
-    village = check_portion(data, AddressComponent.VILLAGE)
-    street = check_portion(data, AddressComponent.STREET)
-    building = check_portion(data, AddressComponent.BUILDING)
-    section = check_portion(data, AddressComponent.SECTION,
-                            component_type=section_type)
-    construction = check_portion(data, AddressComponent.CONSTRUCTION,
-                                 component_type=construction_type)
-    ownership = check_portion(data, AddressComponent.OWNERSHIP,
-                              value=premise_number,
-                              component_type=ownership_type)
-
-    data_street = data.get('street')
+    formats_cache = cache.FORMATS
+    if formats_cache is not None:
+        # Все, от чего зависит результат: планы, plain_address и порции
+        # адреса, в кеше формат unicode, остальные цели получаются из него
+        key = (compiled, plain_address, tuple(triples), formats)
+        result = formats_cache.get(key)
+        if result is not MISSING:
+            return _render(dict(result), table)
 
-    return {
-        'all': format_result([
-            region,
-            district,
-            city,
-            township,
-            village,
-            street,
-            building,
-            section,
-            construction,
-            ownership,
-        ]) or plain_address,
-        'street_only': format_result([
-            street if data_street is not None else village,
-        ]) or plain_address,
-        'finishing_with_village': format_result([
-            region,
-            district,
-            city,
-            township,
-        ] + ([village] if data_street is not None else [])
-        ) or plain_address,
-        'starting_with_street': format_result(
-            ([village] if data_street is None else []) + [
-                street,
-                building,
-                section,
-                construction,
-                ownership,
-            ]) or plain_address,
-        'finishing_with_street': format_result([
-            region,
-            district,
-            city,
-            township,
-            village,
-            street,
-        ]) or plain_address,
-    }
+    result = compose_formats(plain_address, data,
+                             LazyPortions(triples, compiled=compiled),
+                             formats)
+
+    if formats_cache is not None:
+        formats_cache.set(key, result)
+        return _render(dict(result), table)
+
+    return _render(result, table)
+
+
+def iter_records(records: Union[Iterable[tuple], dict]) -> Iterable[tuple]:
+    """ Record tuples from iterable of tuples, or from columnar dict of lists
+    with plain_address, address_components, premise_number and
+    building_type keys
+    """
+    if isinstance(records, dict):
+        return zip(
+            records['plain_address'],
+            records['address_components'],
+            records.get('premise_number') or repeat(None),
+            records.get('building_type') or repeat(None),
+        )
+
+    return records
+
+
+def format_many(records: Union[Iterable[tuple], dict],
+                stats: Optional[dict] = None,
+                formats: Optional[Iterable[str]] = None,
+                render: str = 'unicode',
+                memo: Optional[dict] = None) -> Iterator[dict]:
+    """ Batch address formatter, yields the same dicts as all_formats
+
+    Every distinct (address_component, value, component_type) portion is
+    formatted only once per batch, repeated regions, cities and streets are
+    taken from the batch memo.
+
+    :param records: iterable of
+        (plain_address, address_components, premise_number, building_type)
+        tuples, premise_number and building_type may be omitted,
+        or columnar dict of lists with the same keys
+    :param stats: optional dict, updated in place while iterating:
+        records - number of formatted records
+        portions - number of formatted portions with value and
+            component_type
+        deduplicated - number of portions taken from the batch memo
+    :param formats: optional iterable of format keys to build
+    :param render: unicode, plain or html, see render_formats
+    :param memo: optional dict of formatted portions to share between
+        batches, it is not locked, so every thread needs its own one
+
+        >>> stats = {}
+        >>> results = list(format_many([
+            ("", {"city": "Серов", "city_type_full": "город"}, "1"),
+            ("", {"city": "Серов", "city_type_full": "город"}, "2"),
+        ], stats))
+        >>> stats
+        {'records': 2, 'portions': 4, 'deduplicated': 1}
+    """
+    records = iter_records(records)
+    table = render_table(render)
+
+    if formats is not None:
+        formats = tuple(formats)
+
+    if stats is None:
+        stats = {}
+    stats.update(records=0, portions=0, deduplicated=0)
+
+    if memo is None:
+        memo = {}
+    # Вся пачка форматируется одними планами
+    compiled = COMPILED or get_plans()
+
+    def memo_portion(address_component, value, component_type):
+        if value is None or component_type is None:
+            return None
+
+        stats['portions'] += 1
+        triple = (address_component, value, component_type)
+        try:
+            portion = memo[triple]
+            stats['deduplicated'] += 1
+        except KeyError:
+            portion = memo[triple] = format_portion(*triple, compiled)
+
+        return portion
+
+    for record in records:
+        yield _render(_format_record(memo_portion, stats, formats, compiled,
+                                     *record), table)
+
+
+def _format_record(memo_portion, stats: dict, formats: Optional[tuple],
+                   compiled: CompiledPlans,
+                   plain_address: str, address_components: Optional[dict],
+                   premise_number: str = None,
+                   building_type: int = None) -> dict:
+    data = address_components
+    stats['records'] += 1
+
+    if not data:
+        return plain_formats(plain_address, formats)
+
+    portions = LazyPortions(
+        portion_triples(data, premise_number, building_type, compiled),
+        memo_portion)
+
+    return compose_formats(plain_address, data, portions, formats)
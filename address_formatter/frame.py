@@ -0,0 +1,131 @@
+""" pandas integration, requires pik-address-formatter[pandas]
+
+Importing the module registers df.address accessor:
+
+    >>> import address_formatter.frame
+    >>> df.join(df.address.formats(formats=['all'], categorical=True))
+"""
+from typing import Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from .formatter import (
+    FORMAT_KEYS,
+    component_keys,
+    format_many,
+    render_formats,
+    render_table,
+)
+
+__all__ = [
+    'format_frame',
+]
+
+PLAIN_ADDRESS = 'plain_address'
+PREMISE_NUMBER = 'premise_number'
+BUILDING_TYPE = 'building_type'
+
+
+def component_columns(df: pd.DataFrame) -> List[str]:
+    """ Columns of df named as address components keys """
+    keys = component_keys()
+    return [column for column in df.columns if column in keys]
+
+
+def _none(value):
+    return None if value is None or value is pd.NA or \
+        (isinstance(value, float) and np.isnan(value)) else value
+
+
+def _premise_number(value) -> Optional[str]:
+    value = _none(value)
+    if value is None:
+        return None
+    # Целые номера становятся float в колонках с NaN
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value)
+
+
+def _building_type(value) -> Optional[int]:
+    value = _none(value)
+    return int(value) if value is not None else None
+
+
+def format_frame(df: pd.DataFrame, formats: Optional[Iterable[str]] = None,
+                 components: Optional[List[str]] = None,
+                 plain_address: str = PLAIN_ADDRESS,
+                 premise_number: str = PREMISE_NUMBER,
+                 building_type: str = BUILDING_TYPE,
+                 categorical: bool = False,
+                 render: str = 'unicode') -> pd.DataFrame:
+    """ Formats every row of df, each unique combination of columns is
+    formatted once through format_many and broadcast back by integer codes
+
+    :param df: frame with address components columns (region,
+        region_type_full, ...), plain_address, premise_number and
+        building_type columns, the last three are optional
+    :param formats: format keys to build, all by default
+    :param components: address components columns, all columns named as
+        KEYS value_key or type_key by default
+    :param categorical: return categorical columns, results repeat a lot,
+        so categoricals take much less memory
+    :param render: unicode, plain or html, see render_formats
+    :return: frame with one column per format and index of df
+    """
+    render_table(render)
+    formats = tuple(formats) if formats is not None else FORMAT_KEYS
+    if components is None:
+        components = component_columns(df)
+
+    columns = list(components) + [
+        column for column in (plain_address, premise_number, building_type)
+        if column in df.columns]
+
+    if not len(df) or not columns:
+        empty = [None] * len(df) if not columns else []
+        return pd.DataFrame(
+            {key: pd.Series(empty, dtype=object) for key in formats},
+            index=df.index)
+
+    keys = df[columns]
+    codes = keys.groupby(columns, sort=False, dropna=False).ngroup() \
+        .to_numpy()
+    uniques = keys.drop_duplicates()
+
+    records = (
+        (
+            _none(row.get(plain_address)),
+            {column: _none(row[column]) for column in components},
+            _premise_number(row.get(premise_number)),
+            _building_type(row.get(building_type)),
+        )
+        for row in uniques.to_dict('records')
+    )
+    results = list(format_many(records, formats=formats, render=render))
+
+    data = {}
+    for key in formats:
+        values = [result[key] for result in results]
+        if categorical:
+            value_codes, categories = pd.factorize(np.asarray(
+                values, dtype=object))
+            data[key] = pd.Categorical.from_codes(
+                value_codes[codes], categories=categories)
+        else:
+            data[key] = np.asarray(values, dtype=object)[codes]
+
+    return pd.DataFrame(data, index=df.index)
+
+
+@pd.api.extensions.register_dataframe_accessor('address')
+class AddressAccessor:
+    """ df.address.formats(...) is format_frame(df, ...) """
+
+    def __init__(self, df: pd.DataFrame):
+        self._df = df
+
+    def formats(self, formats: Optional[Iterable[str]] = None,
+                **kwargs) -> pd.DataFrame:
+        return format_frame(self._df, formats, **kwargs)
@@ -0,0 +1,224 @@
+from collections import defaultdict, namedtuple
+from typing import Iterable, List, Optional, Union
+
+from . import formatter
+from .formatter import (
+    FORMAT_COMPONENTS,
+    FORMAT_KEYS,
+    format_many,
+    portion_triples,
+)
+
+__all__ = [
+    'Change',
+    'IncrementalFormatter',
+]
+
+Change = namedtuple('Change', ['id', 'format_key', 'old', 'new'])
+
+
+def _copy_keys(keys: dict) -> dict:
+    return {address_component: dict(component_keys)
+            for address_component, component_keys in keys.items()}
+
+
+def _copy_types(types: dict) -> dict:
+    return {
+        address_component: {
+            component_type: dict(value)
+            for component_type, value in component_types.items()
+        }
+        for address_component, component_types in types.items()
+    }
+
+
+def changed_types(old_types: dict, new_types: dict) -> set:
+    """ (address_component, component_type) added, removed or changed
+    between two TYPES tables
+    """
+    changed = set()
+    for address_component in set(old_types) | set(new_types):
+        old = old_types.get(address_component, {})
+        new = new_types.get(address_component, {})
+        changed.update(
+            (address_component, component_type)
+            for component_type in set(old) | set(new)
+            if old.get(component_type) != new.get(component_type))
+    return changed
+
+
+class IncrementalFormatter:
+    """ Formatted dataset which is re-formatted by changes only
+
+    Reverse indexes map (address_component, value) and
+    (address_component, component_type) of every portion to ids of records,
+    so renamed streets or changed TYPES entries re-format only records with
+    these portions, and only formats with these portions.
+
+        >>> dataset = IncrementalFormatter({1: record, 2: other_record})
+        >>> dataset.rename('street', 'Майская', 'Первомайская')
+        [Change(id=1, format_key='all', old='...', new='...'), ...]
+        >>> load_registry('registry.json')
+        >>> dataset.refresh()
+
+    :param records: mapping or iterable of (id, record) pairs, records are
+        the same tuples as format_many takes
+    :param formats: format keys to keep, all by default
+    """
+
+    def __init__(self, records: Union[dict, Iterable[tuple]] = (),
+                 formats: Optional[Iterable[str]] = None):
+        self.formats = tuple(formats) if formats is not None else FORMAT_KEYS
+        self.records = {}
+        self.results = {}
+        self._values = defaultdict(set)
+        self._types = defaultdict(set)
+        # Копии, а не ссылки: KEYS и TYPES могут меняться на месте
+        self._keys = _copy_keys(formatter.KEYS)
+        self._types_snapshot = _copy_types(formatter.TYPES)
+        self.update(records)
+
+    def __len__(self):
+        return len(self.records)
+
+    def __getitem__(self, record_id) -> dict:
+        return self.results[record_id]
+
+    def _index(self, record_id, record: tuple, add: bool):
+        data = record[1] if len(record) > 1 else None
+        if not data:
+            return
+
+        for address_component, value, component_type in portion_triples(
+                data, *record[2:4]):
+            keys = []
+            if value is not None:
+                keys.append((self._values, (address_component, value)))
+                if component_type is not None:
+                    keys.append((self._types,
+                                 (address_component, component_type)))
+
+            for index, key in keys:
+                if add:
+                    index[key].add(record_id)
+                else:
+                    ids = index[key]
+                    ids.discard(record_id)
+                    if not ids:
+                        del index[key]
+
+    def _reformat(self, records: dict, formats: tuple) -> List[Change]:
+        """ Formats records by id, updates results and indexes """
+        changes = []
+        results = format_many(records.values(), formats=formats)
+
+        for (record_id, record), result in zip(records.items(), results):
+            old_record = self.records.get(record_id)
+            if old_record is not None:
+                self._index(record_id, old_record, add=False)
+            self._index(record_id, record, add=True)
+            self.records[record_id] = record
+
+            old = self.results.setdefault(record_id, {})
+            for key in formats:
+                if old.get(key) != result[key]:
+                    changes.append(
+                        Change(record_id, key, old.get(key), result[key]))
+                    old[key] = result[key]
+
+        return changes
+
+    def update(self, records: Union[dict, Iterable[tuple]]) -> List[Change]:
+        """ Replaces records by id, record None deletes it
+
+        :param records: mapping or iterable of (id, new record) pairs
+        :return: changed formats, old is None for added records and new is
+            None for deleted ones
+        """
+        if isinstance(records, dict):
+            records = records.items()
+
+        changes = []
+        updated = {}
+        for record_id, record in records:
+            if record is not None:
+                updated[record_id] = tuple(record)
+                continue
+
+            updated.pop(record_id, None)
+            old_record = self.records.pop(record_id, None)
+            if old_record is None:
+                continue
+            self._index(record_id, old_record, add=False)
+            changes.extend(
+                Change(record_id, key, value, None)
+                for key, value in self.results.pop(record_id).items())
+
+        return changes + self._reformat(updated, self.formats)
+
+    def affected_formats(self, address_component: str) -> tuple:
+        """ Format keys containing portion of address_component """
+        return tuple(
+            key for key in self.formats
+            if any(address_component in components[key]
+                   for components in FORMAT_COMPONENTS.values()))
+
+    def rename(self, address_component: str, value: str,
+               new_value: Optional[str]) -> List[Change]:
+        """ Replaces value of address component in every record with it,
+        e.g. renamed street
+        """
+        value_key = formatter.KEYS[address_component]['value_key']
+        if value_key is None:
+            raise ValueError(f'{address_component} has no value key')
+
+        records = {}
+        for record_id in self._values.get((address_component, value), ()):
+            record = self.records[record_id]
+            records[record_id] = (
+                record[:1] + (dict(record[1], **{value_key: new_value}),)
+                + record[2:])
+
+        # Без улицы меняются и форматы с village
+        formats = self.affected_formats(address_component) \
+            if address_component != formatter.AddressComponent.STREET \
+            or new_value is not None else self.formats
+        return self._reformat(records, formats)
+
+    def reformat_types(self, types: Iterable[tuple]) -> List[Change]:
+        """ Re-formats records with portions of changed
+        (address_component, component_type) entries of TYPES
+        """
+        records = {}
+        components = set()
+        for address_component, component_type in types:
+            ids = self._types.get((address_component, component_type), ())
+            if ids:
+                components.add(address_component)
+            for record_id in ids:
+                records[record_id] = self.records[record_id]
+
+        formats = tuple(
+            key for key in self.formats
+            if any(key in self.affected_formats(address_component)
+                   for address_component in components))
+        return self._reformat(records, formats)
+
+    def refresh(self) -> List[Change]:
+        """ Re-formats records affected by KEYS or TYPES changed since the
+        last refresh, e.g. after load_registry
+        """
+        keys, types = formatter.KEYS, formatter.TYPES
+        old_types = self._types_snapshot
+        self._types_snapshot = _copy_types(types)
+
+        if keys != self._keys:
+            # Другие ключи меняют сами порции, индексы строятся заново
+            self._keys = _copy_keys(keys)
+            records = self.records
+            self.records = {}
+            self._values.clear()
+            self._types.clear()
+            return self._reformat(records, self.formats)
+
+        return self.reformat_types(changed_types(old_types, types))
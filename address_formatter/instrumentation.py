@@ -0,0 +1,206 @@
+""" Opt-in instrumentation of formatter hot path
+
+enable_instrumentation replaces formatter functions with timed wrappers,
+disable_instrumentation puts the originals back, so there is no overhead
+while instrumentation is off.
+
+Portions are counted when they are formatted: format_many formats every
+distinct portion once per call and takes repeats from its memo, enabled
+portions cache and PrefixTree skip formatting as well, so counters of
+batches are counts of distinct portions, not of portions of every record.
+"""
+import bisect
+import time
+from collections import Counter
+from functools import wraps
+from threading import Lock
+from typing import Callable, Optional
+
+from . import formatter
+
+__all__ = [
+    'enable_instrumentation',
+    'disable_instrumentation',
+    'get_instrumentation',
+]
+
+# Верхние границы корзин гистограмм, в секундах
+BUCKETS = (1e-6, 2e-6, 5e-6, 1e-5, 2e-5, 5e-5, 1e-4, 2e-4, 5e-4, 1e-3,
+           float('inf'))
+
+# Имя гистограммы -> функция formatter, которую она измеряет
+TIMED_FUNCTIONS = {
+    'check_portion': 'format_portion',
+    'check_start_with_type': 'PortionPlan.start_with_type',
+    'format_result': 'format_result',
+}
+
+
+class Histogram:
+    __slots__ = ('count', 'sum', 'buckets')
+
+    def __init__(self):
+        self.count = 0
+        self.sum = 0.0
+        self.buckets = [0] * len(BUCKETS)
+
+    def observe(self, seconds: float):
+        self.count += 1
+        self.sum += seconds
+        self.buckets[bisect.bisect_left(BUCKETS, seconds)] += 1
+
+    def snapshot(self) -> dict:
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'buckets': dict(zip(BUCKETS, self.buckets)),
+        }
+
+
+class Instrumentation:
+    """ Counters and timing histograms of formatter calls
+
+    :param hook: optional callback(metric, value, labels) called on every
+        observation, e.g. for prometheus or statsd exporter
+    """
+
+    def __init__(self, hook: Optional[Callable] = None):
+        self.hook = hook
+        self._lock = Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            # (address_component, status) -> count, status ok|empty|error
+            self.portions = Counter()
+            # (address_component, component_type) -> count
+            self.unknown_types = Counter()
+            self.timings = {name: Histogram() for name in TIMED_FUNCTIONS}
+
+    def observe_portion(self, address_component: str, component_type,
+                        portion):
+        if portion is formatter.IS_ERROR:
+            status = 'error'
+        elif portion is None:
+            status = 'empty'
+        else:
+            status = 'ok'
+
+        with self._lock:
+            self.portions[address_component, status] += 1
+            if status == 'error':
+                self.unknown_types[address_component, component_type] += 1
+
+        if self.hook is not None:
+            self.hook('portions', 1, {'component': address_component,
+                                      'status': status})
+            if status == 'error':
+                self.hook('unknown_types', 1, {
+                    'component': address_component,
+                    'type': component_type,
+                })
+
+    def observe_timing(self, name: str, seconds: float):
+        with self._lock:
+            self.timings[name].observe(seconds)
+
+        if self.hook is not None:
+            self.hook(name, seconds, {})
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                'portions': dict(self.portions),
+                'unknown_types': dict(self.unknown_types),
+                'timings': {name: histogram.snapshot()
+                            for name, histogram in self.timings.items()},
+            }
+
+    def timed(self, name: str, function: Callable) -> Callable:
+        """ function wrapper observing its timing in name histogram """
+        timer = time.perf_counter
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            started = timer()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.observe_timing(name, timer() - started)
+
+        return wrapper
+
+    def timed_portion(self, function: Callable) -> Callable:
+        """ format_portion wrapper observing its timing and portion
+        status
+        """
+        timer = time.perf_counter
+
+        @wraps(function)
+        def format_portion(address_component, value, component_type,
+                           compiled=None):
+            started = timer()
+            portion = function(address_component, value, component_type,
+                               compiled)
+            self.observe_timing('check_portion', timer() - started)
+            self.observe_portion(address_component, component_type, portion)
+            return portion
+
+        return format_portion
+
+
+def _resolve(function_name: str) -> tuple:
+    """ (owner, attribute) of formatter function or class method """
+    owner = formatter
+    *path, attribute = function_name.split('.')
+    for name in path:
+        owner = getattr(owner, name)
+    return owner, attribute
+
+
+_INSTRUMENTATION = None  # type: Optional[Instrumentation]
+_ORIGINALS = {}
+
+
+def enable_instrumentation(hook: Optional[Callable] = None) \
+        -> Instrumentation:
+    """ Starts collecting counters and timings of formatter calls
+
+        >>> instrumentation = enable_instrumentation()
+        >>> all_formats("", {"street": "Майская", "street_type_full": "foo"})
+        >>> instrumentation.snapshot()['unknown_types']
+        {('street', 'foo'): 1}
+    """
+    global _INSTRUMENTATION  # pylint: disable=global-statement
+
+    disable_instrumentation()
+    instrumentation = Instrumentation(hook)
+
+    for name, function_name in TIMED_FUNCTIONS.items():
+        owner, attribute = _resolve(function_name)
+        function = getattr(owner, attribute)
+        _ORIGINALS[function_name] = function
+
+        if function_name == 'format_portion':
+            wrapper = instrumentation.timed_portion(function)
+        else:
+            wrapper = instrumentation.timed(name, function)
+        setattr(owner, attribute, wrapper)
+
+    _INSTRUMENTATION = instrumentation
+    return instrumentation
+
+
+def disable_instrumentation():
+    global _INSTRUMENTATION  # pylint: disable=global-statement
+
+    for function_name, function in _ORIGINALS.items():
+        owner, attribute = _resolve(function_name)
+        setattr(owner, attribute, function)
+
+    _ORIGINALS.clear()
+    _INSTRUMENTATION = None
+
+
+def get_instrumentation() -> Optional[Instrumentation]:
+    return _INSTRUMENTATION
@@ -0,0 +1,149 @@
+import os
+import threading
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, \
+    ThreadPoolExecutor
+from itertools import islice
+from typing import Callable, Iterable, Iterator, Optional, Union
+
+from . import cache, formatter
+
+__all__ = [
+    'format_parallel',
+    'format_threaded',
+]
+
+WORKER_PORTIONS_CACHE_SIZE = 65536
+# Размер мемо порций потока, после него мемо начинается заново
+THREAD_MEMO_SIZE = 65536
+
+_THREAD_STATE = threading.local()
+
+
+def chunked(iterable: Iterable, size: int) -> Iterator[list]:
+    """ Splits iterable on lists of size elements
+
+        >>> list(chunked(range(5), 2))
+        [[0, 1], [2, 3], [4]]
+    """
+    iterator = iter(iterable)
+    chunk = list(islice(iterator, size))
+    while chunk:
+        yield chunk
+        chunk = list(islice(iterator, size))
+
+
+def _init_worker(keys: dict, types: dict):
+    """ Компилирует таблицы форматтера один раз на процесс, чтобы не
+    передавать их с каждой пачкой записей
+    """
+    formatter.KEYS = keys
+    formatter.TYPES = types
+    formatter.rebuild_plans()
+    cache.enable_cache(portions_maxsize=WORKER_PORTIONS_CACHE_SIZE,
+                       formats_maxsize=None)
+
+
+def _format_chunk(chunk: list, formats: Optional[tuple],
+                  render: str = 'unicode') -> list:
+    return list(formatter.format_many(chunk, formats=formats, render=render))
+
+
+def _format_chunk_in_thread(chunk: list, formats: Optional[tuple],
+                            render: str = 'unicode') -> list:
+    """ Мемо порций у каждого потока свое и живет между пачками, общие
+    только неизменяемые скомпилированные планы, поэтому блокировки не нужны.
+    После rebuild_plans или load_registry мемо начинается заново.
+    """
+    compiled = formatter.get_plans()
+    memo = getattr(_THREAD_STATE, 'memo', None)
+    if memo is None or getattr(_THREAD_STATE, 'compiled', None) \
+            is not compiled or len(memo) > THREAD_MEMO_SIZE:
+        memo = _THREAD_STATE.memo = {}
+        _THREAD_STATE.compiled = compiled
+
+    return list(formatter.format_many(chunk, formats=formats, render=render,
+                                      memo=memo))
+
+
+def _map_chunks(executor: Executor, function: Callable, chunks: Iterable,
+                max_inflight: int, *args) -> Iterator[dict]:
+    """ Results of function(chunk, *args) in input order, at most
+    max_inflight chunks are submitted and not yet yielded
+    """
+    inflight = deque()
+
+    for chunk in chunks:
+        if len(inflight) >= max_inflight:
+            yield from inflight.popleft().result()
+
+        inflight.append(executor.submit(function, chunk, *args))
+
+    while inflight:
+        yield from inflight.popleft().result()
+
+
+def format_parallel(records: Union[Iterable[tuple], dict],
+                    workers: Optional[int] = None, chunksize: int = 1000,
+                    max_inflight: Optional[int] = None,
+                    formats: Optional[Iterable[str]] = None,
+                    render: str = 'unicode') -> Iterator[dict]:
+    """ Formats records with format_many in a process pool,
+    yields the same dicts as all_formats in input order
+
+    :param records: iterable of
+        (plain_address, address_components, premise_number, building_type)
+        tuples, or columnar dict of lists, see format_many
+    :param workers: number of processes, os.cpu_count() by default
+    :param chunksize: records per task sent to a worker
+    :param max_inflight: max number of submitted and not yet yielded chunks,
+        2 * workers by default, bounds memory of long streams
+    :param formats: optional iterable of format keys to build
+    :param render: unicode, plain or html, see render_formats
+    """
+    workers = workers or os.cpu_count() or 1
+    max_inflight = max_inflight or 2 * workers
+
+    if formats is not None:
+        formats = tuple(formats)
+    formatter.render_table(render)
+    # Реестр по умолчанию загружается до передачи таблиц процессам
+    formatter.get_plans()
+
+    chunks = chunked(formatter.iter_records(records), chunksize)
+
+    with ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_worker,
+            initargs=(formatter.KEYS, formatter.TYPES)) as executor:
+        yield from _map_chunks(executor, _format_chunk, chunks, max_inflight,
+                               formats, render)
+
+
+def format_threaded(records: Union[Iterable[tuple], dict],
+                    workers: Optional[int] = None, chunksize: int = 1000,
+                    max_inflight: Optional[int] = None,
+                    formats: Optional[Iterable[str]] = None,
+                    render: str = 'unicode') -> Iterator[dict]:
+    """ Formats records with format_many in a thread pool, yields the same
+    dicts as all_formats in input order, records and results are not
+    pickled
+
+    Threads share only compiled plans, which are never changed, but
+    replaced at once, every thread keeps its own memo of portions, so no
+    lock is taken on the hot path. Enabled portions cache is consulted
+    only on memo misses. Arguments are the same as of format_parallel.
+    """
+    workers = workers or os.cpu_count() or 1
+    max_inflight = max_inflight or 2 * workers
+
+    if formats is not None:
+        formats = tuple(formats)
+    formatter.render_table(render)
+    # Планы компилируются до запуска потоков
+    formatter.get_plans()
+
+    chunks = chunked(formatter.iter_records(records), chunksize)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        yield from _map_chunks(executor, _format_chunk_in_thread, chunks,
+                               max_inflight, formats, render)
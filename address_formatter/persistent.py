@@ -0,0 +1,305 @@
+""" Persistent sqlite3 cache of all_formats results
+
+Results are stored with the rules version (see rules_version) and only
+rows of the current version are read, so a changed registry never serves
+stale formats. Rows of other versions are kept for workers still running
+old rules, e.g. during a rolling deploy, prune deletes them.
+"""
+import hashlib
+import json
+import sqlite3
+from itertools import islice
+from threading import Lock
+from typing import Iterable, Iterator, Optional, Union
+
+from . import formatter
+from .cache import CacheInfo
+from .formatter import (
+    CompiledPlans,
+    LazyPortions,
+    compose_formats,
+    iter_records,
+    plain_formats,
+    portion_triples,
+    render_formats,
+    render_table,
+)
+
+__all__ = [
+    'PersistentCache',
+]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS formats (
+    version TEXT NOT NULL,
+    key TEXT NOT NULL,
+    result TEXT NOT NULL,
+    PRIMARY KEY (version, key)
+)
+"""
+
+# Меньше лимита переменных sqlite в запросе key IN (...)
+LOOKUP_SIZE = 500
+
+
+def cache_key(plain_address: str, address_components: Optional[dict],
+              premise_number: str = None, building_type: int = None,
+              formats: Optional[tuple] = None,
+              compiled: Optional[CompiledPlans] = None) -> str:
+    """ Stable hash of everything all_formats result depends on, the same
+    as the key of in-memory formats cache
+    """
+    triples = portion_triples(
+        address_components, premise_number, building_type,
+        compiled) if address_components else None
+    return _triples_key(plain_address, triples, formats)
+
+
+def _triples_key(plain_address: str, triples: Optional[list],
+                 formats: Optional[tuple]) -> str:
+    raw = json.dumps([plain_address, triples, formats], ensure_ascii=False,
+                     separators=(',', ':'), default=str)
+    return hashlib.blake2b(raw.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def _memo_portions(compiled: CompiledPlans):
+    """ Portion formatter of one chunk, repeated portions are formatted
+    once, as in format_many
+    """
+    memo = {}
+
+    def memo_portion(address_component, value, component_type):
+        triple = (address_component, value, component_type)
+        try:
+            return memo[triple]
+        except KeyError:
+            portion = memo[triple] = formatter.format_portion(*triple,
+                                                              compiled)
+            return portion
+
+    return memo_portion
+
+
+def _format_record(compiled: CompiledPlans, memo_portion,
+                   formats: Optional[tuple], plain_address: str,
+                   address_components: Optional[dict],
+                   premise_number: str = None,
+                   building_type: int = None) -> dict:
+    if not address_components:
+        return plain_formats(plain_address, formats)
+
+    portions = LazyPortions(
+        portion_triples(address_components, premise_number, building_type,
+                        compiled),
+        memo_portion)
+    return compose_formats(plain_address, address_components, portions,
+                           formats)
+
+
+class PersistentCache:
+    """ On-disk cache of formatted addresses surviving restarts
+
+        >>> cache = PersistentCache('formats.sqlite3')
+        >>> cache.preload()  # warm start, keeps every row in memory
+        >>> cache.all_formats(plain_address, address_components, "1")
+        >>> list(cache.format_many(records))
+
+    :param path: sqlite3 database file, shared by worker processes
+    :param chunksize: records looked up and written back at once
+        by format_many
+    """
+
+    def __init__(self, path: str, chunksize: int = 1000):
+        self.path = path
+        self.chunksize = chunksize
+        self.hits = 0
+        self.misses = 0
+        # Строки одной версии правил, прочитанные preload
+        self._memory = None  # type: Optional[dict]
+        self._memory_version = None  # type: Optional[str]
+        self._lock = Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+
+        with self._lock:
+            self._connection.execute(SCHEMA)
+            self._connection.commit()
+
+    @staticmethod
+    def version() -> str:
+        """ Current rules version, see rules_version """
+        return formatter.get_plans().version
+
+    def preload(self) -> int:
+        """ Reads all rows of the current version into memory, later
+        lookups do not touch the database
+
+        :return: number of preloaded results
+        """
+        version = self.version()
+        with self._lock:
+            rows = self._connection.execute(
+                'SELECT key, result FROM formats WHERE version = ?',
+                (version,))
+            self._memory = {key: json.loads(result) for key, result in rows}
+            self._memory_version = version
+            return len(self._memory)
+
+    def get_many(self, keys: list, version: Optional[str] = None) -> dict:
+        """ key -> result of cached keys
+
+        :param version: rules version, current one by default
+        """
+        version = version or self.version()
+        memory = self._memory
+        if memory is not None and self._memory_version == version:
+            found = {key: memory[key] for key in keys if key in memory}
+            missing = [key for key in keys if key not in found]
+        else:
+            found = {}
+            missing = keys
+
+        with self._lock:
+            for start in range(0, len(missing), LOOKUP_SIZE):
+                chunk = missing[start:start + LOOKUP_SIZE]
+                rows = self._connection.execute(
+                    f'SELECT key, result FROM formats WHERE version = ? '
+                    f'AND key IN ({",".join("?" * len(chunk))})',
+                    [version] + chunk)
+                for key, result in rows:
+                    found[key] = json.loads(result)
+
+        hits = sum(1 for key in keys if key in found)
+        self.hits += hits
+        self.misses += len(keys) - hits
+        return found
+
+    def set_many(self, items: dict, version: Optional[str] = None):
+        """ Writes key -> result in one transaction
+
+        :param version: rules version the results are formatted with,
+            current one by default
+        """
+        version = version or self.version()
+        with self._lock:
+            self._connection.executemany(
+                'INSERT OR REPLACE INTO formats (key, version, result) '
+                'VALUES (?, ?, ?)',
+                ((key, version, json.dumps(result, ensure_ascii=False))
+                 for key, result in items.items()))
+            self._connection.commit()
+
+            if self._memory is not None and self._memory_version == version:
+                self._memory.update(items)
+
+    def all_formats(self, plain_address: str,
+                    address_components: Optional[dict],
+                    premise_number: str = None, building_type: int = None,
+                    formats: Optional[Iterable[str]] = None,
+                    render: str = 'unicode') -> dict:
+        """ Same as all_formats, results are stored as unicode and
+        rendered on the way out
+        """
+        render_table(render)
+        if formats is not None:
+            formats = tuple(formats)
+
+        if not address_components:
+            return render_formats(plain_formats(plain_address, formats),
+                                  render)
+
+        # Версия и планы читаются один раз: результат, посчитанный во время
+        # load_registry, записывается под версией планов, которыми посчитан
+        compiled = formatter.get_plans()
+        triples = portion_triples(address_components, premise_number,
+                                  building_type, compiled)
+        key = _triples_key(plain_address, triples, formats)
+        result = self.get_many([key], compiled.version).get(key)
+        if result is None:
+            result = compose_formats(
+                plain_address, address_components,
+                LazyPortions(triples, compiled=compiled), formats)
+            self.set_many({key: result}, compiled.version)
+
+        return render_formats(dict(result), render)
+
+    def format_many(self, records: Union[Iterable[tuple], dict],
+                    formats: Optional[Iterable[str]] = None,
+                    render: str = 'unicode') -> Iterator[dict]:
+        """ Same as format_many, cached results are read and missing ones
+        are written back by chunks of chunksize records
+        """
+        render_table(render)
+        if formats is not None:
+            formats = tuple(formats)
+
+        records = iter(iter_records(records))
+        while True:
+            chunk = list(islice(records, self.chunksize))
+            if not chunk:
+                return
+
+            compiled = formatter.get_plans()
+            keys = [cache_key(*record, formats=formats, compiled=compiled)
+                    for record in chunk]
+            found = self.get_many(list(set(keys)), compiled.version)
+
+            missing = {}
+            for key, record in zip(keys, chunk):
+                if key not in found and key not in missing:
+                    missing[key] = record
+            if missing:
+                memo_portion = _memo_portions(compiled)
+                computed = {
+                    key: _format_record(compiled, memo_portion, formats,
+                                        *record)
+                    for key, record in missing.items()}
+                self.set_many(computed, compiled.version)
+                found.update(computed)
+
+            for key in keys:
+                yield render_formats(dict(found[key]), render)
+
+    def info(self) -> CacheInfo:
+        return CacheInfo(self.hits, self.misses, 0, None, len(self))
+
+    def prune(self) -> int:
+        """ Deletes rows of other rules versions, call it once no worker
+        sharing the file runs old rules
+
+        :return: number of deleted rows
+        """
+        version = self.version()
+        with self._lock:
+            deleted = self._connection.execute(
+                'DELETE FROM formats WHERE version != ?', (version,)).rowcount
+            self._connection.commit()
+            if self._memory_version != version:
+                self._memory = None
+                self._memory_version = None
+            return deleted
+
+    def clear(self):
+        """ Deletes all rows of all versions and statistics """
+        with self._lock:
+            self._connection.execute('DELETE FROM formats')
+            self._connection.commit()
+            if self._memory is not None:
+                self._memory = {}
+            self.hits = 0
+            self.misses = 0
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute(
+                'SELECT count(*) FROM formats WHERE version = ?',
+                (self.version(),)).fetchone()[0]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,187 @@
+from threading import Lock
+from typing import Iterable, Iterator, Optional, Union
+
+from . import formatter
+from .cache import register_dependent
+from .formatter import (
+    IS_ERROR,
+    FORMAT_KEYS,
+    LazyPortions,
+    compose_formats,
+    iter_records,
+    plain_formats,
+    portion_triples,
+    render_formats,
+    render_table,
+)
+
+__all__ = [
+    'PrefixTree',
+]
+
+# Уровни дерева: region -> district -> city -> township -> village
+PREFIX_DEPTH = 5
+
+
+class PrefixNode:
+    """ Узел дерева префиксов: уже объединенный через ", " префикс адреса
+    с примененным unique_justseen, последняя порция префикса нужна для
+    unique_justseen на стыке с порциями здания
+    """
+    __slots__ = ('children', 'joined', 'last', 'error')
+
+    def __init__(self, joined: str = '', last: Optional[str] = None,
+                 error: bool = False):
+        self.children = {}
+        self.joined = joined
+        self.last = last
+        self.error = error
+
+    def extend(self, portion) -> 'PrefixNode':
+        """ Префикс с добавленной порцией, как в format_result """
+        if self.error or portion is IS_ERROR:
+            return ERROR_NODE
+        if not portion or portion == self.last:
+            return self
+        return PrefixNode(f'{self.joined}, {portion}' if self.joined
+                          else portion, portion)
+
+    def extend_many(self, portions: Iterable) -> 'PrefixNode':
+        node = self
+        for portion in portions:
+            node = node.extend(portion)
+        return node
+
+    def join(self, portions: Iterable = ()) -> str:
+        """ format_result префикса и следующих за ним порций """
+        node = self.extend_many(portions)
+        return '' if node.error else node.joined
+
+
+ERROR_NODE = PrefixNode(error=True)
+
+# Форматы, которые начинаются с префикса из дерева
+PREFIX_FORMATS = ('all', 'finishing_with_street', 'finishing_with_village')
+
+
+class PrefixTree:
+    """ In-memory tree of formatted address prefixes keyed by successive
+    (address_component, value, component_type) of region, district, city,
+    township and village
+
+    Formats of a building are the cached prefix plus its own street,
+    building, section, construction and premise portions. When the tree
+    has more than maxsize nodes it is dropped and built again, so memory
+    stays bounded. The tree is also dropped with clear_cache and when it
+    is used with other formatter plans, e.g. after load_registry.
+
+        >>> tree = PrefixTree()
+        >>> tree.all_formats(plain_address, address_components, "1")
+        >>> list(tree.format_many(records))
+    """
+
+    def __init__(self, maxsize: int = 100000):
+        self.maxsize = maxsize
+        self.root = PrefixNode()
+        self.size = 0
+        # Планы, которыми отформатированы узлы дерева
+        self.compiled = None
+        self._lock = Lock()
+        register_dependent(self)
+
+    def clear(self):
+        with self._lock:
+            self.root = PrefixNode()
+            self.size = 0
+            self.compiled = None
+
+    def path(self, triples: list,
+             compiled: Optional[formatter.CompiledPlans] = None) -> list:
+        """ Nodes of region, district, city, township and village """
+        compiled = compiled or formatter.get_plans()
+        if self.compiled is not compiled:
+            with self._lock:
+                if self.compiled is not compiled:
+                    self.root = PrefixNode()
+                    self.size = 0
+                    self.compiled = compiled
+
+        node = self.root
+        nodes = []
+        for triple in triples[:PREFIX_DEPTH]:
+            child = node.children.get(triple)
+            if child is None:
+                child = self._add(node, triple, compiled)
+            nodes.append(child)
+            node = child
+        return nodes
+
+    def _add(self, parent: PrefixNode, triple: tuple,
+             compiled: formatter.CompiledPlans) -> PrefixNode:
+        with self._lock:
+            if self.size >= self.maxsize:
+                self.root = PrefixNode()
+                self.size = 0
+
+            extended = parent.extend(
+                formatter.format_portion(*triple, compiled))
+            # Дочерние узлы у каждого узла свои, общий только префикс
+            child = PrefixNode(extended.joined, extended.last,
+                               extended.error)
+            parent.children[triple] = child
+            self.size += 1
+            return child
+
+    def all_formats(self, plain_address: str,
+                    address_components: Optional[dict],
+                    premise_number: str = None, building_type: int = None,
+                    formats: Optional[Iterable[str]] = None,
+                    render: str = 'unicode') -> dict:
+        """ Same as all_formats """
+        data = address_components
+
+        if formats is not None:
+            formats = tuple(formats)
+        render_table(render)
+
+        if not data:
+            return render_formats(plain_formats(plain_address, formats),
+                                  render)
+
+        compiled = formatter.get_plans()
+        triples = portion_triples(data, premise_number, building_type,
+                                  compiled)
+        has_street = data.get('street') is not None
+        portions = LazyPortions(triples, compiled=compiled)
+        nodes = None
+
+        result = {}
+        for key in formats if formats is not None else FORMAT_KEYS:
+            if key in PREFIX_FORMATS and nodes is None:
+                nodes = self.path(triples, compiled)
+
+            if key == 'all':
+                value = nodes[-1].join(
+                    portions[address_component]
+                    for address_component, _, _ in triples[PREFIX_DEPTH:])
+            elif key == 'finishing_with_street':
+                value = nodes[-1].join(
+                    [portions[triples[PREFIX_DEPTH][0]]])
+            elif key == 'finishing_with_village':
+                value = nodes[-1 if has_street else -2].join()
+            else:
+                value = compose_formats(plain_address, data, portions,
+                                        [key])[key]
+            result[key] = value or plain_address
+
+        return render_formats(result, render)
+
+    def format_many(self, records: Union[Iterable[tuple], dict],
+                    formats: Optional[Iterable[str]] = None,
+                    render: str = 'unicode') -> Iterator[dict]:
+        """ Same as format_many, prefixes are taken from the tree """
+        if formats is not None:
+            formats = tuple(formats)
+
+        for record in iter_records(records):
+            yield self.all_formats(*record, formats=formats, render=render)
@@ -0,0 +1,220 @@
+""" External KEYS and TYPES registry
+
+Registry file is JSON (or TOML on python 3.11+, or with tomli installed):
+
+    {
+        "keys": {"street": {"value_key": "street",
+                            "type_key": "street_type_full"}, ...},
+        "types": {"street": {"улица": {"suffix_set": "EMPTY",
+                                       "abbreviation": "ул"}, ...}, ...}
+    }
+
+suffix_set is a name of AdjectiveSuffixSet attribute, "keys" may be
+omitted to keep current KEYS. File set by ADDRESS_FORMATTER_REGISTRY
+environment variable is loaded on first formatting.
+"""
+import json
+import os
+from threading import RLock
+from typing import Optional
+
+from . import formatter
+from .formatter import AddressComponent, AdjectiveSuffixSet
+
+__all__ = [
+    'RegistryError',
+    'load_registry',
+    'reload_registry',
+    'dump_registry',
+    'validate_registry',
+    'rules_version',
+]
+
+REGISTRY_ENV = 'ADDRESS_FORMATTER_REGISTRY'
+
+# Реентерабельна: load_default_registry загружает файл под ней же
+_LOCK = RLock()
+_PATH = None  # type: Optional[str]
+_DEFAULT_LOADED = False
+
+
+class RegistryError(ValueError):
+    pass
+
+
+def _components() -> list:
+    return [value for key, value in vars(AddressComponent).items()
+            if not key.startswith('__')]
+
+
+def _suffix_sets() -> dict:
+    return {key: value for key, value in vars(AdjectiveSuffixSet).items()
+            if not key.startswith('__')}
+
+
+def validate_registry(keys: dict, types: dict):
+    """ Same rules as formatter KEYS and TYPES follow:
+    every AddressComponent has value_key and type_key and dict of types,
+    every type has suffix_set from AdjectiveSuffixSet and abbreviation
+    """
+    components = _components()
+    suffix_sets = list(_suffix_sets().values())
+
+    unknown = (set(keys) | set(types)) - set(components)
+    if unknown:
+        raise RegistryError(f'unknown components: {sorted(unknown)}')
+
+    for component in components:
+        component_keys = keys.get(component)
+        if not isinstance(component_keys, dict) \
+                or 'value_key' not in component_keys \
+                or 'type_key' not in component_keys:
+            raise RegistryError(f'{component}: value_key and type_key '
+                                f'are required')
+
+        component_types = types.get(component)
+        if not isinstance(component_types, dict):
+            raise RegistryError(f'{component}: types are required')
+
+        for component_type, value in component_types.items():
+            if not isinstance(component_type, str):
+                raise RegistryError(f'{component}: type {component_type!r} '
+                                    f'is not str')
+            if not isinstance(value, dict) or 'suffix_set' not in value \
+                    or 'abbreviation' not in value:
+                raise RegistryError(f'{component}.{component_type}: '
+                                    f'suffix_set and abbreviation are '
+                                    f'required')
+            if value['suffix_set'] not in suffix_sets:
+                raise RegistryError(f'{component}.{component_type}: '
+                                    f'unknown suffix_set')
+            if not value['abbreviation']:
+                raise RegistryError(f'{component}.{component_type}: '
+                                    f'empty abbreviation')
+
+
+def _read(path: str) -> dict:
+    if path.endswith('.toml'):
+        try:
+            import tomllib  # pylint: disable=import-outside-toplevel
+        except ImportError:
+            import tomli as tomllib  # pylint: disable=import-outside-toplevel
+
+        with open(path, 'rb') as registry_fd:
+            return tomllib.load(registry_fd)
+
+    with open(path, encoding='utf-8') as registry_fd:
+        return json.load(registry_fd)
+
+
+def parse_registry(raw: dict) -> tuple:
+    """ (keys, types) from registry file content, suffix_set names are
+    replaced with AdjectiveSuffixSet lists
+    """
+    if not isinstance(raw, dict) or not isinstance(raw.get('types'), dict):
+        raise RegistryError('registry must have "types" table')
+
+    suffix_sets = _suffix_sets()
+    keys = raw.get('keys', formatter.KEYS)
+
+    types = {}
+    for component, component_types in raw['types'].items():
+        if not isinstance(component_types, dict):
+            raise RegistryError(f'{component}: types are required')
+
+        types[component] = {}
+        for component_type, value in component_types.items():
+            if not isinstance(value, dict):
+                raise RegistryError(f'{component}.{component_type}: '
+                                    f'table is required')
+            suffix_set = value.get('suffix_set')
+            if suffix_set not in suffix_sets:
+                raise RegistryError(f'{component}.{component_type}: '
+                                    f'unknown suffix_set {suffix_set!r}')
+            types[component][component_type] = dict(
+                value, suffix_set=suffix_sets[suffix_set])
+
+    validate_registry(keys, types)
+    return keys, types
+
+
+def load_registry(path: str):
+    """ Loads, validates and compiles registry file, then swaps formatter
+    tables at once, readers are never locked. Cached portions and formats
+    are dropped.
+    """
+    global _PATH  # pylint: disable=global-statement
+
+    keys, types = parse_registry(_read(path))
+
+    with _LOCK:
+        # Планы компилируются до замены таблиц, читатели видят либо
+        # старые, либо новые планы целиком
+        compiled = formatter.CompiledPlans(keys, types)
+        formatter.KEYS = keys
+        formatter.TYPES = types
+        formatter.COMPILED = compiled
+        _PATH = path
+
+        # Ключи кешей включают планы, так что записанные после очистки
+        # значения старых планов не вернутся, очистка освобождает память
+        formatter.cache.clear_cache()
+
+
+def reload_registry():
+    """ Reloads last loaded registry file, e.g. on SIGHUP """
+    if _PATH is None:
+        raise RegistryError('registry was not loaded')
+    load_registry(_PATH)
+
+
+def load_default_registry():
+    """ Loads file from ADDRESS_FORMATTER_REGISTRY once """
+    global _DEFAULT_LOADED  # pylint: disable=global-statement
+
+    if _DEFAULT_LOADED:
+        return
+
+    with _LOCK:
+        if _DEFAULT_LOADED:
+            return
+
+        path = os.environ.get(REGISTRY_ENV)
+        if path:
+            load_registry(path)
+        # Флаг ставится только после загрузки, одновременный первый вызов
+        # ждет ее на блокировке
+        _DEFAULT_LOADED = True
+
+
+def _suffix_set_name(suffix_set: list) -> str:
+    return next(name for name, value in _suffix_sets().items()
+                if value == suffix_set)
+
+
+def dump_registry(path: str):
+    """ Writes current KEYS and TYPES as JSON registry """
+    raw = {
+        'keys': formatter.KEYS,
+        'types': {
+            component: {
+                component_type: dict(
+                    value, suffix_set=_suffix_set_name(value['suffix_set']))
+                for component_type, value in component_types.items()
+            }
+            for component, component_types in formatter.TYPES.items()
+        },
+    }
+
+    with open(path, 'w', encoding='utf-8') as registry_fd:
+        json.dump(raw, registry_fd, ensure_ascii=False, indent=2)
+
+
+def rules_version() -> str:
+    """ Stable hash of KEYS and TYPES the formatter plans are compiled from,
+    changes with every loaded registry or rebuild_plans
+    """
+    return formatter.get_plans().version
+
+
+formatter.set_plans_loader(load_default_registry)
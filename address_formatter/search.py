@@ -0,0 +1,266 @@
+""" Autocomplete index over formatted addresses
+
+Keys are folded: lower case, ё as е, no-break spaces and word joiners,
+dots and commas replaced, so "ул. Майская" is found by "ул майская" as
+well as by "ул. майс".
+"""
+import heapq
+import pickle
+from bisect import bisect_left, bisect_right, insort
+from collections import namedtuple
+from itertools import count
+from operator import itemgetter
+from typing import Iterable, List, Optional
+
+from .formatter import NBSPACE, WORD_JOINER, format_many
+
+__all__ = [
+    'Match',
+    'SearchIndex',
+    'normalize_key',
+]
+
+Match = namedtuple('Match', ['id', 'field', 'text'])
+
+SEARCH_FIELDS = ('all', 'street_only')
+# Диапазоны токенов запроса длиннее этого не считаются по записям
+RANGE_SIZE_LIMIT = 256
+
+FOLD_TABLE = str.maketrans({
+    NBSPACE: ' ', WORD_JOINER: None, '.': ' ', ',': ' ', 'ё': 'е',
+})
+
+
+def normalize_key(text: str) -> str:
+    """ Folded search key of formatted address or query
+
+        >>> normalize_key('г. Серов, ул. Майская')
+        'г серов ул майская'
+    """
+    return ' '.join(text.lower().translate(FOLD_TABLE).split())
+
+
+class SearchIndex:
+    """ Prefix and token search over formats of premises
+
+    Folded keys of every field are kept in a sorted array, tokens of keys
+    in a sorted array of unique tokens with posting sets of ids, so
+    queries are a few binary searches plus top-k matches.
+
+        >>> index = SearchIndex.build(records, ids)
+        >>> index.prefix('г москва ул май', k=10)
+        [Match(id=..., field='all', text='г. Москва, ул. Майская, д. 1'), ...]
+        >>> index.tokens('майская 1', k=10)
+        >>> index.save('addresses.index')
+        >>> index = SearchIndex.load('addresses.index')
+
+    :param fields: format keys to search
+    """
+
+    def __init__(self, fields: Iterable[str] = SEARCH_FIELDS):
+        self.fields = tuple(fields)
+        # id -> {format key: formatted address}
+        self.documents = {}
+        # Отсортированные ключи и параллельный им список (id, format key)
+        self._keys = []
+        self._refs = []
+        # Отсортированные уникальные токены, токен -> ids
+        self._tokens = []
+        self._postings = {}
+        # id -> {format key: токены ключа по порядку}
+        self._document_tokens = {}
+
+    @classmethod
+    def build(cls, records, ids: Optional[Iterable] = None,
+              fields: Iterable[str] = SEARCH_FIELDS) -> 'SearchIndex':
+        """ Index of format_many results, ids are positions of records
+        by default
+        """
+        index = cls(fields)
+        results = format_many(records, formats=index.fields)
+        index.add_many(zip(ids if ids is not None else count(), results))
+        return index
+
+    def __len__(self):
+        return len(self.documents)
+
+    def __contains__(self, record_id):
+        return record_id in self.documents
+
+    def _document(self, record_id, formats: dict, new_tokens: list) -> list:
+        """ Stores document, adds its tokens to postings and returns
+        (key, (id, format key)) entries of sorted array, tokens without
+        postings are appended to new_tokens
+        """
+        if record_id in self.documents:
+            self.remove(record_id)
+
+        document = {field: formats[field] for field in self.fields
+                    if formats.get(field)}
+        self.documents[record_id] = document
+
+        entries = []
+        field_tokens = {}
+        for field, text in document.items():
+            key = normalize_key(text)
+            entries.append((key, (record_id, field)))
+            field_tokens[field] = tuple(key.split())
+
+        for token in set().union(*field_tokens.values()):
+            ids = self._postings.get(token)
+            if ids is None:
+                ids = self._postings[token] = set()
+                new_tokens.append(token)
+            ids.add(record_id)
+        self._document_tokens[record_id] = field_tokens
+
+        return entries
+
+    def add(self, record_id, formats: dict):
+        """ Adds or replaces formats of record """
+        new_tokens = []
+        for key, ref in self._document(record_id, formats, new_tokens):
+            position = bisect_right(self._keys, key)
+            self._keys.insert(position, key)
+            self._refs.insert(position, ref)
+
+        for token in new_tokens:
+            insort(self._tokens, token)
+
+    def add_many(self, items: Iterable[tuple]):
+        """ Adds or replaces (id, formats) pairs, sorted arrays are sorted
+        once, not on every insert, of repeated ids the last pair is kept
+        """
+        new_tokens = []
+        entries = []
+        # Записи пачки еще не в отсортированных массивах, повторный id
+        # нельзя удалить из них, поэтому остается только последний
+        for record_id, formats in dict(items).items():
+            entries.extend(self._document(record_id, formats, new_tokens))
+
+        entries[:0] = zip(self._keys, self._refs)
+        entries.sort(key=itemgetter(0))
+        self._keys = [key for key, _ in entries]
+        self._refs = [ref for _, ref in entries]
+
+        self._tokens.extend(new_tokens)
+        self._tokens.sort()
+
+    def remove(self, record_id):
+        """ Removes record, KeyError if it is not indexed """
+        document = self.documents.pop(record_id)
+
+        for field, text in document.items():
+            key = normalize_key(text)
+            position = bisect_left(self._keys, key)
+            while self._refs[position] != (record_id, field):
+                position += 1
+            del self._keys[position]
+            del self._refs[position]
+
+        for token in set().union(
+                *self._document_tokens.pop(record_id).values()):
+            ids = self._postings[token]
+            ids.discard(record_id)
+            if not ids:
+                del self._postings[token]
+                del self._tokens[bisect_left(self._tokens, token)]
+
+    def prefix(self, query: str, k: int = 10) -> List[Match]:
+        """ Up to k matches whose folded address starts with folded query,
+        in order of keys
+        """
+        query = normalize_key(query)
+        keys = self._keys
+
+        matches = []
+        position = bisect_left(keys, query)
+        while position < len(keys) and len(matches) < k \
+                and keys[position].startswith(query):
+            record_id, field = self._refs[position]
+            matches.append(
+                Match(record_id, field, self.documents[record_id][field]))
+            position += 1
+        return matches
+
+    def _token_range(self, token: str) -> tuple:
+        tokens = self._tokens
+        return (bisect_left(tokens, token),
+                bisect_left(tokens, token + '\U0010ffff'))
+
+    def _range_size(self, token_range: tuple) -> tuple:
+        """ Ключ сортировки диапазонов токенов: число записей, если
+        токенов немного, иначе число токенов
+        """
+        start, end, _ = token_range
+        if end - start > RANGE_SIZE_LIMIT:
+            return True, end - start
+        return False, sum(len(self._postings[token])
+                          for token in self._tokens[start:end])
+
+    def _field_rank(self, record_id, query_tokens: list) -> Optional[tuple]:
+        """ (-число точно совпавших токенов запроса, ключ, поле) лучшего
+        поля записи, в котором каждый токен запроса начинает какой-то
+        токен, None если такого поля нет
+        """
+        best = None
+        for field, tokens in self._document_tokens[record_id].items():
+            if all(any(token.startswith(query_token) for token in tokens)
+                   for query_token in query_tokens):
+                rank = (-sum(query_token in tokens
+                             for query_token in query_tokens),
+                        ' '.join(tokens), field)
+                if best is None or rank[0] < best[0]:
+                    best = rank
+        return best
+
+    def tokens(self, query: str, k: int = 10) -> List[Match]:
+        """ Up to k records with a field having a token starting with every
+        query token, in any order, e.g. "майская 5" finds
+        "ул. Майская, д. 5". Records with more exact token matches go
+        first, then in order of keys
+        """
+        query_tokens = normalize_key(query).split()
+        if not query_tokens:
+            return []
+
+        # Перебираются записи самого редкого токена запроса, остальные
+        # токены проверяются по токенам записи
+        ranges = sorted(
+            (self._token_range(token) + (token,) for token in query_tokens),
+            key=self._range_size)
+        start, end, _ = ranges[0]
+
+        # Кандидаты ранжируются до отбора k лучших
+        candidates = []
+        seen = set()
+        for token in self._tokens[start:end]:
+            for record_id in self._postings[token]:
+                if record_id in seen:
+                    continue
+                seen.add(record_id)
+
+                rank = self._field_rank(record_id, query_tokens)
+                if rank is not None:
+                    candidates.append((rank, record_id))
+
+        return [
+            Match(record_id, field, self.documents[record_id][field])
+            for (_, _, field), record_id in heapq.nsmallest(
+                k, candidates, key=itemgetter(0))
+        ]
+
+    def save(self, path: str):
+        """ Writes the index with pickle, sorted arrays are not rebuilt on
+        load, load only files written by save
+        """
+        with open(path, 'wb') as index_fd:
+            pickle.dump(self.__dict__, index_fd,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, path: str) -> 'SearchIndex':
+        index = cls.__new__(cls)
+        with open(path, 'rb') as index_fd:
+            index.__dict__.update(pickle.load(index_fd))
+        return index
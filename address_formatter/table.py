@@ -0,0 +1,261 @@
+""" Read-only table of precomputed formats in a memory-mapped file
+
+The file is built once by build_format_table and opened by every worker
+with FormatTable, pages of the mapping are shared by all processes through
+the OS page cache. Layout, all numbers little-endian:
+
+    header      magic, rules version, formats size, capacity, records,
+                strings
+    formats     JSON list of format keys
+    slots       capacity * (16 bytes key digest, uint32 record)
+    records     records * len(formats) * uint32 string number
+    offsets     (strings + 1) * uint64 offset of string
+    strings     UTF-8 bytes of unique strings
+"""
+import hashlib
+import json
+import mmap
+import os
+import struct
+from typing import Iterable, Optional, Union
+
+from . import formatter
+from .formatter import (
+    FORMAT_KEYS,
+    format_many,
+    iter_records,
+    render_formats,
+    render_table,
+)
+from .persistent import cache_key
+from .registry import rules_version
+
+__all__ = [
+    'FormatTable',
+    'build_format_table',
+]
+
+MAGIC = b'AFT1'
+HEADER = struct.Struct('<4s16sIIII')
+SLOT = struct.Struct('<16sI')
+OFFSET = struct.Struct('<Q')
+# Начало и конец строки
+OFFSETS = struct.Struct('<QQ')
+# Пустой слот и отсутствующая строка (plain_address None)
+EMPTY = 0xFFFFFFFF
+
+
+def id_digest(key) -> bytes:
+    """ Digest of caller supplied id, ids are compared as str """
+    return hashlib.blake2b(f'id:{key}'.encode('utf-8'),
+                           digest_size=16).digest()
+
+
+def components_digest(plain_address: str, address_components: Optional[dict],
+                      premise_number: str = None, building_type: int = None,
+                      formats: Optional[tuple] = None) -> bytes:
+    return bytes.fromhex(cache_key(plain_address, address_components,
+                                   premise_number, building_type, formats))
+
+
+def _slot(digest: bytes, mask: int) -> int:
+    return int.from_bytes(digest[:8], 'little') & mask
+
+
+def build_format_table(path: str, records: Union[Iterable[tuple], dict],
+                       ids: Optional[Iterable] = None,
+                       formats: Optional[Iterable[str]] = None) -> int:
+    """ Formats records with format_many and writes the table to path,
+    the file is replaced atomically, so workers may reopen it at any time
+
+    :param records: the same records as format_many takes
+    :param ids: optional ids of records, records are keyed by their
+        components otherwise
+    :param formats: format keys to store, all by default
+    :return: number of keys in the table
+    """
+    formats = tuple(formats) if formats is not None else None
+    format_keys = formats if formats is not None else FORMAT_KEYS
+    records = list(iter_records(records))
+
+    if ids is None:
+        # Ключ таблицы со всеми форматами тот же, что и без formats
+        key_formats = formats if format_keys != FORMAT_KEYS else None
+        digests = [components_digest(*record, formats=key_formats)
+                   for record in records]
+    else:
+        digests = [id_digest(key) for key in ids]
+        if len(digests) != len(records):
+            raise ValueError('ids and records have different length')
+
+    string_numbers = {}
+    rows = {}
+    for digest, result in zip(digests, format_many(records,
+                                                   formats=formats)):
+        if digest in rows:
+            continue
+        rows[digest] = [
+            EMPTY if result[key] is None
+            else string_numbers.setdefault(result[key], len(string_numbers))
+            for key in format_keys
+        ]
+
+    capacity = 1
+    while capacity < 2 * len(rows):
+        capacity *= 2
+    mask = capacity - 1
+
+    slots = [None] * capacity
+    for number, digest in enumerate(rows):
+        slot = _slot(digest, mask)
+        while slots[slot] is not None:
+            slot = (slot + 1) & mask
+        slots[slot] = (digest, number)
+
+    formats_raw = json.dumps(format_keys, ensure_ascii=False).encode('utf-8')
+    strings = [string.encode('utf-8') for string in string_numbers]
+    record = struct.Struct(f'<{len(format_keys)}I')
+
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as table_fd:
+        table_fd.write(HEADER.pack(
+            MAGIC, rules_version().encode('ascii'), len(formats_raw),
+            capacity, len(rows), len(strings)))
+        table_fd.write(formats_raw)
+        for slot in slots:
+            table_fd.write(SLOT.pack(*slot) if slot is not None
+                           else SLOT.pack(b'', EMPTY))
+        for numbers in rows.values():
+            table_fd.write(record.pack(*numbers))
+        offset = 0
+        for string in strings:
+            table_fd.write(OFFSET.pack(offset))
+            offset += len(string)
+        table_fd.write(OFFSET.pack(offset))
+        for string in strings:
+            table_fd.write(string)
+
+    os.replace(tmp_path, path)
+    return len(rows)
+
+
+class FormatTable:
+    """ Memory-mapped table built by build_format_table, lookups are O(1)
+    and read only the slot, the record and its strings from the mapping
+
+        >>> build_format_table('formats.table', records, ids)
+        >>> table = FormatTable('formats.table')
+        >>> table.get(building_id)
+        >>> table.all_formats(plain_address, address_components, "1")
+
+    Formats of components missing from the table, or of a table built with
+    other KEYS and TYPES, are built with all_formats.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as table_fd:
+            self._map = mmap.mmap(table_fd.fileno(), 0,
+                                  access=mmap.ACCESS_READ)
+
+        magic, version, formats_size, capacity, records, strings = \
+            HEADER.unpack_from(self._map)
+        if magic != MAGIC:
+            raise ValueError(f'{path} is not a format table')
+
+        self.version = version.decode('ascii')
+        offset = HEADER.size
+        self.formats = tuple(json.loads(
+            self._map[offset:offset + formats_size].decode('utf-8')))
+        self._table_formats = self.formats \
+            if self.formats != FORMAT_KEYS else None
+        self._mask = capacity - 1
+        self._records = records
+        self._record = struct.Struct(f'<{len(self.formats)}I')
+
+        self._slots_offset = offset + formats_size
+        self._records_offset = self._slots_offset + capacity * SLOT.size
+        self._offsets_offset = self._records_offset + \
+            records * self._record.size
+        self._strings_offset = self._offsets_offset + \
+            (strings + 1) * OFFSET.size
+
+    def __len__(self):
+        return self._records
+
+    @property
+    def stale(self) -> bool:
+        """ Table was built with other KEYS or TYPES """
+        return self.version != rules_version()
+
+    def _string(self, number: int) -> Optional[str]:
+        if number == EMPTY:
+            return None
+        offset = self._offsets_offset + number * OFFSET.size
+        start, end = OFFSETS.unpack_from(self._map, offset)
+        return self._map[self._strings_offset + start:
+                         self._strings_offset + end].decode('utf-8')
+
+    def lookup(self, digest: bytes) -> Optional[dict]:
+        """ Formats stored under key digest, None if there are none """
+        mask = self._mask
+        slot = _slot(digest, mask)
+        while True:
+            stored, number = SLOT.unpack_from(
+                self._map, self._slots_offset + slot * SLOT.size)
+            if number == EMPTY:
+                return None
+            if stored == digest:
+                break
+            slot = (slot + 1) & mask
+
+        numbers = self._record.unpack_from(
+            self._map, self._records_offset + number * self._record.size)
+        return {key: self._string(string_number)
+                for key, string_number in zip(self.formats, numbers)}
+
+    def get(self, key, default=None) -> Optional[dict]:
+        """ Formats of record with caller supplied id, default if there
+        are none or the table is stale
+        """
+        if self.stale:
+            return default
+
+        result = self.lookup(id_digest(key))
+        return result if result is not None else default
+
+    def all_formats(self, plain_address: str,
+                    address_components: Optional[dict],
+                    premise_number: str = None, building_type: int = None,
+                    formats: Optional[Iterable[str]] = None,
+                    render: str = 'unicode') -> dict:
+        """ Same as all_formats, result is read from the table when the
+        table has it
+        """
+        render_table(render)
+        if formats is not None:
+            formats = tuple(formats)
+
+        if address_components and not self.stale \
+                and set(formats if formats is not None else FORMAT_KEYS) \
+                <= set(self.formats):
+            result = self.lookup(components_digest(
+                plain_address, address_components, premise_number,
+                building_type, self._table_formats))
+            if result is not None:
+                if formats is not None:
+                    result = {key: result[key] for key in formats}
+                return render_formats(result, render)
+
+        return formatter.all_formats(plain_address, address_components,
+                                     premise_number, building_type, formats,
+                                     render)
+
+    def close(self):
+        self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,68 @@
+from collections import namedtuple
+from typing import Iterable, Iterator, List, Optional, Union
+
+from . import formatter
+from .formatter import iter_records, portion_triples
+
+__all__ = [
+    'Issue',
+    'validate',
+    'validate_many',
+]
+
+# Тип компонента не найден в TYPES, check_portion вернул бы IS_ERROR и
+# адрес заменился бы на plain_address
+UNKNOWN_TYPE = 'unknown_type'
+# Значение компонента без типа, порция молча пропускается
+MISSING_TYPE = 'missing_type'
+
+Issue = namedtuple('Issue', ['index', 'component', 'reason', 'type',
+                             'value'])
+
+
+def _issues(compiled: formatter.CompiledPlans, index: Optional[int],
+            address_components: Optional[dict], premise_number: str = None,
+            building_type: int = None) -> Iterator[Issue]:
+    if not address_components:
+        return
+
+    plans = compiled.plans
+    for address_component, value, component_type in portion_triples(
+            address_components, premise_number, building_type, compiled):
+        if value is None:
+            continue
+        if component_type is None:
+            yield Issue(index, address_component, MISSING_TYPE, None, value)
+        elif (address_component, component_type) not in plans:
+            yield Issue(index, address_component, UNKNOWN_TYPE,
+                        component_type, value)
+
+
+def validate(address_components: Optional[dict], premise_number: str = None,
+             building_type: int = None) -> List[Issue]:
+    """ Checks types of address components against TYPES without
+    formatting, empty list means every portion would be formatted
+
+        >>> validate({"street": "Майская", "street_type_full": "линейка",
+                      "house": "5"})
+        [Issue(index=None, component='street', reason='unknown_type',
+        type='линейка', value='Майская'), Issue(index=None,
+        component='building', reason='missing_type', type=None, value='5')]
+    """
+    compiled = formatter.COMPILED or formatter.get_plans()
+    return list(_issues(compiled, None, address_components, premise_number,
+                        building_type))
+
+
+def validate_many(records: Union[Iterable[tuple], dict]) -> Iterator[Issue]:
+    """ Issues of records in the same form as format_many takes, index is
+    the position of record
+
+        >>> bad = {issue.index for issue in validate_many(records)}
+        >>> results = format_many(record for index, record
+                                  in enumerate(records) if index not in bad)
+    """
+    compiled = formatter.COMPILED or formatter.get_plans()
+
+    for index, record in enumerate(iter_records(records)):
+        yield from _issues(compiled, index, *record[1:4])
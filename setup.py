@@ -29,5 +29,8 @@ setup(
     packages=find_packages(exclude=['contrib', 'docs', 'tests']),
     # https://packaging.python.org/en/latest/requirements.html
     install_requires=[],
+    extras_require={
+        'pandas': ['pandas>=1.1'],
+    },
     python_requires='~=3.6',
 )
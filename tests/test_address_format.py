@@ -1,6 +1,8 @@
+import random
+
 import pytest
 
-from address_formatter import all_formats
+from address_formatter import all_formats, format_many, render_formats
 from address_formatter.formatter import (
     AddressComponent,
     AdjectiveSuffixSet,
@@ -14,11 +16,26 @@ from address_formatter.formatter import (
 
     posessive_dot,
     space_after_dot,
+    normalize_value,
+    value_start_with_type,
+    compile_matcher,
     dot_after_word,
     check_start_with_type,
     check_portion,
     format_result,
+    portion_triples,
+    get_plans,
+    PortionPlan,
+    rebuild_plans,
 )
+from address_formatter.persistent import PersistentCache
+from address_formatter.table import FormatTable, build_format_table
+
+try:
+    import pandas as pd
+    from address_formatter.frame import format_frame
+except ImportError:
+    format_frame = None
 
 
 def components():
@@ -55,6 +72,45 @@ def test_types_class_protocol(component):
         assert value['abbreviation']
 
 
+def test_plans_cover_types():
+    assert set(get_plans().plans) == {
+        (address_component, component_type)
+        for address_component, component_types in TYPES.items()
+        for component_type in component_types
+    }
+
+
+def test_portion_plan():
+    plan = PortionPlan('р-н', AdjectiveSuffixSet.MASCULINE)
+    assert plan.abbreviation == f'р{NBHYPHEN}н'
+    assert plan('Бежицкий') == f'Бежицкий{NBSPACE}р{NBHYPHEN}н'
+
+    plan = PortionPlan('с/п', AdjectiveSuffixSet.EMPTY)
+    assert plan.abbreviation == f'с{NBSLASH}п'
+    assert plan('Грелово') == f'с{NBSLASH}п{NBSPACE}Грелово'
+
+    plan = PortionPlan('ул', AdjectiveSuffixSet.EMPTY)
+    assert plan.abbreviation == 'ул.'
+
+
+def test_rebuild_plans():
+    street_types = TYPES[AddressComponent.STREET]
+    data = {'street': 'Садовая', 'street_type_full': 'линейка'}
+    assert check_portion(data, AddressComponent.STREET) is IS_ERROR
+
+    street_types['линейка'] = {"suffix_set": AdjectiveSuffixSet.FEMININE,
+                               "abbreviation": "лин-ка"}
+    try:
+        rebuild_plans()
+        assert check_portion(data, AddressComponent.STREET) == \
+            f'Садовая{NBSPACE}лин{NBHYPHEN}ка'
+    finally:
+        del street_types['линейка']
+        rebuild_plans()
+
+    assert check_portion(data, AddressComponent.STREET) is IS_ERROR
+
+
 def test_posessive_dot():
     assert posessive_dot('') == ''
     assert posessive_dot('a') == 'a'
@@ -82,6 +138,65 @@ def test_space_after_dot():
     assert space_after_dot('.  ') == '.  '
 
 
+def legacy_normalize(value):
+    value = space_after_dot(posessive_dot(value))
+    return value.replace(". ", f'.{NBSPACE}').replace("-", NBHYPHEN) \
+        .replace("/", NBSLASH)
+
+
+def normalize_values():
+    rand = random.Random(42)
+    alphabet = ['им', 'им', ' ', ' ', '.', '-', '/', '1', '2', 'я', 'ая',
+                'ый', 'а', 'б', '\t', '\n', NBSPACE]
+    return [
+        '', 'им', 'им ', ' им', 'им.', 'им.Ленина', 'им В.В.Петрова', 'a.',
+        '.a', '. ', '.  ', 'a..b', 'им\tим', 'им им', '.им', '1-я.Ленина',
+        'Калач-на-Дону', 'Лен/cкий', f'a.{NBSPACE}b', 'им\n', 'имим',
+    ] + [
+        ''.join(rand.choice(alphabet) for _ in range(rand.randint(1, 10)))
+        for _ in range(3000)
+    ]
+
+
+def test_normalize_value():
+    for value in normalize_values():
+        assert normalize_value(value) == legacy_normalize(value), value
+
+
+def test_value_start_with_type():
+    for suffix_set in AdjectiveSuffixSet.__dict__.values():
+        if not isinstance(suffix_set, list):
+            continue
+
+        for value in normalize_values():
+            expected = check_start_with_type(
+                space_after_dot(posessive_dot(value)), suffix_set)
+            assert value_start_with_type(value, suffix_set) == expected, \
+                (value, suffix_set)
+
+
+def corpus_values():
+    from address_formatter.benchmark import generate_corpus
+
+    return sorted({
+        value for _, data, _, _ in generate_corpus(2000)
+        for value in data.values()
+    }) + normalize_values()
+
+
+@pytest.mark.parametrize("suffix_set", [
+    suffix_set for key, suffix_set in AdjectiveSuffixSet.__dict__.items()
+    if not key.startswith('__')
+] + [["ая", "й"], ["ой", "ая", "е"]])
+def test_compile_matcher_differential(suffix_set):
+    matcher = compile_matcher(suffix_set)
+
+    for value in corpus_values():
+        expected = check_start_with_type(
+            space_after_dot(posessive_dot(value)), suffix_set)
+        assert matcher(value) == expected, (value, suffix_set)
+
+
 def test_dot_after_word():
     assert dot_after_word('') == ''
     assert dot_after_word('п') == 'п.'
@@ -239,7 +354,7 @@ def test_all_formats():
     }
 
 
-@pytest.mark.parametrize("testcase", (
+ALL_FORMATS_TESTCASES = (
     (
         {
             "region": "Курганская", "region_type_full": "область",
@@ -365,7 +480,10 @@ def test_all_formats():
         'all',
         'Московская\xa0обл., г.\xa0Наро\u2060-\u2060Фоминск, д.\xa0Мякишево'
     )
-))
+)
+
+
+@pytest.mark.parametrize("testcase", ALL_FORMATS_TESTCASES)
 def test_all_formats_testcases(testcase):
     address_components, kwargs, mode, result_address = testcase
     result = all_formats(address_components=address_components, **kwargs)
@@ -386,3 +504,173 @@ def test_all_formats_invalid_input(format_args: tuple):
         'starting_with_street': plain_address,
         'finishing_with_street': plain_address,
     }
+
+
+def records_from_testcases():
+    return [
+        (kwargs['plain_address'], address_components,
+         kwargs.get('premise_number'), kwargs.get('building_type'))
+        for address_components, kwargs, _, _ in ALL_FORMATS_TESTCASES
+    ] + [("plain_address", None, None, None), ("plain_address", {})]
+
+
+def test_format_many_same_as_all_formats():
+    records = records_from_testcases()
+    assert list(format_many(records)) == [
+        all_formats(*record) for record in records]
+
+
+def test_format_many_columnar():
+    records = records_from_testcases()[:-1]
+    columns = {
+        'plain_address': [record[0] for record in records],
+        'address_components': [record[1] for record in records],
+        'premise_number': [record[2] for record in records],
+        'building_type': [record[3] for record in records],
+    }
+    assert list(format_many(columns)) == [
+        all_formats(*record) for record in records]
+
+    del columns['premise_number'], columns['building_type']
+    assert list(format_many(columns)) == [
+        all_formats(*record[:2]) for record in records]
+
+
+def test_format_many_stats():
+    address_components = {
+        "region": "Курганская", "region_type_full": "область",
+        "city": "Серов", "city_type_full": "город",
+    }
+    stats = {}
+    results = list(format_many([
+        ("", address_components, "1"),
+        ("", address_components, "2"),
+        ("", address_components, "2", 4),
+        ("", None),
+    ], stats))
+
+    assert results[1]['all'] == f'Курганская{NBSPACE}обл., г.{NBSPACE}Серов, кв.{NBSPACE}2'  # noqa
+    assert results[2]['all'] == f'Курганская{NBSPACE}обл., г.{NBSPACE}Серов, м.{NBSPACE}2'  # noqa
+    assert stats == {'records': 4, 'portions': 9, 'deduplicated': 4}
+
+
+def test_portion_triples():
+    triples = portion_triples({'city': 'Серов', 'city_type_full': 'город'},
+                              '1', 2)
+    assert [triple[0] for triple in triples] == [
+        value for _, value in components()]
+    assert (AddressComponent.CITY, 'Серов', 'город') in triples
+    assert (AddressComponent.SECTION, None, 'корпус') in triples
+    assert (AddressComponent.OWNERSHIP, '1', 'место') in triples
+
+
+@pytest.mark.parametrize("formats", (
+    ['all'],
+    ['street_only'],
+    ('finishing_with_village', 'starting_with_street'),
+    ['finishing_with_street', 'all'],
+    [],
+))
+def test_all_formats_selected(formats):
+    for record in records_from_testcases():
+        expected = all_formats(*record)
+        assert all_formats(*record, formats=formats) == {
+            key: expected[key] for key in formats}
+
+
+def test_all_formats_selected_unknown():
+    with pytest.raises(KeyError):
+        all_formats("", {'city': 'Серов', 'city_type_full': 'город'},
+                    formats=['foo'])
+
+
+def test_no_formats_selected():
+    stats = {}
+    records = records_from_testcases() + [("plain", None)]
+
+    assert list(format_many(records, stats, formats=[])) == \
+        [{}] * len(records)
+    assert stats['portions'] == 0
+    assert all_formats("plain", None, formats=()) == {}
+
+
+def test_format_many_selected_portions():
+    address_components = {
+        "region": "Курганская", "region_type_full": "область",
+        "area": "Катайский", "area_type_full": "район",
+        "street": "Майская", "street_type_full": "улица",
+        "house": "5", "house_type_full": "дом",
+    }
+    stats = {}
+    assert list(format_many([("", address_components, "1")], stats,
+                            formats=['street_only'])) == [
+        {'street_only': f'ул.{NBSPACE}Майская'}]
+    assert stats == {'records': 1, 'portions': 1, 'deduplicated': 0}
+
+    list(format_many([("", address_components, "1")], stats,
+                     formats=['starting_with_street']))
+    assert stats == {'records': 1, 'portions': 3, 'deduplicated': 0}
+
+
+def test_all_formats_render():
+    address_components = {
+        "region": "Курганская", "region_type_full": "область",
+        "area": "Катайский", "area_type_full": "район",
+        "street": "Р&Д <Майская>", "street_type_full": "улица",
+        "house": "5/1", "house_type_full": "дом",
+    }
+    expected = all_formats("", address_components)['all']
+
+    assert all_formats("", address_components, render='unicode')['all'] == \
+        expected
+    assert all_formats("", address_components, render='plain')['all'] == \
+        "Курганская обл., Катайский р-н, ул. Р&Д <Майская>, д. 5/1"
+    assert all_formats("", address_components, render='html')['all'] == (
+        "Курганская&nbsp;обл., Катайский&nbsp;р&NoBreak;-&NoBreak;н, "
+        "ул.&nbsp;Р&amp;Д &lt;Майская&gt;, д.&nbsp;5&NoBreak;/&NoBreak;1")
+    assert all_formats("<plain>", {}, render='html') == {
+        key: "&lt;plain&gt;" for key in expected_format_keys()}
+    assert all_formats(None, {}, render='plain')['all'] is None
+
+    with pytest.raises(ValueError):
+        all_formats("", address_components, render='rtf')
+
+
+def expected_format_keys():
+    return all_formats("", {}).keys()
+
+
+@pytest.mark.parametrize("render", ('unicode', 'plain', 'html'))
+def test_render_same_for_all_paths(render, tmp_path):
+    records = records_from_testcases()
+    expected = [render_formats(all_formats(*record), render)
+                for record in records]
+
+    assert [all_formats(*record, render=render)
+            for record in records] == expected
+    assert list(format_many(records, render=render)) == expected
+    assert [render_formats(formats, render) for formats in
+            format_many(records)] == expected
+
+    with PersistentCache(str(tmp_path / 'formats.sqlite3')) as cache:
+        assert list(cache.format_many(records, render=render)) == expected
+        assert [cache.all_formats(*record, render=render)
+                for record in records] == expected
+
+    path = str(tmp_path / 'formats.table')
+    build_format_table(path, records[::2])
+    with FormatTable(path) as table:
+        assert [table.all_formats(*record, render=render)
+                for record in records] == expected
+
+    if format_frame is not None:
+        df = pd.DataFrame([
+            dict(address_components or {}, plain_address=plain_address,
+                 premise_number=premise_number, building_type=building_type)
+            for plain_address, address_components, premise_number,
+            building_type in (record + (None,) * (4 - len(record))
+                              for record in records)])
+        assert format_frame(df, render=render).to_dict('records') == expected
+    for formats in expected:
+        for value in formats.values():
+            assert NBSPACE not in (value or '') or render == 'unicode'
@@ -0,0 +1,127 @@
+import asyncio
+
+import pytest
+
+from address_formatter import all_formats
+from address_formatter.aio import AsyncFormatter, aformat, aformat_many
+
+from .test_address_format import records_from_testcases
+
+
+@pytest.fixture(autouse=True)
+def event_loop():
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    yield loop
+
+    asyncio.set_event_loop(None)
+    loop.close()
+
+
+def run(coroutine):
+    # asyncio.run появился только в Python 3.7
+    return asyncio.get_event_loop().run_until_complete(coroutine)
+
+
+def test_aformat():
+    records = records_from_testcases()
+
+    async def main():
+        return await asyncio.gather(*(aformat(*record) for record in records))
+
+    assert run(main()) == [all_formats(*record) for record in records]
+
+
+@pytest.mark.parametrize("inline_batch_size", (0, 100))
+def test_async_formatter_batches(inline_batch_size):
+    records = records_from_testcases() * 10
+    formatter = AsyncFormatter(window=0.01, max_batch_size=40,
+                               inline_batch_size=inline_batch_size)
+
+    async def main():
+        return await asyncio.gather(
+            *(formatter.format(*record) for record in records),
+            *(formatter.format(*record, formats=['all'])
+              for record in records))
+
+    results = run(main())
+    assert results == [all_formats(*record) for record in records] + [
+        all_formats(*record, formats=['all']) for record in records]
+    assert formatter.batches == 2 * ((len(records) + 39) // 40)
+
+
+def test_async_formatter_error():
+    formatter = AsyncFormatter(inline_batch_size=0)
+
+    async def main():
+        return await formatter.format("", {'city': 'Серов'}, formats=['foo'])
+
+    with pytest.raises(KeyError):
+        run(main())
+
+
+@pytest.mark.parametrize("inline_batch_size", (0, 100))
+def test_async_formatter_error_only_in_its_record(inline_batch_size):
+    records = records_from_testcases()
+    formatter = AsyncFormatter(window=0.01,
+                               inline_batch_size=inline_batch_size)
+    bad = ("", {"street": "Майская", "street_type_full": "улица",
+                "house": 5, "house_type_full": "дом"})
+
+    async def main():
+        return await asyncio.gather(
+            *(formatter.format(*record) for record in records),
+            formatter.format(*bad), return_exceptions=True)
+
+    *results, error = run(main())
+    assert formatter.batches == 1
+    assert results == [all_formats(*record) for record in records]
+    assert isinstance(error, TypeError)
+
+
+def test_aformat_many():
+    records = records_from_testcases() * 5
+
+    async def async_records():
+        for record in records:
+            yield record
+
+    async def main(source):
+        return [result async for result in aformat_many(
+            source, batch_size=3, max_concurrency=2)]
+
+    expected = [all_formats(*record) for record in records]
+    assert run(main(records)) == expected
+    assert run(main(async_records())) == expected
+
+
+def test_aformat_many_render():
+    records = records_from_testcases()
+
+    async def main():
+        return [result async for result in aformat_many(
+            records, render='plain')]
+
+    assert run(main()) == [
+        all_formats(*record, render='plain') for record in records]
+
+
+def test_aformat_render():
+    records = records_from_testcases()
+    formatter = AsyncFormatter(window=0.01)
+
+    async def main():
+        return await asyncio.gather(
+            *(aformat(*record, render='html') for record in records),
+            *(formatter.format(*record, render='plain')
+              for record in records),
+            *(formatter.format(*record) for record in records))
+
+    assert run(main()) == [
+        all_formats(*record, render='html') for record in records] + [
+        all_formats(*record, render='plain') for record in records] + [
+        all_formats(*record) for record in records]
+    assert formatter.batches == 2
+
+    with pytest.raises(ValueError):
+        run(aformat(*records[0], render='foo'))
@@ -0,0 +1,142 @@
+from address_formatter import formatter
+from address_formatter.benchmark import (
+    UNKNOWN_TYPE,
+    bench_matchers,
+    bench_parallel,
+    compare,
+    generate_corpus,
+    main,
+    run_suite,
+)
+from address_formatter.formatter import (
+    KEYS,
+    TYPES,
+    IS_ERROR,
+    AddressComponent,
+    format_portion,
+    portion_triples,
+)
+
+
+def test_generate_corpus_deterministic():
+    assert generate_corpus(50, seed=1) == generate_corpus(50, seed=1)
+    assert generate_corpus(50, seed=1) != generate_corpus(50, seed=2)
+
+
+def covered_types(corpus):
+    return {
+        (address_component, component_type)
+        for _, data, premise_number, building_type in corpus
+        for address_component, value, component_type in portion_triples(
+            data, premise_number, building_type)
+        if value is not None and component_type is not None
+    }
+
+
+def test_generate_corpus_leading_records_cover_types():
+    all_types = {
+        (address_component, component_type)
+        for address_component, component_types in TYPES.items()
+        for component_type in component_types
+    }
+    count = max(len(component_types) for component_types in TYPES.values())
+
+    assert covered_types(generate_corpus(count)) == all_types
+    assert covered_types(generate_corpus(count, seed=1)) == all_types
+    assert covered_types(generate_corpus(count - 1)) != all_types
+
+
+def test_generate_corpus_coverage():
+    corpus = generate_corpus(1000)
+
+    covered = set()
+    errors = 0
+    for _, data, premise_number, building_type in corpus:
+        for triple in portion_triples(data, premise_number, building_type):
+            address_component, value, component_type = triple
+            if value is None or component_type is None:
+                continue
+            covered.add((address_component, component_type))
+            errors += format_portion(*triple) is IS_ERROR
+
+    assert covered >= {
+        (address_component, component_type)
+        for address_component, component_types in TYPES.items()
+        for component_type in component_types
+    }
+    assert errors
+    assert {address_component for address_component, _ in covered} == set(
+        KEYS)
+
+    values = {value for _, data, _, _ in corpus for value in data.values()}
+    assert {"1-я", "2-й", "им Ленина", "Лен/ский", "Калач-на-Дону",
+            UNKNOWN_TYPE} <= values
+    assert AddressComponent.OWNERSHIP in {
+        address_component for address_component, _ in covered}
+
+
+def test_generate_corpus_current_types():
+    street_types = dict(TYPES['street'])
+    street_types['линейка'] = dict(street_types['улица'], abbreviation='лин')
+    formatter.TYPES = dict(TYPES, street=street_types)
+    formatter.rebuild_plans()
+    try:
+        corpus = generate_corpus(len(street_types) * 4)
+    finally:
+        formatter.TYPES = TYPES
+        formatter.rebuild_plans()
+
+    assert 'линейка' in {data.get('street_type_full')
+                         for _, data, _, _ in corpus}
+
+
+def test_run_suite():
+    results = run_suite(records=50)
+    assert results['records'] == 50
+    for metric in ('latency_p50_us', 'latency_p99_us',
+                   'batch_records_per_second', 'bytes_per_result',
+                   'bytes_per_compact_result', 'import_seconds'):
+        assert results[metric] > 0
+
+
+def test_compare():
+    baseline = {'records': 10, 'latency_p50_us': 10.0,
+                'batch_records_per_second': 1000.0, 'python': '3.7'}
+    current = {'records': 20, 'latency_p50_us': 15.0,
+               'batch_records_per_second': 2000.0, 'python': '3.8'}
+
+    assert compare(baseline, current) == [
+        {'metric': 'latency_p50_us', 'baseline': 10.0, 'current': 15.0,
+         'regression': 0.5},
+        {'metric': 'batch_records_per_second', 'baseline': 1000.0,
+         'current': 2000.0, 'regression': -1.0},
+    ]
+
+
+def test_bench_parallel():
+    results = bench_parallel(generate_corpus(10), [0, 1], chunksize=3)
+    assert [result['workers'] for result in results] == [0, 1]
+    assert all(result['records_per_second'] > 0 for result in results)
+
+
+def test_main_compare(tmp_path, capsys):
+    baseline = tmp_path / 'baseline.json'
+    assert main(['suite', '--records', '20', '--save', str(baseline)]) == 0
+    assert main(['suite', '--records', '20', '--compare', str(baseline),
+                 '--max-regression', '100']) == 0
+    assert 'latency_p50_us' in capsys.readouterr().out
+
+
+def test_bench_matchers():
+    results = bench_matchers(["1-я", "Садовая"], repeat=1)
+    assert [result['suffix_set'] for result in results] == [
+        'EMPTY', 'MASCULINE', 'FEMININE', 'NEUTER']
+    assert all(result['compiled_ns'] > 0 for result in results)
+
+
+def test_bench_parallel_threads():
+    results = bench_parallel(generate_corpus(10), [0, 2], chunksize=3,
+                             mode='threads')
+    assert [(result['mode'], result['workers']) for result in results] == [
+        ('threads', 0), ('threads', 2)]
+    assert all(result['records_per_second'] > 0 for result in results)
@@ -0,0 +1,71 @@
+import pytest
+
+from address_formatter import all_formats
+from address_formatter.benchmark import generate_corpus
+from address_formatter.building import BuildingFormatter
+
+from .test_address_format import records_from_testcases
+
+
+def test_building_formatter_same_as_all_formats():
+    records = records_from_testcases() + generate_corpus(300)
+
+    for record in records:
+        plain_address, data, premise_number, building_type = \
+            (record + (None, None))[:4]
+        building = BuildingFormatter(plain_address, data, building_type)
+
+        assert building.premise(premise_number) == all_formats(
+            plain_address, data, premise_number, building_type)
+        assert building.premise(None) == all_formats(
+            plain_address, data, None, building_type)
+
+
+@pytest.mark.parametrize("building_type", (None, 1, 2, 4))
+def test_building_formatter_premises(building_type):
+    plain_address, data, _, _ = records_from_testcases()[0]
+    building = BuildingFormatter(plain_address, data, building_type)
+
+    premises = building.premises(range(1, 801))
+    assert not isinstance(premises, list)
+    assert list(premises) == [
+        all_formats(plain_address, data, str(number), building_type)
+        for number in range(1, 801)]
+
+
+def test_building_formatter_formats():
+    plain_address, data, _, building_type = records_from_testcases()[0]
+    building = BuildingFormatter(plain_address, data, building_type,
+                                 formats=['street_only', 'all'])
+
+    assert list(building.premises(["1", "2а"])) == [
+        all_formats(plain_address, data, number, building_type,
+                    formats=['street_only', 'all'])
+        for number in ["1", "2а"]]
+
+
+@pytest.mark.parametrize("render", ('plain', 'html'))
+def test_building_formatter_render(render):
+    plain_address, data, _, building_type = records_from_testcases()[0]
+    building = BuildingFormatter(plain_address, data, building_type,
+                                 render=render)
+
+    assert list(building.premises(["1", None])) == [
+        all_formats(plain_address, data, number, building_type,
+                    render=render)
+        for number in ["1", None]]
+    assert BuildingFormatter("plain", None, render=render).premise("1") == \
+        all_formats("plain", None, "1", render=render)
+
+    with pytest.raises(ValueError):
+        BuildingFormatter(plain_address, data, render='foo')
+
+
+def test_building_formatter_error_and_empty():
+    building = BuildingFormatter("plain", {'city': 'Серов',
+                                           'city_type_full': 'foo'})
+    assert building.premise("1") == all_formats(
+        "plain", {'city': 'Серов', 'city_type_full': 'foo'}, "1")
+
+    building = BuildingFormatter("plain", None)
+    assert building.premise("1") == all_formats("plain", None, "1")
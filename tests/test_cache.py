@@ -0,0 +1,104 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from address_formatter import (
+    all_formats,
+    enable_cache,
+    disable_cache,
+    clear_cache,
+    cache_info,
+)
+from address_formatter.cache import LRUCache, MISSING
+from address_formatter.formatter import (
+    AddressComponent,
+    IS_ERROR,
+    check_portion,
+)
+
+from .test_address_format import records_from_testcases
+
+
+@pytest.fixture
+def cache():
+    enable_cache(portions_maxsize=64, formats_maxsize=4)
+    yield
+    disable_cache()
+
+
+def test_lru_cache():
+    lru = LRUCache(maxsize=2)
+    lru.set('a', 1)
+    lru.set('b', 2)
+    assert lru.get('a') == 1
+    lru.set('c', 3)
+
+    assert lru.get('b') is MISSING
+    assert lru.get('a') == 1
+    assert lru.get('c') == 3
+    assert lru.info() == (3, 1, 1, 2, 2)
+
+    lru.clear()
+    assert lru.info() == (0, 0, 0, 2, 0)
+
+
+def test_lru_cache_invalid_size():
+    with pytest.raises(ValueError):
+        LRUCache(maxsize=0)
+
+
+def test_cache_disabled_by_default():
+    assert cache_info() == {'portions': None, 'formats': None}
+
+
+def test_cached_formats_identical(cache):
+    records = records_from_testcases()
+    expected = [all_formats(*record) for record in records]
+
+    disable_cache()
+    assert [all_formats(*record) for record in records] == expected
+
+    enable_cache(portions_maxsize=64, formats_maxsize=4)
+    assert [all_formats(*record) for record in records] == expected
+    assert [all_formats(*record) for record in records] == expected
+
+
+def test_cached_portion_identical(cache):
+    data = {'street': 'Лен/cкий', 'street_type_full': 'бульвар'}
+    expected = 'Лен⁠/⁠cкий\xa0б⁠-⁠р'
+
+    assert check_portion(data, AddressComponent.STREET) == expected
+    assert check_portion(data, AddressComponent.STREET) == expected
+    assert check_portion({}, AddressComponent.REGION, 'foo', 'bar') \
+        is IS_ERROR
+    assert check_portion({}, AddressComponent.REGION, 'foo', 'bar') \
+        is IS_ERROR
+    assert cache_info()['portions'] == (2, 2, 0, 64, 2)
+
+
+def test_formats_cache_stats(cache):
+    data = {'city': 'Серов', 'city_type_full': 'город'}
+
+    result = all_formats('', data, '1')
+    result['all'] = 'changed'
+    assert all_formats('', data, '1')['all'] == 'г.\xa0Серов, кв.\xa01'
+    assert all_formats('', data, '1', 4)['all'] == 'г.\xa0Серов, м.\xa01'
+
+    for number in range(5):
+        all_formats('', data, str(number))
+
+    info = cache_info()
+    assert info['formats'] == (2, 6, 2, 4, 4)
+
+    clear_cache()
+    assert cache_info()['formats'] == (0, 0, 0, 4, 0)
+
+
+def test_cache_threads(cache):
+    records = records_from_testcases() * 50
+    expected = [all_formats(*record) for record in records]
+    clear_cache()
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        assert list(executor.map(lambda record: all_formats(*record),
+                                 records)) == expected
@@ -0,0 +1,59 @@
+import pickle
+
+import pytest
+
+from address_formatter import all_formats
+from address_formatter.benchmark import generate_corpus
+from address_formatter.compact import (
+    CompactFormats,
+    compact_formats,
+    compact_many,
+)
+from address_formatter.formatter import FORMAT_KEYS
+
+from .test_address_format import records_from_testcases
+
+
+def test_compact_formats_mapping():
+    for record in records_from_testcases():
+        result = compact_formats(*record)
+        expected = all_formats(*record)
+
+        assert isinstance(result, CompactFormats)
+        assert result == expected
+        assert dict(result) == expected
+        assert list(result) == list(FORMAT_KEYS)
+        assert len(result) == len(expected)
+        assert result.get('foo') is None
+
+        with pytest.raises(KeyError):
+            result['foo']  # pylint: disable=pointless-statement
+
+
+def test_compact_formats_slots():
+    result = compact_formats("", {'city': 'Серов', 'city_type_full': 'город'})
+    assert not hasattr(result, '__dict__')
+
+
+def test_compact_many():
+    records = generate_corpus(300)
+    results = list(compact_many(records))
+
+    assert results == [all_formats(*record) for record in records]
+
+
+def test_compact_many_interned():
+    data = {'region': 'Курганская', 'region_type_full': 'область'}
+    first, second = compact_many([("", dict(data), "1"), ("", data, "2")])
+    assert first.portions[0] is second.portions[0]
+
+    first = compact_formats("", dict(data), "1")
+    second = compact_formats("", dict(data), "2")
+    assert first.portions[0] is second.portions[0]
+
+
+@pytest.mark.parametrize("city_type", ("город", "foo"))
+def test_compact_formats_pickle(city_type):
+    result = compact_formats("plain", {'city': 'Серов',
+                                       'city_type_full': city_type}, "1")
+    assert pickle.loads(pickle.dumps(result)) == result
@@ -0,0 +1,131 @@
+import json
+import sqlite3
+
+import pytest
+
+from address_formatter import all_formats
+from address_formatter.benchmark import generate_corpus
+from address_formatter.dbapi import format_rows, write_formats
+
+from .test_address_format import records_from_testcases
+
+
+def corpus():
+    records = [(record + (None, None))[:4]
+               for record in records_from_testcases() + generate_corpus(300)]
+    return [record for record in records if record[1] is not None]
+
+
+@pytest.fixture
+def connection():
+    connection = sqlite3.connect(':memory:')
+    connection.execute(
+        'CREATE TABLE premises (id INTEGER PRIMARY KEY, address TEXT, '
+        'components TEXT, premise_number TEXT, building_type INTEGER, '
+        'full_address TEXT)')
+    connection.executemany(
+        'INSERT INTO premises (id, address, components, premise_number, '
+        'building_type) VALUES (?, ?, ?, ?, ?)',
+        [(index, plain_address, json.dumps(components, ensure_ascii=False),
+          premise_number, building_type)
+         for index, (plain_address, components, premise_number,
+                     building_type) in enumerate(corpus())])
+    yield connection
+    connection.close()
+
+
+class CountingCursor:
+    def __init__(self, cursor):
+        self.cursor = cursor
+        self.description = cursor.description
+        self.chunks = []
+
+    def fetchmany(self, size):
+        chunk = self.cursor.fetchmany(size)
+        self.chunks.append(len(chunk))
+        return chunk
+
+
+def test_format_rows_from_cursor(connection):
+    cursor = CountingCursor(connection.execute(
+        'SELECT id, address, components, premise_number, building_type '
+        'FROM premises ORDER BY id'))
+
+    results = list(format_rows(cursor, columns={
+        'address': 'plain_address', 'components': 'address_components',
+    }, formats=['all'], chunksize=100))
+
+    records = corpus()
+    assert [row[0] for row, _ in results] == list(range(len(records)))
+    assert [result for _, result in results] == [
+        all_formats(*record, formats=['all']) for record in records]
+    assert max(cursor.chunks) == 100
+
+
+def test_format_rows_component_columns():
+    rows = [
+        ("plain", "Москва", "город", "Майская", "улица", 1, 2),
+        ("plain", None, None, None, None, None, None),
+    ]
+    columns = ['plain_address', 'region', 'region_type_full', 'street',
+               'street_type_full', 'premise_number', 'building_type']
+
+    results = [result for _, result in format_rows(rows, columns)]
+
+    assert results == [
+        all_formats("plain", {"region": "Москва", "region_type_full": "город",
+                              "street": "Майская",
+                              "street_type_full": "улица"}, "1", 2),
+        all_formats("plain", {}),
+    ]
+
+
+def test_format_rows_render(connection):
+    cursor = connection.execute(
+        'SELECT address, components, premise_number, building_type '
+        'FROM premises ORDER BY id')
+
+    results = format_rows(cursor, columns=[
+        'plain_address', 'address_components', 'premise_number',
+        'building_type'], render='html')
+
+    assert [result for _, result in results] == [
+        all_formats(*record, render='html') for record in corpus()]
+
+    with pytest.raises(ValueError):
+        list(format_rows([], render='foo'))
+
+
+def test_format_rows_dict_rows(connection):
+    connection.row_factory = sqlite3.Row
+    cursor = connection.execute(
+        'SELECT address AS plain_address, components AS address_components '
+        'FROM premises ORDER BY id')
+    rows = [dict(row) for row in cursor]
+
+    assert [result for _, result in format_rows(rows)] == [
+        all_formats(*record[:2]) for record in corpus()]
+
+    with pytest.raises(ValueError):
+        list(format_rows([("plain", None)]))
+
+
+def test_write_formats(connection):
+    cursor = connection.execute(
+        'SELECT id, address, components, premise_number, building_type '
+        'FROM premises')
+    results = format_rows(cursor, {'address': 'plain_address',
+                                   'components': 'address_components'},
+                          chunksize=50)
+
+    written = write_formats(
+        connection.cursor(),
+        'UPDATE premises SET full_address = ? WHERE id = ?', results,
+        lambda row, formats: (formats['all'], row[0]), chunksize=50)
+    connection.commit()
+
+    records = corpus()
+    assert written == len(records)
+    assert [row[0] for row in connection.execute(
+        'SELECT full_address FROM premises ORDER BY id')] == [
+        all_formats(*record)['all'] for record in records]
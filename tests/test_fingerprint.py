@@ -0,0 +1,85 @@
+from address_formatter.benchmark import generate_corpus
+from address_formatter.fingerprint import (
+    Bucket,
+    fingerprint,
+    group_fingerprints,
+    iter_duplicates,
+)
+from address_formatter.formatter import portion_triples
+
+BUILDING = {
+    "region": "Москва", "region_type_full": "город",
+    "street": "Майская", "street_type_full": "улица",
+    "house": "5", "house_type_full": "дом",
+}
+
+
+def test_fingerprint_folds_values():
+    assert fingerprint(BUILDING) == fingerprint(dict(
+        BUILDING, street=" майская ", house=5, source="crm"))
+    assert fingerprint(BUILDING) == fingerprint(dict(BUILDING, section=None))
+    assert fingerprint(BUILDING, "1") == fingerprint(BUILDING, "1", 1)
+
+    assert fingerprint(BUILDING) != fingerprint(dict(BUILDING, house="6"))
+    assert fingerprint(BUILDING) != fingerprint(
+        dict(BUILDING, street_type_full="проезд"))
+    assert fingerprint(BUILDING) != fingerprint(dict(BUILDING, section="1"))
+    assert fingerprint(BUILDING, "1") != fingerprint(BUILDING)
+    assert fingerprint(BUILDING, "1") != fingerprint(BUILDING, "1", 2)
+    # Улица без типа не форматируется и не входит в отпечаток
+    assert fingerprint(dict(BUILDING, street_type_full=None)) == \
+        fingerprint(dict(BUILDING, street="Садовая", street_type_full=None))
+    assert fingerprint(None) == fingerprint({})
+
+
+def test_fingerprint_exact_types():
+    # all_formats не знает тип "Улица", адрес с ним не совпадает с "улица"
+    assert fingerprint(BUILDING) != fingerprint(
+        dict(BUILDING, street_type_full="Улица"))
+    assert fingerprint(dict(BUILDING, street_type_full="Улица")) == \
+        fingerprint(dict(BUILDING, street="майская", street_type_full="Улица"))
+
+    # Порция с неизвестным типом не пропускается и не равна известной
+    unknown = fingerprint(dict(BUILDING, street_type_full="линейка"))
+    assert unknown != fingerprint(dict(BUILDING, street_type_full=None))
+    assert unknown != fingerprint(dict(BUILDING, street_type_full="Линейка"))
+    assert fingerprint({"street": "Майская", "street_type_full": "foo"}) != \
+        fingerprint({"street": "Майская", "street_type_full": "улица"})
+
+
+def test_fingerprint_same_portions_same_fingerprint():
+    corpus = generate_corpus(500)
+    by_portions = {}
+    for _, data, premise_number, building_type in corpus:
+        portions = tuple(
+            triple for triple in portion_triples(
+                data, premise_number, building_type)
+            if triple[1] is not None and triple[2] is not None)
+        key = fingerprint(data, premise_number, building_type)
+        assert by_portions.setdefault(portions, key) == key
+
+    assert len(set(by_portions.values())) == len(by_portions)
+
+
+def test_group_fingerprints():
+    items = [BUILDING, ("plain", dict(BUILDING, house="6")),
+             ("plain", dict(BUILDING, street="майская"), None, None),
+             dict(BUILDING, street="Садовая")]
+
+    buckets = group_fingerprints(items, ids=['a', 'b', 'c', 'd'])
+
+    assert buckets == {
+        fingerprint(BUILDING): Bucket('a', 2),
+        fingerprint(dict(BUILDING, house="6")): Bucket('b', 1),
+        fingerprint(dict(BUILDING, street="Садовая")): Bucket('d', 1),
+    }
+    assert sorted(group_fingerprints(items).values()) == [
+        Bucket(0, 2), Bucket(1, 1), Bucket(3, 1)]
+
+
+def test_iter_duplicates():
+    items = iter([BUILDING, dict(BUILDING, house="6"), BUILDING,
+                  dict(BUILDING, street="МАЙСКАЯ"), dict(BUILDING, house="6")])
+
+    assert list(iter_duplicates(items, ids=[1, 2, 1, 4, 5])) == [
+        (1, 1), (4, 1), (5, 2)]
@@ -0,0 +1,113 @@
+import pytest
+
+from address_formatter import all_formats
+
+pd = pytest.importorskip('pandas')
+frame = pytest.importorskip('address_formatter.frame')
+
+STREET = {
+    'region': 'Москва',
+    'region_type_full': 'город',
+    'street': 'Майская',
+    'street_type_full': 'улица',
+    'house': '1',
+    'house_type_full': 'дом',
+}
+SETTLEMENT = {
+    'region': 'Московская',
+    'region_type_full': 'область',
+    'settlement': 'Заречье',
+    'settlement_type_full': 'деревня',
+}
+
+
+def frame_rows():
+    return [
+        dict(STREET, plain_address='Москва, Майская, 1',
+             premise_number=1, building_type=1),
+        dict(STREET, plain_address='Москва, Майская, 1',
+             premise_number=2, building_type=1),
+        dict(STREET, plain_address='Москва, Майская, 1',
+             premise_number=1, building_type=1),
+        dict(SETTLEMENT, plain_address='Заречье',
+             premise_number=None, building_type=None),
+        dict(STREET, plain_address='Москва, Майская, 1',
+             premise_number=3, building_type=2),
+    ]
+
+
+def expected(row):
+    components = {key: row[key] for key in row
+                  if key not in ('plain_address', 'premise_number',
+                                 'building_type')}
+    premise_number = row['premise_number']
+    return all_formats(
+        row['plain_address'], components,
+        str(premise_number) if premise_number is not None else None,
+        row['building_type'])
+
+
+def test_format_frame_matches_all_formats():
+    rows = frame_rows()
+    df = pd.DataFrame(rows, index=list('abcde'))
+
+    result = frame.format_frame(df)
+
+    assert list(result.index) == list('abcde')
+    for index, row in zip(result.index, rows):
+        assert result.loc[index].to_dict() == expected(row)
+    assert result['all'].tolist() == [
+        'г.\u00A0Москва, ул.\u00A0Майская, д.\u00A01, кв.\u00A01',
+        'г.\u00A0Москва, ул.\u00A0Майская, д.\u00A01, кв.\u00A02',
+        'г.\u00A0Москва, ул.\u00A0Майская, д.\u00A01, кв.\u00A01',
+        'Московская\u00A0обл., д.\u00A0Заречье',
+        'г.\u00A0Москва, ул.\u00A0Майская, д.\u00A01, м.\u00A03',
+    ]
+
+
+def test_format_frame_formats_unique_rows_once(monkeypatch):
+    calls = []
+    format_many = frame.format_many
+
+    def counting_format_many(records, **kwargs):
+        records = list(records)
+        calls.append(len(records))
+        return format_many(records, **kwargs)
+
+    monkeypatch.setattr(frame, 'format_many', counting_format_many)
+    df = pd.DataFrame(frame_rows() * 100)
+
+    result = frame.format_frame(df, formats=['all'])
+
+    assert calls == [4]
+    assert len(result) == 500
+    assert list(result.columns) == ['all']
+
+
+def test_format_frame_categorical():
+    df = pd.DataFrame(frame_rows())
+
+    result = frame.format_frame(df, formats=['all', 'street_only'],
+                                categorical=True)
+
+    assert isinstance(result['all'].dtype, pd.CategoricalDtype)
+    assert result['street_only'].tolist() == [
+        expected(row)['street_only'] for row in frame_rows()]
+
+
+def test_accessor():
+    df = pd.DataFrame(frame_rows())
+
+    result = df.address.formats(['all'])
+
+    assert result['all'].tolist() == [
+        expected(row)['all'] for row in frame_rows()]
+
+
+def test_format_frame_empty():
+    df = pd.DataFrame(columns=['plain_address', 'street'])
+
+    result = frame.format_frame(df, formats=['all'])
+
+    assert list(result.columns) == ['all']
+    assert len(result) == 0
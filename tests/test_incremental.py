@@ -0,0 +1,164 @@
+import pytest
+
+from address_formatter import all_formats
+from address_formatter import formatter
+from address_formatter.benchmark import generate_corpus
+from address_formatter.formatter import KEYS, TYPES
+from address_formatter.incremental import (
+    Change,
+    IncrementalFormatter,
+    changed_types,
+)
+
+BUILDING = {
+    "region": "Москва", "region_type_full": "город",
+    "street": "Майская", "street_type_full": "улица",
+    "house": "1", "house_type_full": "дом",
+}
+
+
+@pytest.fixture(autouse=True)
+def restore_tables():
+    yield
+
+    formatter.KEYS = KEYS
+    formatter.TYPES = TYPES
+    formatter.rebuild_plans()
+
+
+def corpus():
+    return dict(enumerate(generate_corpus(300)))
+
+
+def assert_same_as_all_formats(dataset):
+    for record_id, record in dataset.records.items():
+        assert dataset[record_id] == all_formats(
+            *record, formats=dataset.formats)
+
+
+def test_incremental_formatter_same_as_all_formats():
+    records = corpus()
+    dataset = IncrementalFormatter(records, formats=['all', 'street_only'])
+
+    assert len(dataset) == len(records)
+    assert_same_as_all_formats(dataset)
+
+
+def test_update():
+    dataset = IncrementalFormatter({1: ("", BUILDING, "1"),
+                                    2: ("", BUILDING, "2")})
+    old = dict(dataset[1])
+
+    changes = dataset.update([
+        (1, ("", dict(BUILDING, house="2"), "1")),
+        (2, None),
+        (3, ("", BUILDING)),
+    ])
+
+    assert Change(1, 'all', old['all'],
+                  all_formats("", dict(BUILDING, house="2"), "1")['all']) \
+        in changes
+    assert Change(1, 'street_only', old['street_only'],
+                  old['street_only']) not in changes
+    assert {change.new for change in changes if change.id == 2} == {None}
+    assert {change.old for change in changes if change.id == 3} == {None}
+    assert sorted(dataset.records) == [1, 3]
+    assert dataset.update({3: ("", BUILDING)}) == []
+    assert_same_as_all_formats(dataset)
+
+
+def test_rename_reformats_only_affected_records():
+    records = corpus()
+    records['target'] = ("", BUILDING, "1")
+    records['other'] = ("", dict(BUILDING, street="Садовая"), "1")
+    dataset = IncrementalFormatter(records)
+
+    ids = {record_id for record_id, record in records.items()
+           if record[1] and record[1].get('street') == 'Майская'}
+    assert 'target' in ids and 'other' not in ids
+
+    changes = dataset.rename('street', 'Майская', 'Первомайская')
+
+    assert {change.id for change in changes} == ids
+    assert {change.format_key for change in changes} == {
+        'all', 'street_only', 'starting_with_street', 'finishing_with_street'}
+    assert dataset.records['target'][1]['street'] == 'Первомайская'
+    assert dataset.rename('street', 'Майская', 'Ленинская') == []
+    assert_same_as_all_formats(dataset)
+
+    # Без улицы адрес собирается без нее
+    changes = dataset.rename('street', 'Первомайская', None)
+    assert {change.id for change in changes} == ids
+    assert_same_as_all_formats(dataset)
+
+    with pytest.raises(ValueError):
+        dataset.rename('ownership', '1', '2')
+
+
+def test_changed_types():
+    types = {'street': {'улица': {'abbreviation': 'ул'},
+                        'проезд': {'abbreviation': 'пр'}}}
+    new_types = {'street': {'улица': {'abbreviation': 'у'},
+                            'шоссе': {'abbreviation': 'ш'},
+                            'проезд': {'abbreviation': 'пр'}},
+                 'city': {}}
+
+    assert changed_types(types, new_types) == {
+        ('street', 'улица'), ('street', 'шоссе')}
+    assert changed_types(types, types) == set()
+
+
+def test_refresh_after_types_change():
+    records = corpus()
+    records['target'] = ("", BUILDING, "1")
+    records['unknown'] = ("", dict(BUILDING, street_type_full="линейка"), "1")
+    dataset = IncrementalFormatter(records)
+    assert dataset.refresh() == []
+
+    street_types = dict(TYPES['street'])
+    street_types['улица'] = dict(street_types['улица'], abbreviation='улица')
+    street_types['линейка'] = dict(street_types['улица'], abbreviation='лин')
+    formatter.TYPES = dict(TYPES, street=street_types)
+    formatter.rebuild_plans()
+
+    changes = dataset.refresh()
+
+    ids = {record_id for record_id, record in records.items()
+           if record[1] and record[1].get('street_type_full') in (
+               'улица', 'линейка') and record[1].get('street')}
+    assert 'target' in ids and 'unknown' in ids
+    assert {change.id for change in changes} == ids
+    assert 'finishing_with_village' not in {
+        change.format_key for change in changes}
+    assert dataset['unknown']['street_only'] == "лин.\u00A0Майская"
+    assert_same_as_all_formats(dataset)
+
+
+def test_refresh_after_keys_change():
+    dataset = IncrementalFormatter({1: ("", BUILDING, "1")})
+
+    formatter.KEYS = dict(KEYS, building={'value_key': 'building',
+                                          'type_key': 'house_type_full'})
+    formatter.rebuild_plans()
+
+    changes = dataset.refresh()
+    assert changes and {change.id for change in changes} == {1}
+    assert_same_as_all_formats(dataset)
+    assert dataset.rename('building', '1', '2') == []
+
+
+def test_refresh_after_keys_changed_in_place():
+    dataset = IncrementalFormatter({1: ("", BUILDING, "1")})
+
+    building_keys = KEYS['building']
+    KEYS['building'] = {'value_key': 'building',
+                        'type_key': 'house_type_full'}
+    try:
+        formatter.rebuild_plans()
+
+        changes = dataset.refresh()
+        assert changes and {change.id for change in changes} == {1}
+        assert_same_as_all_formats(dataset)
+        assert dataset.refresh() == []
+    finally:
+        KEYS['building'] = building_keys
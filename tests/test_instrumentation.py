@@ -0,0 +1,107 @@
+import pytest
+
+from address_formatter import all_formats
+from address_formatter import formatter
+from address_formatter.building import BuildingFormatter
+from address_formatter.compact import compact_many
+from address_formatter.formatter import AddressComponent, check_portion
+from address_formatter.instrumentation import (
+    enable_instrumentation,
+    disable_instrumentation,
+    get_instrumentation,
+)
+from address_formatter.prefix import PrefixTree
+
+from .test_address_format import records_from_testcases
+
+
+@pytest.fixture
+def instrumentation():
+    yield enable_instrumentation()
+    disable_instrumentation()
+
+
+def test_disabled_by_default():
+    assert get_instrumentation() is None
+    assert formatter.format_portion.__module__ == formatter.__name__
+    assert not hasattr(formatter.format_portion, '__wrapped__')
+
+
+def test_enable_disable():
+    original = formatter.format_portion
+    instrumentation = enable_instrumentation()
+    assert get_instrumentation() is instrumentation
+    assert formatter.format_portion.__wrapped__ is original
+
+    enable_instrumentation()
+    assert formatter.format_portion.__wrapped__ is original
+
+    disable_instrumentation()
+    assert formatter.format_portion is original
+    assert get_instrumentation() is None
+
+
+def test_counters(instrumentation):
+    records = records_from_testcases()
+    expected = [all_formats(*record) for record in records]
+    disable_instrumentation()
+    assert [all_formats(*record) for record in records] == expected
+
+    snapshot = instrumentation.snapshot()
+    assert snapshot['portions'][AddressComponent.REGION, 'ok'] == 4
+    assert snapshot['portions'][AddressComponent.REGION, 'empty'] == 3
+    assert snapshot['unknown_types'] == {}
+    assert snapshot['timings']['check_portion']['count'] == sum(
+        snapshot['portions'].values())
+    assert snapshot['timings']['format_result']['count'] > 0
+    assert snapshot['timings']['check_start_with_type']['count'] > 0
+
+
+def test_unknown_types(instrumentation):
+    check_portion({'street': 'Майская', 'street_type_full': 'foo'},
+                  AddressComponent.STREET)
+    check_portion({'street': 'Майская', 'street_type_full': 'foo'},
+                  AddressComponent.STREET)
+
+    snapshot = instrumentation.snapshot()
+    assert snapshot['unknown_types'] == {(AddressComponent.STREET, 'foo'): 2}
+    assert snapshot['portions'] == {(AddressComponent.STREET, 'error'): 2}
+
+    instrumentation.reset()
+    assert instrumentation.snapshot()['unknown_types'] == {}
+
+
+def test_hook():
+    events = []
+    enable_instrumentation(hook=lambda *event: events.append(event))
+    try:
+        check_portion({'street': 'Майская', 'street_type_full': 'foo'},
+                      AddressComponent.STREET)
+    finally:
+        disable_instrumentation()
+
+    names = [name for name, _, _ in events]
+    assert names == ['check_portion', 'portions', 'unknown_types']
+    assert events[2] == ('unknown_types', 1,
+                         {'component': 'street', 'type': 'foo'})
+
+
+def test_backends_instrumented(instrumentation):
+    plain_address, data, premise_number, building_type = \
+        records_from_testcases()[0]
+
+    PrefixTree().all_formats(plain_address, data, premise_number,
+                             building_type)
+    prefix_count = sum(instrumentation.snapshot()['portions'].values())
+    assert prefix_count > 0
+
+    BuildingFormatter(plain_address, data, building_type).premise("1")
+    building_count = sum(instrumentation.snapshot()['portions'].values())
+    assert building_count > prefix_count
+
+    list(compact_many([(plain_address, data, premise_number,
+                        building_type)]))
+    snapshot = instrumentation.snapshot()
+    assert sum(snapshot['portions'].values()) > building_count
+    assert snapshot['timings']['check_portion']['count'] == sum(
+        snapshot['portions'].values())
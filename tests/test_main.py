@@ -0,0 +1,129 @@
+import csv
+import io
+import json
+import subprocess
+import sys
+
+import pytest
+
+from address_formatter import all_formats
+from address_formatter.__main__ import parse_args, read_csv, run
+
+from .test_address_format import records_from_testcases
+
+
+def jsonl_input(records):
+    return io.StringIO(''.join(
+        json.dumps(dict(zip(('plain_address', 'address_components',
+                             'premise_number', 'building_type'), record)),
+                   ensure_ascii=False) + '\n'
+        for record in records))
+
+
+def run_cli(argv, stdin):
+    stdout, stderr = io.StringIO(), io.StringIO()
+    run(parse_args(argv), stdin, stdout, stderr)
+    return stdout.getvalue(), stderr.getvalue()
+
+
+def test_jsonl_to_jsonl():
+    records = records_from_testcases()
+    stdout, stderr = run_cli(['--chunksize', '2'], jsonl_input(records))
+
+    assert [json.loads(line) for line in stdout.splitlines()] == [
+        all_formats(*record) for record in records]
+    assert stderr == ''
+
+
+def test_render():
+    records = records_from_testcases()
+    stdout, _ = run_cli(['--render', 'plain'], jsonl_input(records))
+
+    assert [json.loads(line) for line in stdout.splitlines()] == [
+        all_formats(*record, render='plain') for record in records]
+
+
+def test_jsonl_to_csv_formats_progress():
+    records = records_from_testcases()
+    stdout, stderr = run_cli(
+        ['--output-format', 'csv', '--formats', 'all,street_only',
+         '--progress'], jsonl_input(records))
+
+    rows = list(csv.reader(io.StringIO(stdout)))
+    assert rows[0] == ['all', 'street_only']
+    assert rows[1:] == [
+        [formats['all'], formats['street_only']]
+        for formats in (all_formats(*record) for record in records)]
+    assert stderr.startswith(f'{len(records)} records')
+
+
+def test_read_csv():
+    rows = io.StringIO(
+        'plain_address,premise_number,building_type,city,city_type_full,'
+        'street\n'
+        'plain,5,4,Серов,город,\n'
+        'plain,,,,,\n')
+    assert list(read_csv(rows)) == [
+        ('plain', {'city': 'Серов', 'city_type_full': 'город'}, '5', 4),
+        ('plain', {}, None, None),
+    ]
+
+    rows = io.StringIO(
+        'plain_address,address_components\n'
+        'plain,"{""city"": ""Серов"", ""city_type_full"": ""город""}"\n')
+    assert list(read_csv(rows)) == [
+        ('plain', {'city': 'Серов', 'city_type_full': 'город'}, None, None)]
+
+
+def test_bad_records_skipped():
+    records = records_from_testcases()[:2]
+    lines = jsonl_input(records).getvalue().splitlines(keepends=True)
+    lines[1:1] = [
+        '{"plain_address": "plain", "address_components": {"city": '
+        '"Серов", "city_type_full": "город", "house": 5, '
+        '"house_type_full": "дом"}, "premise_number": 5}\n',
+        '{"plain_address": \n',
+        '[1, 2]\n',
+        '{"address_components": {"city": ["Серов"]}}\n',
+        '{"building_type": "гараж"}\n',
+    ]
+    stdout, stderr = run_cli([], io.StringIO(''.join(lines)))
+
+    assert [json.loads(line) for line in stdout.splitlines()] == [
+        all_formats(*records[0]),
+        all_formats("plain", {"city": "Серов", "city_type_full": "город",
+                              "house": "5", "house_type_full": "дом"}, "5"),
+        all_formats(*records[1]),
+    ]
+    assert [line.split(':')[0] for line in stderr.splitlines()] == [
+        'line 3', 'line 4', 'line 5', 'line 6']
+
+    rows = io.StringIO(
+        'plain_address,building_type,address_components\n'
+        'plain,гараж,\n'
+        'plain,,{]\n'
+        'plain,4,\n')
+    errors = io.StringIO()
+    assert list(read_csv(rows, errors)) == [('plain', None, None, 4)]
+    assert [line.split(':')[0] for line in errors.getvalue().splitlines()] \
+        == ['line 2', 'line 3']
+
+
+def test_unknown_formats():
+    with pytest.raises(SystemExit):
+        parse_args(['--formats', 'all,foo'])
+
+
+def test_module_entry_point(tmp_path):
+    records = records_from_testcases()
+    source = tmp_path / 'premises.jsonl'
+    source.write_text(jsonl_input(records).getvalue(), encoding='utf-8')
+    target = tmp_path / 'formats.csv'
+
+    subprocess.run([sys.executable, '-m', 'address_formatter', str(source),
+                    '-o', str(target), '--formats', 'all', '--workers', '2'],
+                   check=True)
+
+    with open(target, encoding='utf-8', newline='') as target_fd:
+        assert list(csv.reader(target_fd)) == [['all']] + [
+            [all_formats(*record)['all']] for record in records]
@@ -0,0 +1,108 @@
+import sys
+
+import pytest
+
+from address_formatter import (
+    all_formats,
+    disable_cache,
+    enable_cache,
+    format_many,
+)
+from address_formatter.benchmark import generate_corpus
+from address_formatter.formatter import (
+    AddressComponent,
+    AdjectiveSuffixSet,
+    TYPES,
+    rebuild_plans,
+)
+from address_formatter.parallel import (
+    chunked,
+    format_parallel,
+    format_threaded,
+)
+
+from .test_address_format import records_from_testcases
+
+
+def test_chunked():
+    assert list(chunked([], 2)) == []
+    assert list(chunked(range(5), 2)) == [[0, 1], [2, 3], [4]]
+
+
+def test_format_parallel_order():
+    records = records_from_testcases() * 20
+    expected = [all_formats(*record) for record in records]
+
+    assert list(format_parallel(records, workers=2, chunksize=3,
+                                max_inflight=2)) == expected
+
+
+def test_format_parallel_formats():
+    records = records_from_testcases()
+
+    assert list(format_parallel(records, workers=1,
+                                formats=['street_only'])) == [
+        all_formats(*record, formats=['street_only']) for record in records]
+    assert list(format_parallel(records, workers=1, render='html')) == [
+        all_formats(*record, render='html') for record in records]
+
+
+def test_format_parallel_runtime_types():
+    street_types = TYPES[AddressComponent.STREET]
+    street_types['линейка'] = {"suffix_set": AdjectiveSuffixSet.FEMININE,
+                               "abbreviation": "лин-ка"}
+    records = [("", {'street': 'Садовая', 'street_type_full': 'линейка'})]
+    try:
+        rebuild_plans()
+        expected = [all_formats(*record) for record in records]
+        assert list(format_parallel(records, workers=1)) == expected
+    finally:
+        del street_types['линейка']
+        rebuild_plans()
+
+    assert expected[0]['street_only'] == 'Садовая\xa0лин⁠-⁠ка'
+
+
+def test_format_threaded_order():
+    records = records_from_testcases() * 20
+    expected = [all_formats(*record) for record in records]
+
+    assert list(format_threaded(records, workers=4, chunksize=3,
+                                max_inflight=2)) == expected
+    assert list(format_threaded(records, workers=2, formats=['all'],
+                                render='plain')) == [
+        all_formats(*record, formats=['all'], render='plain')
+        for record in records]
+
+
+@pytest.mark.parametrize("caches", (False, True))
+def test_format_threaded_stress(caches):
+    records = generate_corpus(3000)
+    expected = list(format_many(records))
+    if caches:
+        enable_cache(portions_maxsize=64, formats_maxsize=64)
+
+    # Много потоков и мелкие пачки, чтобы потоки чаще переключались
+    old_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        for _ in range(3):
+            assert list(format_threaded(records, workers=8, chunksize=7,
+                                        max_inflight=32)) == expected
+    finally:
+        sys.setswitchinterval(old_interval)
+        disable_cache()
+
+
+def test_format_threaded_runtime_types():
+    street_types = TYPES[AddressComponent.STREET]
+    street_types['линейка'] = {"suffix_set": AdjectiveSuffixSet.FEMININE,
+                               "abbreviation": "лин-ка"}
+    records = [("", {'street': 'Садовая', 'street_type_full': 'линейка'})]
+    try:
+        rebuild_plans()
+        expected = [all_formats(*record) for record in records]
+        assert list(format_threaded(records, workers=1)) == expected
+    finally:
+        del street_types['линейка']
+        rebuild_plans()
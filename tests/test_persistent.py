@@ -0,0 +1,130 @@
+import pytest
+
+from address_formatter import all_formats
+from address_formatter import formatter
+from address_formatter.benchmark import generate_corpus
+from address_formatter.formatter import KEYS, TYPES
+from address_formatter.persistent import PersistentCache, cache_key
+from address_formatter.registry import rules_version
+
+from .test_address_format import records_from_testcases
+
+STREET = {"street": "Садовая", "street_type_full": "улица"}
+
+
+@pytest.fixture
+def path(tmp_path):
+    yield str(tmp_path / 'formats.sqlite3')
+
+    formatter.KEYS = KEYS
+    formatter.TYPES = TYPES
+    formatter.rebuild_plans()
+
+
+def test_cache_key_is_stable():
+    assert cache_key("", STREET, "1") == cache_key("", dict(STREET), "1")
+    assert cache_key("", STREET, "1") != cache_key("", STREET, "2")
+    assert cache_key("", STREET, "1") != cache_key("", STREET, "1", 2)
+    assert cache_key("", STREET) != cache_key("", STREET, formats=('all',))
+
+
+@pytest.mark.parametrize("formats", (None, ['all', 'street_only']))
+def test_persistent_cache_same_as_all_formats(path, formats):
+    records = records_from_testcases() + generate_corpus(300)
+    expected = [all_formats(*record, formats=formats) for record in records]
+
+    with PersistentCache(path, chunksize=64) as cache:
+        assert list(cache.format_many(records, formats=formats)) == expected
+        assert cache.info().hits == 0
+
+    with PersistentCache(path, chunksize=64) as cache:
+        assert list(cache.format_many(records, formats=formats)) == expected
+        assert cache.info().misses == 0
+        assert [cache.all_formats(*record, formats=formats)
+                for record in records] == expected
+
+
+def test_persistent_cache_preload(path):
+    records = generate_corpus(100)
+    with PersistentCache(path) as cache:
+        list(cache.format_many(records))
+        stored = len(cache)
+
+    with PersistentCache(path) as cache:
+        assert cache.preload() == stored
+        cache._connection.execute('DELETE FROM formats')
+        # Результаты берутся из памяти
+        assert list(cache.format_many(records)) == [
+            all_formats(*record) for record in records]
+        assert cache.info().misses == 0
+
+
+def test_persistent_cache_invalidated_by_rules(path):
+    version = rules_version()
+    cache = PersistentCache(path)
+    assert cache.all_formats("", STREET)['all'] == "ул.\u00A0Садовая"
+    assert len(cache) == 1
+
+    formatter.TYPES = dict(TYPES, street=dict(
+        TYPES['street'], улица=dict(TYPES['street']['улица'],
+                                    abbreviation='улица')))
+    formatter.rebuild_plans()
+    assert rules_version() != version
+
+    assert cache.all_formats("", STREET)['all'] == "улица.\u00A0Садовая"
+    assert cache.info().hits == 0
+    assert len(cache) == 1
+    cache.close()
+
+    # Строки старой версии остаются для процессов на старых правилах
+    formatter.TYPES = TYPES
+    formatter.rebuild_plans()
+    assert rules_version() == version
+    with PersistentCache(path) as cache:
+        assert len(cache) == 1
+        assert cache.all_formats("", STREET)['all'] == "ул.\u00A0Садовая"
+        assert cache.info().misses == 0
+
+        assert cache.prune() == 1
+        assert len(cache) == 1
+        assert cache._connection.execute(
+            'SELECT count(*) FROM formats').fetchone()[0] == 1
+
+
+def test_persistent_cache_reload_while_formatting(path, monkeypatch):
+    version = rules_version()
+    format_portion = formatter.format_portion
+
+    def reloading_format_portion(*args):
+        # load_registry в другом потоке посреди форматирования записи
+        formatter.TYPES = dict(TYPES, street=dict(
+            TYPES['street'], улица=dict(TYPES['street']['улица'],
+                                        abbreviation='улица')))
+        formatter.rebuild_plans()
+        return format_portion(*args)
+
+    monkeypatch.setattr(formatter, 'format_portion', reloading_format_portion)
+    with PersistentCache(path) as cache:
+        assert cache.all_formats("", STREET)['all'] == "ул.\u00A0Садовая"
+        formatter.TYPES = TYPES
+        formatter.rebuild_plans()
+        assert list(cache.format_many([("", dict(
+            STREET, house="1", house_type_full="дом"))]))[0]['all'] == \
+            "ул.\u00A0Садовая, д.\u00A01"
+        monkeypatch.undo()
+
+        # Результаты старых планов записаны под старой версией
+        assert rules_version() != version
+        assert len(cache) == 0
+        assert cache.all_formats("", STREET)['all'] == "улица.\u00A0Садовая"
+        formatter.TYPES = TYPES
+        formatter.rebuild_plans()
+        assert len(cache) == 2
+
+
+def test_persistent_cache_clear(path):
+    with PersistentCache(path) as cache:
+        cache.all_formats("", STREET)
+        cache.clear()
+        assert len(cache) == 0
+        assert cache.info().hits == 0
@@ -0,0 +1,76 @@
+import pytest
+
+from address_formatter import all_formats
+from address_formatter.benchmark import generate_corpus
+from address_formatter.formatter import IS_ERROR
+from address_formatter.prefix import PrefixNode, PrefixTree
+
+from .test_address_format import records_from_testcases
+
+
+def test_prefix_node_join():
+    node = PrefixNode()
+    assert node.join([]) == ''
+    assert node.join(['a', None, '', 'a', 'b', 'a']) == 'a, b, a'
+    assert node.extend('a').extend('a').joined == 'a'
+    assert node.extend('a').join(['a', 'b']) == 'a, b'
+    assert node.extend(IS_ERROR).join(['a']) == ''
+    assert node.extend('a').join([IS_ERROR]) == ''
+
+
+@pytest.mark.parametrize("formats", (
+    None,
+    ['all'],
+    ['street_only', 'finishing_with_village'],
+    [],
+))
+def test_prefix_tree_same_as_all_formats(formats):
+    records = records_from_testcases() + generate_corpus(500)
+    tree = PrefixTree()
+
+    assert list(tree.format_many(records, formats=formats)) == [
+        all_formats(*record, formats=formats) for record in records]
+    # второй проход берет префиксы из дерева
+    assert list(tree.format_many(records, formats=formats)) == [
+        all_formats(*record, formats=formats) for record in records]
+
+
+@pytest.mark.parametrize("render", ('plain', 'html'))
+def test_prefix_tree_render(render):
+    records = records_from_testcases() + [("plain", None)]
+    tree = PrefixTree()
+
+    assert list(tree.format_many(records, render=render)) == [
+        all_formats(*record, render=render) for record in records]
+    assert tree.all_formats(*records[0], formats=['all'], render=render) == \
+        all_formats(*records[0], formats=['all'], render=render)
+
+    with pytest.raises(ValueError):
+        tree.all_formats(*records[0], render='foo')
+
+
+def test_prefix_tree_shared_prefix():
+    tree = PrefixTree()
+    data = {"region": "Курганская", "region_type_full": "область",
+            "city": "Серов", "city_type_full": "город",
+            "street": "Майская", "street_type_full": "улица"}
+
+    tree.all_formats("", data, "1")
+    size = tree.size
+    assert size == 5
+
+    tree.all_formats("", dict(data, house="5", house_type_full="дом"), "2")
+    assert tree.size == size
+
+
+def test_prefix_tree_maxsize():
+    tree = PrefixTree(maxsize=10)
+    records = generate_corpus(200)
+
+    assert list(tree.format_many(records)) == [
+        all_formats(*record) for record in records]
+    assert tree.size <= 10
+
+    tree.clear()
+    assert tree.size == 0
+    assert not tree.root.children
@@ -0,0 +1,179 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from address_formatter import all_formats, disable_cache, enable_cache
+from address_formatter import formatter
+from address_formatter.formatter import (
+    KEYS,
+    TYPES,
+    AddressComponent,
+    check_portion,
+    get_plans,
+)
+from address_formatter.prefix import PrefixTree
+from address_formatter.registry import (
+    REGISTRY_ENV,
+    RegistryError,
+    dump_registry,
+    load_registry,
+    parse_registry,
+    reload_registry,
+    rules_version,
+    validate_registry,
+)
+
+STREET = {"street": "Садовая", "street_type_full": "линейка"}
+
+
+@pytest.fixture
+def registry_path(tmp_path):
+    path = str(tmp_path / 'registry.json')
+    dump_registry(path)
+    yield path
+
+    formatter.KEYS = KEYS
+    formatter.TYPES = TYPES
+    formatter.rebuild_plans()
+
+
+def edit_registry(path, edit):
+    with open(path, encoding='utf-8') as registry_fd:
+        raw = json.load(registry_fd)
+    edit(raw)
+    with open(path, 'w', encoding='utf-8') as registry_fd:
+        json.dump(raw, registry_fd, ensure_ascii=False)
+
+
+def test_dump_load_roundtrip(registry_path):
+    with open(registry_path, encoding='utf-8') as registry_fd:
+        assert parse_registry(json.load(registry_fd)) == (KEYS, TYPES)
+
+
+def test_validate_registry():
+    validate_registry(KEYS, TYPES)
+
+    with pytest.raises(RegistryError):
+        validate_registry(KEYS, dict(TYPES, foo={}))
+
+    types = dict(TYPES)
+    del types[AddressComponent.STREET]
+    with pytest.raises(RegistryError):
+        validate_registry(KEYS, types)
+
+    with pytest.raises(RegistryError):
+        validate_registry(KEYS, dict(TYPES, street={
+            "улица": {"suffix_set": ["а"], "abbreviation": "ул"}}))
+
+    with pytest.raises(RegistryError):
+        validate_registry(KEYS, dict(TYPES, street={
+            "улица": {"suffix_set": [], "abbreviation": ""}}))
+
+
+def test_parse_registry_errors():
+    with pytest.raises(RegistryError):
+        parse_registry({})
+
+    with pytest.raises(RegistryError):
+        parse_registry({'types': {'street': {
+            "улица": {"suffix_set": "FOO", "abbreviation": "ул"}}}})
+
+
+def test_load_and_reload(registry_path):
+    tree = PrefixTree()
+    tree.all_formats("", dict(STREET, city="Серов", city_type_full="город"))
+    assert tree.size
+
+    assert all_formats("plain", STREET)['street_only'] == 'plain'
+
+    edit_registry(registry_path, lambda raw: raw['types']['street'].update({
+        "линейка": {"suffix_set": "FEMININE", "abbreviation": "лин-ка"}}))
+    load_registry(registry_path)
+
+    assert all_formats("plain", STREET)['street_only'] == \
+        'Садовая\xa0лин⁠-⁠ка'
+    assert ('street', 'линейка') in get_plans().plans
+    assert tree.size == 0
+
+    edit_registry(registry_path, lambda raw: raw['types']['street'].update({
+        "линейка": {"suffix_set": "FEMININE", "abbreviation": "лнк"}}))
+    reload_registry()
+    assert all_formats("plain", STREET)['street_only'] == 'Садовая\xa0лнк.'
+
+
+def test_load_invalid_keeps_tables(registry_path):
+    compiled = get_plans()
+    edit_registry(registry_path, lambda raw: raw['types'].pop('street'))
+
+    with pytest.raises(RegistryError):
+        load_registry(registry_path)
+    assert get_plans() is compiled
+
+
+def test_rules_version_of_compiled_plans(registry_path):
+    version = rules_version()
+    edit_registry(registry_path, lambda raw: raw['types']['street'].update({
+        "линейка": {"suffix_set": "FEMININE", "abbreviation": "лнк"}}))
+    load_registry(registry_path)
+
+    assert rules_version() == get_plans().version != version
+    # Версия берётся из снимка планов, а не из KEYS и TYPES модуля
+    formatter.TYPES = TYPES
+    assert rules_version() == get_plans().version
+
+
+def test_lazy_default_registry(registry_path):
+    edit_registry(registry_path, lambda raw: raw['types']['street'].update({
+        "линейка": {"suffix_set": "FEMININE", "abbreviation": "лин-ка"}}))
+
+    code = ('from address_formatter import all_formats, formatter; '
+            'assert formatter.COMPILED is None; '
+            'print(all_formats("plain", {"street": "Садовая", '
+            '"street_type_full": "линейка"})["street_only"] == '
+            '"Садовая\\xa0лин\\u2060-\\u2060ка")')
+    output = subprocess.run(
+        [sys.executable, '-c', code], check=True, stdout=subprocess.PIPE,
+        env=dict(os.environ, **{REGISTRY_ENV: registry_path})).stdout
+    assert output.strip() == b'True'
+
+
+def test_default_registry_in_workers(registry_path):
+    edit_registry(registry_path, lambda raw: raw['types']['street'].update({
+        "линейка": {"suffix_set": "FEMININE", "abbreviation": "лин-ка"}}))
+
+    code = ('from address_formatter.parallel import format_parallel; '
+            'results = list(format_parallel([("plain", {"street": '
+            '"Садовая", "street_type_full": "линейка"}, None, None)], '
+            'workers=1)); '
+            'print(results[0]["street_only"] == '
+            '"Садовая\\xa0лин\\u2060-\\u2060ка")')
+    output = subprocess.run(
+        [sys.executable, '-c', code], check=True, stdout=subprocess.PIPE,
+        env=dict(os.environ, **{REGISTRY_ENV: registry_path})).stdout
+    assert output.strip() == b'True'
+
+
+def test_stale_cache_entries_ignored(registry_path):
+    enable_cache()
+    try:
+        compiled = get_plans()
+        edit_registry(registry_path, lambda raw: raw['types'][
+            'street'].update({"линейка": {"suffix_set": "FEMININE",
+                                          "abbreviation": "лнк"}}))
+        load_registry(registry_path)
+        loaded = get_plans()
+
+        # Читатель старых планов пишет в кеши уже после их очистки
+        formatter.COMPILED = compiled
+        assert all_formats("plain", STREET)['street_only'] == 'plain'
+        formatter.COMPILED = loaded
+
+        assert all_formats("plain", STREET)['street_only'] == \
+            'Садовая\xa0лнк.'
+        assert check_portion(STREET, AddressComponent.STREET) == \
+            'Садовая\xa0лнк.'
+    finally:
+        disable_cache()
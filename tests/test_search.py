@@ -0,0 +1,146 @@
+import pytest
+
+from address_formatter import all_formats
+from address_formatter.benchmark import generate_corpus
+from address_formatter.search import Match, SearchIndex, normalize_key
+
+BUILDINGS = {
+    1: ("", {"city": "Серов", "city_type_full": "город",
+             "street": "Майская", "street_type_full": "улица",
+             "house": "5", "house_type_full": "дом"}, "1"),
+    2: ("", {"city": "Серов", "city_type_full": "город",
+             "street": "Первомайская", "street_type_full": "улица",
+             "house": "5", "house_type_full": "дом"}),
+    3: ("", {"region": "Курганская", "region_type_full": "область",
+             "settlement": "Ёлкино", "settlement_type_full": "село"}),
+}
+
+
+def build_index():
+    return SearchIndex.build(BUILDINGS.values(), BUILDINGS)
+
+
+def test_normalize_key():
+    formats = all_formats(*BUILDINGS[1])
+    assert normalize_key(formats['all']) == 'г серов ул майская д 5 кв 1'
+    assert normalize_key(' Р⁠-⁠н.  ЁЛКИ,') == 'р-н елки'
+
+
+def test_prefix():
+    index = build_index()
+
+    assert index.prefix('г. серов, ул. май') == [
+        Match(1, 'all', all_formats(*BUILDINGS[1])['all'])]
+    assert index.prefix('ул перво') == [
+        Match(2, 'street_only', all_formats(*BUILDINGS[2])['street_only'])]
+    assert [match.id for match in index.prefix('г серов')] == [1, 2]
+    assert len(index.prefix('г серов', k=1)) == 1
+    assert index.prefix('москва') == []
+
+
+def test_tokens():
+    index = build_index()
+
+    assert {match.id for match in index.tokens('серов 5')} == {1, 2}
+    assert [match.id for match in index.tokens('майская 5')] == [1]
+    assert [match.id for match in index.tokens('5 майская кв')] == [1]
+    assert [match.id for match in index.tokens('елкино')] == [3]
+    assert index.tokens('майская 6') == []
+    assert index.tokens(' , ') == []
+    assert index.tokens('майская')[0].field == 'all'
+
+
+def test_tokens_ranked_before_k():
+    def house(street, number):
+        return ("", {"street": street, "street_type_full": "улица",
+                     "house": number, "house_type_full": "дом"})
+
+    index = SearchIndex.build(
+        [house("Майская", "55"), house("Садовая", "5"),
+         house("Абрикосовая", "5")], ['a', 'b', 'c'])
+
+    # Точные совпадения токенов раньше префиксных, дальше по ключам
+    assert [match.id for match in index.tokens('5')] == ['c', 'b', 'a']
+    assert [match.id for match in index.tokens('5', k=2)] == ['c', 'b']
+    assert [match.id for match in index.tokens('ул 5', k=1)] == ['c']
+
+
+def test_tokens_matched_field():
+    index = SearchIndex.build(BUILDINGS.values(), BUILDINGS,
+                              fields=('street_only', 'all'))
+
+    assert index.tokens('майская', k=1) == [
+        Match(1, 'street_only', all_formats(*BUILDINGS[1])['street_only'])]
+    assert index.tokens('майская 5', k=1) == [
+        Match(1, 'all', all_formats(*BUILDINGS[1])['all'])]
+    assert index.tokens('серов майская') == [
+        Match(1, 'all', all_formats(*BUILDINGS[1])['all'])]
+
+
+def test_add_remove():
+    index = build_index()
+    formats = all_formats("", {"street": "Садовая",
+                               "street_type_full": "улица"})
+
+    index.add(4, formats)
+    assert [match.id for match in index.tokens('садовая')] == [4]
+    index.add(4, all_formats(*BUILDINGS[1]))
+    assert index.tokens('садовая') == []
+    assert {match.id for match in index.tokens('майская кв')} == {1, 4}
+
+    index.remove(1)
+    index.remove(4)
+    assert 1 not in index and len(index) == 2
+    assert index.tokens('кв') == []
+    assert index.prefix('г серов ул майская') == []
+    with pytest.raises(KeyError):
+        index.remove(1)
+
+
+def test_add_many_same_as_add():
+    records = generate_corpus(300)
+    bulk = SearchIndex.build(records)
+    bulk.add_many([(0, all_formats(*records[1])), (500, all_formats(
+        *records[2]))])
+
+    single = SearchIndex()
+    for number, record in enumerate(records[1:], 1):
+        single.add(number, all_formats(*record))
+    single.add(0, all_formats(*records[1]))
+    single.add(500, all_formats(*records[2]))
+
+    assert bulk.documents == single.documents
+    assert bulk._keys == single._keys
+    assert sorted(bulk._refs) == sorted(single._refs)
+    assert bulk._tokens == single._tokens
+    assert bulk._postings == single._postings
+
+
+def test_add_many_repeated_ids():
+    index = SearchIndex.build(BUILDINGS.values(), ids=[7, 7, 8])
+    assert sorted(index.documents) == [7, 8]
+    assert [match.id for match in index.tokens('первомайская')] == [7]
+    assert index.tokens('майская кв') == []
+
+    index.add_many([(8, all_formats(*BUILDINGS[1])),
+                    (8, all_formats(*BUILDINGS[3]))])
+    assert [match.id for match in index.tokens('елкино')] == [8]
+    assert index.tokens('серов ул майская') == []
+    assert len(index._keys) == len(index._refs) == 4
+
+    index.remove(7)
+    index.remove(8)
+    assert index._keys == index._tokens == []
+
+
+def test_save_load(tmp_path):
+    path = str(tmp_path / 'addresses.index')
+    index = SearchIndex.build(generate_corpus(200))
+    index.save(path)
+
+    loaded = SearchIndex.load(path)
+    assert loaded.fields == index.fields
+    assert len(loaded) == len(index)
+    for query in ('г', 'ул май', 'кв 1'):
+        assert loaded.prefix(query) == index.prefix(query)
+        assert loaded.tokens(query) == index.tokens(query)
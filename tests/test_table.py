@@ -0,0 +1,118 @@
+import multiprocessing
+
+import pytest
+
+from address_formatter import all_formats
+from address_formatter import formatter
+from address_formatter.benchmark import generate_corpus
+from address_formatter.formatter import KEYS, TYPES
+from address_formatter.table import FormatTable, build_format_table
+
+from .test_address_format import records_from_testcases
+
+STREET = {"street": "Садовая", "street_type_full": "улица"}
+
+
+@pytest.fixture
+def path(tmp_path):
+    yield str(tmp_path / 'formats.table')
+
+    formatter.KEYS = KEYS
+    formatter.TYPES = TYPES
+    formatter.rebuild_plans()
+
+
+@pytest.mark.parametrize("formats", (
+    None,
+    tuple(formatter.FORMAT_KEYS),
+    ['all', 'street_only'],
+    [],
+))
+def test_table_same_as_all_formats(path, formats):
+    records = records_from_testcases() + generate_corpus(500)
+    expected = [all_formats(*record, formats=formats) for record in records]
+
+    size = build_format_table(path, records, formats=formats)
+
+    with FormatTable(path) as table:
+        assert len(table) == size
+        assert table.lookup(b'\0' * 16) is None
+        assert [table.all_formats(*record, formats=formats)
+                for record in records] == expected
+
+
+def test_table_ids(path):
+    records = generate_corpus(100)
+    build_format_table(path, records, ids=range(len(records)),
+                       formats=['all'])
+
+    with FormatTable(path) as table:
+        assert [table.get(index) for index in range(len(records))] == [
+            all_formats(*record, formats=['all']) for record in records]
+        assert table.get('0') == table.get(0)
+        assert table.get(len(records)) is None
+        assert table.get(len(records), {}) == {}
+
+    with pytest.raises(ValueError):
+        build_format_table(path, records, ids=[1])
+
+
+def test_table_fallback(path, monkeypatch):
+    build_format_table(path, [("", STREET, "1")], formats=['all'])
+    table = FormatTable(path)
+
+    # Нет в таблице или формат не сохранен
+    assert table.all_formats("", STREET, "2") == all_formats("", STREET, "2")
+    assert table.all_formats("", STREET, "1", formats=['street_only']) == \
+        all_formats("", STREET, "1", formats=['street_only'])
+
+    lookups = []
+    monkeypatch.setattr(table, 'lookup',
+                        lambda digest: lookups.append(digest))
+    formatter.TYPES = dict(TYPES, street=dict(
+        TYPES['street'], улица=dict(TYPES['street']['улица'],
+                                    abbreviation='улица')))
+    formatter.rebuild_plans()
+
+    assert table.stale
+    assert table.all_formats("", STREET, "1", formats=['all']) == \
+        all_formats("", STREET, "1", formats=['all'])
+    assert lookups == []
+    table.close()
+
+
+def test_table_get_stale(path):
+    build_format_table(path, [("", STREET, "1")], ids=['a'])
+    with FormatTable(path) as table:
+        assert table.get('a') == all_formats("", STREET, "1")
+
+        formatter.TYPES = dict(TYPES, street=dict(
+            TYPES['street'], улица=dict(TYPES['street']['улица'],
+                                        abbreviation='улица')))
+        formatter.rebuild_plans()
+
+        assert table.stale
+        assert table.get('a') is None
+        assert table.get('a', {}) == {}
+
+
+def read_table(path, records):
+    with FormatTable(path) as table:
+        return [table.all_formats(*record) for record in records]
+
+
+def test_table_shared_by_processes(path):
+    records = generate_corpus(50)
+    build_format_table(path, records)
+
+    with multiprocessing.get_context('spawn').Pool(1) as pool:
+        assert pool.apply(read_table, (path, records)) == [
+            all_formats(*record) for record in records]
+
+
+def test_not_a_table(path):
+    with open(path, 'wb') as table_fd:
+        table_fd.write(b'\0' * 64)
+
+    with pytest.raises(ValueError):
+        FormatTable(path)
@@ -0,0 +1,74 @@
+from address_formatter import all_formats
+from address_formatter.benchmark import UNKNOWN_TYPE, generate_corpus
+from address_formatter.formatter import (
+    IS_ERROR,
+    format_portion,
+    portion_triples,
+)
+from address_formatter.validation import (
+    MISSING_TYPE,
+    Issue,
+    validate,
+    validate_many,
+)
+from address_formatter.validation import UNKNOWN_TYPE as UNKNOWN
+
+from .test_address_format import records_from_testcases
+
+BUILDING = {
+    "region": "Москва", "region_type_full": "город",
+    "street": "Майская", "street_type_full": "улица",
+    "house": "5", "house_type_full": "дом",
+}
+
+
+def test_validate():
+    assert validate(BUILDING) == []
+    assert validate(BUILDING, "1", 2) == []
+    assert validate(None) == validate({}) == []
+    assert validate(dict(BUILDING, street_type_full="линейка",
+                         house_type_full=None, section="1")) == [
+        Issue(None, 'street', UNKNOWN, "линейка", "Майская"),
+        Issue(None, 'building', MISSING_TYPE, None, "5"),
+    ]
+
+
+def test_validate_many_matches_check_portion():
+    records = records_from_testcases() + generate_corpus(1000)
+
+    issues = list(validate_many(records))
+
+    expected = []
+    for index, record in enumerate(records):
+        data = record[1] if len(record) > 1 else None
+        if not data:
+            continue
+        for triple in portion_triples(data, *record[2:4]):
+            if format_portion(*triple) is IS_ERROR:
+                expected.append((index, triple[0], triple[2]))
+
+    assert expected
+    assert [(issue.index, issue.component, issue.type)
+            for issue in issues if issue.reason == UNKNOWN] == expected
+    assert {issue.type for issue in issues} >= {UNKNOWN_TYPE}
+
+
+def test_validate_many_drop_bad_rows():
+    records = generate_corpus(300)
+    bad = {issue.index for issue in validate_many(records)
+           if issue.reason == UNKNOWN}
+
+    for index, record in enumerate(records):
+        formats = all_formats(*record)
+        if index not in bad:
+            assert formats['all'] != record[0]
+
+
+def test_validate_many_columnar():
+    records = {
+        'plain_address': ["", ""],
+        'address_components': [BUILDING,
+                               dict(BUILDING, region_type_full="град")],
+    }
+    assert list(validate_many(records)) == [
+        Issue(1, 'region', UNKNOWN, "град", "Москва")]